@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+报警规则评估引擎
+一条 SQL 将所有启用的规则与 site_latest_status 中每个站点的最新值做集合运算，
+一次得到全部触发的 (规则, 站点) 组合；再由内存状态机按 duration_seconds
+去抖，只在状态迁移（pending -> firing -> resolved）时写库和推送
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+
+logger = logging.getLogger("alert_engine")
+
+# 可用于报警规则的指标（site_latest_status 中的数值列）
+ALERT_METRICS = (
+    "supply_temp", "return_temp", "target_temp", "flow_rate", "pressure",
+    "compressor_speed", "fan_speed", "total_power", "power_factor", "voltage",
+    "current", "energy_consumption", "miner_count", "total_hashrate", "efficiency",
+    "avg_miner_temp", "ambient_temp", "ambient_humidity", "cabinet_temp",
+    "fault_flags", "warning_flags"
+)
+
+# metric_name 通过 CASE 映射到列，规则中的指标名不会拼接进 SQL
+_METRIC_CASE = "\n".join(
+    f"            WHEN '{metric}' THEN l.{metric}::numeric" for metric in ALERT_METRICS
+)
+
+EVALUATE_RULES_SQL = f"""
+SELECT r.rule_id, r.name, r.metric_name, r.condition_type, r.threshold_value,
+       r.duration_seconds, r.severity, l.site_id, v.value
+FROM alert_rules r
+CROSS JOIN site_latest_status l
+CROSS JOIN LATERAL (
+    SELECT CASE r.metric_name
+{_METRIC_CASE}
+           END AS value
+) v
+WHERE r.is_enabled
+  AND v.value IS NOT NULL
+  AND CASE r.condition_type
+          WHEN 'gt' THEN v.value > r.threshold_value
+          WHEN 'lt' THEN v.value < r.threshold_value
+          WHEN 'eq' THEN v.value = r.threshold_value
+          WHEN 'change' THEN ABS(v.value - r.threshold_value) > r.threshold_value * 0.1
+          ELSE FALSE
+      END
+ORDER BY r.rule_id, l.site_id
+"""
+
+INSERT_ALERTS_SQL = """
+INSERT INTO alert_records
+    (rule_id, site_id, metric_name, metric_value, threshold_value, condition_description, status)
+SELECT rule_id, site_id, metric_name, metric_value, threshold_value, description, 'active'
+FROM unnest($1::int[], $2::int[], $3::text[], $4::numeric[], $5::numeric[], $6::text[])
+    AS t(rule_id, site_id, metric_name, metric_value, threshold_value, description)
+RETURNING record_id, rule_id, site_id
+"""
+
+# 条件类型的展示符号
+CONDITION_SYMBOLS = {"gt": ">", "lt": "<", "eq": "=", "change": "±10%"}
+
+
+def describe_condition(row) -> str:
+    """生成报警条件描述，如 supply_temp > 40.00"""
+    symbol = CONDITION_SYMBOLS.get(row["condition_type"], row["condition_type"])
+    return f"{row['metric_name']} {symbol} {row['threshold_value']}"
+
+
+async def evaluate_rules(conn: asyncpg.Connection) -> List[asyncpg.Record]:
+    """评估全部启用规则，返回所有触发的 (规则, 站点) 行"""
+    return await conn.fetch(EVALUATE_RULES_SQL)
+
+
+async def insert_alert_records(conn: asyncpg.Connection, firing: List[asyncpg.Record]) -> List[asyncpg.Record]:
+    """一条语句批量写入报警记录，返回 (record_id, rule_id, site_id) 行"""
+    if not firing:
+        return []
+    return await conn.fetch(
+        INSERT_ALERTS_SQL,
+        [row["rule_id"] for row in firing],
+        [row["site_id"] for row in firing],
+        [row["metric_name"] for row in firing],
+        [row["value"] for row in firing],
+        [row["threshold_value"] for row in firing],
+        [describe_condition(row) for row in firing]
+    )
+
+
+# 自动恢复：将报警记录标记为已解决
+RESOLVE_ALERTS_SQL = """
+UPDATE alert_records
+SET status = 'resolved', resolved_at = NOW()
+WHERE record_id = ANY($1::bigint[]) AND resolved_at IS NULL
+"""
+
+# 启动时重建状态：每个 (规则, 站点) 取最新一条未解决记录
+LOAD_OPEN_ALERTS_SQL = """
+SELECT DISTINCT ON (a.rule_id, a.site_id)
+       a.record_id, a.rule_id, a.site_id, a.metric_name, a.metric_value,
+       a.triggered_at, r.name
+FROM alert_records a
+LEFT JOIN alert_rules r ON r.rule_id = a.rule_id
+WHERE a.status IN ('active', 'acknowledged') AND a.resolved_at IS NULL
+  AND a.rule_id IS NOT NULL AND a.site_id IS NOT NULL
+ORDER BY a.rule_id, a.site_id, a.triggered_at DESC
+"""
+
+# 合并历史上重复写入的未解决记录（同一 (规则, 站点) 只保留最新一条）
+MERGE_DUPLICATE_ALERTS_SQL = """
+UPDATE alert_records
+SET status = 'resolved', resolved_at = NOW(), resolution_notes = '重复报警自动合并'
+WHERE status IN ('active', 'acknowledged') AND resolved_at IS NULL
+  AND rule_id IS NOT NULL AND site_id IS NOT NULL
+  AND record_id <> ALL($1::bigint[])
+"""
+
+ALERT_PENDING = "pending"
+ALERT_FIRING = "firing"
+
+
+class AlertState:
+    """单个 (规则, 站点) 的报警状态"""
+    __slots__ = ("status", "since", "record_id", "rule_name", "metric_name", "value")
+
+    def __init__(self, status: str, since: float, rule_name: Optional[str],
+                 metric_name: Optional[str], value, record_id: Optional[int] = None):
+        self.status = status
+        self.since = since
+        self.record_id = record_id
+        self.rule_name = rule_name
+        self.metric_name = metric_name
+        self.value = value
+
+
+class AlertStateMachine:
+    """按 (rule_id, site_id) 跟踪报警状态：pending -> firing -> resolved
+
+    条件首次满足进入 pending，持续满足 duration_seconds 后进入 firing 并写入一条
+    报警记录；条件消失时 pending 直接丢弃，firing 自动写入 resolved_at。
+    持续报警期间不再重复写库，写库和推送次数与事件数而非采集周期数成正比。
+    """
+
+    def __init__(self):
+        self.states: Dict[Tuple[int, int], AlertState] = {}
+
+    def firing_count(self) -> int:
+        return sum(1 for state in self.states.values() if state.status == ALERT_FIRING)
+
+    async def load(self, conn: asyncpg.Connection):
+        """从 alert_records 重建 firing 状态，并合并重复的未解决记录"""
+        rows = await conn.fetch(LOAD_OPEN_ALERTS_SQL)
+        self.states = {
+            (row["rule_id"], row["site_id"]): AlertState(
+                ALERT_FIRING, row["triggered_at"].timestamp(), row["name"],
+                row["metric_name"], row["metric_value"], row["record_id"]
+            )
+            for row in rows
+        }
+        merged = await conn.execute(MERGE_DUPLICATE_ALERTS_SQL, [row["record_id"] for row in rows])
+        logger.info(f"报警状态已重建：{len(self.states)} 条进行中报警（{merged}）")
+
+    async def evaluate(self, conn: asyncpg.Connection,
+                       now: Optional[float] = None) -> Tuple[List[asyncpg.Record], List[Tuple[Tuple[int, int], AlertState]]]:
+        """评估规则并推进状态机，返回 (新触发的报警行, [((rule_id, site_id), 已恢复状态)])"""
+        now = time.time() if now is None else now
+        firing = await evaluate_rules(conn)
+
+        active = set()
+        to_fire = []
+        for row in firing:
+            key = (row["rule_id"], row["site_id"])
+            active.add(key)
+            state = self.states.get(key)
+            if state is None:
+                state = AlertState(ALERT_PENDING, now, row["name"], row["metric_name"], row["value"])
+                self.states[key] = state
+            state.value = row["value"]
+            if state.status == ALERT_PENDING and now - state.since >= (row["duration_seconds"] or 0):
+                to_fire.append(row)
+
+        resolved_keys = []
+        for key, state in list(self.states.items()):
+            if key in active:
+                continue
+            if state.status == ALERT_FIRING:
+                resolved_keys.append(key)
+            else:
+                del self.states[key]
+
+        if not to_fire and not resolved_keys:
+            return [], []
+
+        async with conn.transaction():
+            inserted = await insert_alert_records(conn, to_fire)
+            if resolved_keys:
+                await conn.execute(RESOLVE_ALERTS_SQL, [self.states[key].record_id for key in resolved_keys])
+
+        for row in inserted:
+            state = self.states[(row["rule_id"], row["site_id"])]
+            state.status = ALERT_FIRING
+            state.since = now
+            state.record_id = row["record_id"]
+
+        resolved = [(key, self.states.pop(key)) for key in resolved_keys]
+        return to_fire, resolved
+
+alert_state = AlertStateMachine()
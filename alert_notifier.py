@@ -1,21 +1,33 @@
 import aiohttp
+import asyncio
+import html
 import logging
 import json
 import os
+from typing import Any, Dict, List, Optional, Tuple
 
 logger = logging.getLogger("alert_notifier")
 
 # 报警配置
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config", "alert_config.json")
 
-def load_config():
-    try:
-        if os.path.exists(CONFIG_PATH):
-            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.error(f"加载报警配置失败: {e}")
-    
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+# 推送调度参数（可在 alert_config.json 中覆盖同名键）
+DISPATCH_DEFAULTS = {
+    "coalesce_seconds": 5.0,        # 合并窗口：窗口内的报警合并为一条摘要
+    "queue_size": 1000,             # 待推送队列上限，满时丢弃新报警
+    "max_retries": 3,               # 单条消息最大重试次数
+    "retry_backoff": 1.0,           # 重试退避基数（秒），按 2 的幂增长
+    "request_timeout": 5.0,         # 单次 HTTP 请求超时（秒）
+    "telegram_min_interval": 1.0,   # Telegram 同一会话最小发送间隔（秒）
+    "wechat_min_interval": 3.0,     # 企业微信机器人限 20 条/分钟
+}
+
+# 单条摘要中最多展开的报警条数（Telegram 单条消息上限 4096 字符）
+DIGEST_MAX_ITEMS = 20
+
+def default_config() -> dict:
     # 默认配置 (预置用户的 Telegram)
     return {
         "enable_telegram": True,
@@ -25,78 +37,301 @@ def load_config():
         "wechat_webhook": "" # 企业微信机器人Webhook
     }
 
-async def send_telegram_alert(message: str, config: dict):
+def load_config():
+    try:
+        if os.path.exists(CONFIG_PATH):
+            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f"加载报警配置失败: {e}")
+
+    return default_config()
+
+class ConfigCache:
+    """报警配置缓存，仅在文件修改时间变化时重新读取"""
+
+    def __init__(self, path: str = CONFIG_PATH):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._config: Optional[dict] = None
+
+    def get(self) -> dict:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+
+        if self._config is None or mtime != self._mtime:
+            self._config = default_config()
+            if mtime is not None:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._config = json.load(f)
+                    logger.info("报警配置已重新加载")
+                except Exception as e:
+                    logger.error(f"加载报警配置失败: {e}")
+            self._mtime = mtime
+        return self._config
+
+def format_alert(site_id: int, rule_name: str, message: str, value: Any) -> str:
+    """纯文本报警内容（各渠道自行转义，指标名等字段中的 _ * 等字符不会破坏格式）"""
+    return (
+        f"站点: {site_id}\n"
+        f"规则: {rule_name}\n"
+        f"当前值: {value}\n"
+        f"详情: {message}\n"
+        f"请及时登录控制台处理！"
+    )
+
+def format_digest(alerts: List[Tuple[int, str, str, Any]]) -> str:
+    """将合并窗口内的多条报警整理为一条摘要"""
+    if len(alerts) == 1:
+        return format_alert(*alerts[0])
+
+    lines = [f"共 {len(alerts)} 条报警", ""]
+    for site_id, rule_name, message, value in alerts[:DIGEST_MAX_ITEMS]:
+        lines.append(f"- 站点 {site_id} | {rule_name} | 当前值 {value} | {message}")
+    if len(alerts) > DIGEST_MAX_ITEMS:
+        lines.append(f"... 其余 {len(alerts) - DIGEST_MAX_ITEMS} 条省略")
+    lines.append("")
+    lines.append("请及时登录控制台处理！")
+    return "\n".join(lines)
+
+async def _post_json(session: aiohttp.ClientSession, url: str, payload: dict,
+                     timeout: float) -> Tuple[bool, Optional[float], str]:
+    """发送 JSON 请求，返回 (是否成功, 建议重试等待秒数, 错误描述)"""
+    async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+        text = await resp.text()
+        if resp.status == 429:
+            retry_after = None
+            try:
+                retry_after = float(json.loads(text).get("parameters", {}).get("retry_after"))
+            except (ValueError, TypeError, AttributeError):
+                pass
+            return False, retry_after, text
+        if resp.status != 200:
+            return False, None, text
+        try:
+            body = json.loads(text)
+        except ValueError:
+            return True, None, ""
+        # 企业微信 HTTP 200 但 errcode 非 0 表示失败（45009 为频率限制）
+        if isinstance(body, dict) and body.get("errcode", 0) != 0:
+            return False, None, text
+        return True, None, ""
+
+def _telegram_request(message: str, config: dict) -> Optional[Tuple[str, dict]]:
     token = config.get("telegram_bot_token")
     chat_id = config.get("telegram_chat_id")
-    
     if not token or not chat_id:
-        logger.warning("Telegram 未配置 Bot Token，跳过推送")
-        return False
-        
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
+        return None
+    base = config.get("telegram_api_base", TELEGRAM_API_BASE).rstrip("/")
     payload = {
         "chat_id": chat_id,
-        "text": f"🚨 **AntBox 报警通知** 🚨\n\n{message}",
-        "parse_mode": "Markdown"
+        "text": f"🚨 <b>AntBox 报警通知</b> 🚨\n\n{html.escape(message, quote=False)}",
+        "parse_mode": "HTML"
     }
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, timeout=5) as resp:
-                if resp.status == 200:
-                    logger.info("Telegram 报警推送成功")
-                    return True
-                else:
-                    logger.error(f"Telegram 推送失败: {await resp.text()}")
-                    return False
-    except Exception as e:
-        logger.error(f"Telegram 网络请求错误: {e}")
-        return False
+    return f"{base}/bot{token}/sendMessage", payload
 
-async def send_wechat_alert(message: str, config: dict):
+def _wechat_request(message: str, config: dict) -> Optional[Tuple[str, dict]]:
     webhook = config.get("wechat_webhook")
     if not webhook:
-        logger.warning("WeChat 未配置 Webhook，跳过推送")
-        return False
-        
+        return None
     payload = {
         "msgtype": "text",
         "text": {
             "content": f"🚨 AntBox 报警通知 🚨\n\n{message}"
         }
     }
-    
+    return webhook, payload
+
+CHANNELS = {
+    "telegram": ("enable_telegram", _telegram_request, "Telegram"),
+    "wechat": ("enable_wechat", _wechat_request, "微信"),
+}
+
+async def _send_once(channel: str, message: str, config: dict,
+                     session: Optional[aiohttp.ClientSession] = None) -> bool:
+    _, build_request, label = CHANNELS[channel]
+    request = build_request(message, config)
+    if request is None:
+        logger.warning(f"{label} 未配置，跳过推送")
+        return False
+    url, payload = request
+
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(webhook, json=payload, timeout=5) as resp:
-                if resp.status == 200:
-                    logger.info("微信报警推送成功")
-                    return True
-                else:
-                    logger.error(f"微信推送失败: {await resp.text()}")
-                    return False
+        if session is None:
+            async with aiohttp.ClientSession() as own_session:
+                ok, _, error = await _post_json(own_session, url, payload, DISPATCH_DEFAULTS["request_timeout"])
+        else:
+            ok, _, error = await _post_json(session, url, payload, DISPATCH_DEFAULTS["request_timeout"])
     except Exception as e:
-        logger.error(f"微信网络请求错误: {e}")
+        logger.error(f"{label} 网络请求错误: {e}")
         return False
 
+    if ok:
+        logger.info(f"{label} 报警推送成功")
+    else:
+        logger.error(f"{label} 推送失败: {error}")
+    return ok
+
+async def send_telegram_alert(message: str, config: dict, session: Optional[aiohttp.ClientSession] = None):
+    return await _send_once("telegram", message, config, session)
+
+async def send_wechat_alert(message: str, config: dict, session: Optional[aiohttp.ClientSession] = None):
+    return await _send_once("wechat", message, config, session)
+
+class AlertDispatcher:
+    """常驻报警推送调度器
+
+    共享一个 HTTP 会话，配置按修改时间缓存；报警进入有界队列，
+    合并窗口内的报警按渠道合并为一条摘要，失败按指数退避重试，
+    并对每个渠道限制最小发送间隔。
+    """
+
+    def __init__(self, config_path: str = CONFIG_PATH):
+        self.config = ConfigCache(config_path)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.last_sent: Dict[str, float] = {}
+        self.stats = {"submitted": 0, "dropped": 0, "digests": 0, "sent": 0, "failed": 0}
+
+    def setting(self, key: str):
+        return self.config.get().get(key, DISPATCH_DEFAULTS[key])
+
+    @property
+    def running(self) -> bool:
+        return self.worker is not None and not self.worker.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self.session = aiohttp.ClientSession()
+        self.queue = asyncio.Queue(maxsize=int(self.setting("queue_size")))
+        self.worker = asyncio.create_task(self._run())
+        logger.info("报警推送调度器已启动")
+
+    async def stop(self, timeout: float = 10):
+        """停止调度器，尽量在 timeout 内推送完队列中剩余的报警"""
+        if self.worker:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"报警推送调度器关闭时仍有 {self.queue.qsize()} 条报警未推送")
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+        if self.session:
+            await self.session.close()
+            self.session = None
+        logger.info("报警推送调度器已关闭")
+
+    def submit(self, site_id: int, rule_name: str, message: str, value: Any) -> bool:
+        """提交一条报警（不阻塞），调度器未运行或队列已满时丢弃并返回 False"""
+        if self.queue is None or not self.running:
+            self.stats["dropped"] += 1
+            logger.error(f"报警推送调度器未运行，丢弃报警：站点 {site_id} {rule_name}")
+            return False
+        try:
+            self.queue.put_nowait((site_id, rule_name, message, value))
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            logger.error(f"报警推送队列已满，丢弃报警：站点 {site_id} {rule_name}")
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + float(self.setting("coalesce_seconds"))
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._dispatch(batch)
+            except Exception as e:
+                logger.error(f"报警推送失败：{e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _dispatch(self, batch: List[Tuple[int, str, str, Any]]):
+        config = self.config.get()
+        message = format_digest(batch)
+        self.stats["digests"] += 1
+        channels = [name for name, (flag, _, _) in CHANNELS.items() if config.get(flag)]
+        await asyncio.gather(*(self._send_with_retry(name, message, config) for name in channels))
+
+    async def _send_with_retry(self, channel: str, message: str, config: dict) -> bool:
+        _, build_request, label = CHANNELS[channel]
+        request = build_request(message, config)
+        if request is None:
+            logger.warning(f"{label} 未配置，跳过推送")
+            return False
+        url, payload = request
+
+        loop = asyncio.get_running_loop()
+        min_interval = float(config.get(f"{channel}_min_interval", DISPATCH_DEFAULTS[f"{channel}_min_interval"]))
+        max_retries = int(config.get("max_retries", DISPATCH_DEFAULTS["max_retries"]))
+        backoff = float(config.get("retry_backoff", DISPATCH_DEFAULTS["retry_backoff"]))
+        timeout = float(config.get("request_timeout", DISPATCH_DEFAULTS["request_timeout"]))
+
+        for attempt in range(max_retries + 1):
+            # 渠道限速
+            wait = self.last_sent.get(channel, 0) + min_interval - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self.last_sent[channel] = loop.time()
+
+            retry_after = None
+            try:
+                ok, retry_after, error = await _post_json(self.session, url, payload, timeout)
+            except Exception as e:
+                ok, error = False, str(e)
+
+            if ok:
+                self.stats["sent"] += 1
+                logger.info(f"{label} 报警推送成功")
+                return True
+
+            if attempt < max_retries:
+                delay = retry_after if retry_after is not None else backoff * (2 ** attempt)
+                logger.warning(f"{label} 推送失败，{delay:.1f} 秒后第 {attempt + 1} 次重试: {error}")
+                await asyncio.sleep(delay)
+
+        self.stats["failed"] += 1
+        logger.error(f"{label} 推送失败，已重试 {max_retries} 次: {error}")
+        return False
+
+dispatcher = AlertDispatcher()
+
 async def notify_all(site_id: int, rule_name: str, message: str, value: float):
+    # 调度器运行中时进入队列合并推送，否则直接发送（命令行测试）
+    if dispatcher.running:
+        dispatcher.submit(site_id, rule_name, message, value)
+        return
+
     config = load_config()
-    
-    alert_text = (
-        f"**站点**: {site_id}\n"
-        f"**规则**: {rule_name}\n"
-        f"**当前值**: {value}\n"
-        f"**详情**: {message}\n"
-        f"请及时登录控制台处理！"
-    )
-    
+    alert_text = format_alert(site_id, rule_name, message, value)
+
     if config.get("enable_telegram"):
         await send_telegram_alert(alert_text, config)
-        
+
     if config.get("enable_wechat"):
         await send_wechat_alert(alert_text, config)
 
 # 用于本地测试
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(notify_all(101, "高温报警", "温度超过阈值", 42.5))
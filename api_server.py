@@ -7,19 +7,33 @@ AntBox 矿机冷却系统监控平台 - FastAPI 后端服务
 import asyncio
 import asyncpg
 import aiohttp
+import ipaddress
 import json
 import logging
-from alert_notifier import notify_all
+import math
+import re
+from alert_notifier import dispatcher as alert_dispatcher
+from alert_engine import alert_state, describe_condition
+from site_registry import site_registry
+from data_collector import ConnectionStats, SiteHealthTracker, create_collector_session, parse_payloads, tcp_probe
+from collection_scheduler import CollectionScheduler
+from cgminer_client import cgminer_client, miner_info_response
+from downsample import downsample_rows
+from response_cache import etag_matches, response_cache
+from wall_hub import wall_hub
+from latest_state import STATUS_FIELDS, latest_state
+from miner_history import INSERT_HISTORY_SQL, fetch_history, history_window, miner_history, step_series
 import ssl
 import os
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
@@ -43,7 +57,9 @@ DB_CONFIG = {
 SITES_CONFIG_PATH = "config/all_sites.json"
 
 # 数据采集配置
-COLLECTION_INTERVAL = 60  # 秒
+COLLECTION_INTERVAL = 60  # 秒，站点未单独配置 interval 时的默认采集间隔
+FLUSH_INTERVAL = 5  # 秒，采集结果批量落库的间隔
+CONFIG_CHECK_INTERVAL = 60  # 秒，检查站点配置变更的间隔
 API_TIMEOUT = 5  # 秒
 MAX_CONCURRENT_REQUESTS = 50
 
@@ -83,6 +99,8 @@ class DashboardOverview(BaseModel):
 db_pool: Optional[asyncpg.Pool] = None
 data_collector: Optional["DataCollector"] = None
 collection_task: Optional[asyncio.Task] = None
+write_stats: Dict[str, Any] = {}  # 最近一次写库统计
+cycle_state: Dict[str, Any] = {"dirty": False, "last_check": 0.0}  # 报警检查与缓存失效按最短采集间隔进行
 
 # ============= 生命周期管理 =============
 @asynccontextmanager
@@ -103,8 +121,25 @@ async def lifespan(app: FastAPI):
         # 初始化数据采集器
         logger.info("正在初始化数据采集器...")
         data_collector = DataCollector()
+        await data_collector.start()
         logger.info(f"数据采集器初始化完成，加载了 {len(data_collector.sites)} 个站点")
         
+        # 加载站点注册表（IP -> site_id）
+        logger.info("正在加载站点注册表...")
+        await site_registry.start(db_pool, data_collector.sites)
+        
+        # 扫描结果持久化（增量扫描依赖）
+        scan_history.attach(db_pool)
+        
+        # 启动报警推送调度器
+        await alert_dispatcher.start()
+        
+        # 从报警记录重建报警状态机，加载站点最新状态和监控墙推送状态
+        async with db_pool.acquire() as conn:
+            await alert_state.load(conn)
+            await latest_state.load(conn)
+            await wall_hub.load(conn)
+        
         # 启动后台数据采集任务
         logger.info("正在启动后台数据采集任务...")
         collection_task = asyncio.create_task(background_data_collection())
@@ -117,10 +152,6 @@ async def lifespan(app: FastAPI):
     yield
     
     # 关闭时清理
-    logger.info("正在关闭数据库连接池...")
-    if db_pool:
-        await db_pool.close()
-    
     if collection_task:
         collection_task.cancel()
         try:
@@ -128,6 +159,16 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             pass
     
+    await scan_jobs.shutdown()
+    await site_registry.stop()
+    await alert_dispatcher.stop()
+    if data_collector:
+        await data_collector.close()
+    
+    logger.info("正在关闭数据库连接池...")
+    if db_pool:
+        await db_pool.close()
+    
     logger.info("应用已正常关闭")
 
 # ============= FastAPI 应用 =============
@@ -162,49 +203,118 @@ async def dashboard_page():
 class DataCollector:
     """异步数据采集器"""
     
-    def __init__(self):
+    def __init__(self, config_path: str = SITES_CONFIG_PATH):
+        self.config_path = config_path
         self.sites: List[Dict[str, Any]] = []
         self.api_endpoints: Dict[str, str] = {}
+        self.config_mtime: Optional[float] = None
+        self.collection_interval = COLLECTION_INTERVAL
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connection_stats = ConnectionStats()
+        self.health = SiteHealthTracker()
         self.load_config()
     
+    async def start(self):
+        """创建常驻 HTTP 会话（长连接与 DNS 缓存跨采集周期复用）"""
+        if self.session is None or self.session.closed:
+            self.session = create_collector_session(
+                self.connection_stats, limit=MAX_CONCURRENT_REQUESTS
+            )
+    
+    async def close(self):
+        """关闭 HTTP 会话"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+    
     def load_config(self):
         """加载站点配置"""
         try:
-            with open(SITES_CONFIG_PATH, 'r', encoding='utf-8') as f:
+            mtime = os.path.getmtime(self.config_path)
+            with open(self.config_path, 'r', encoding='utf-8') as f:
                 config = json.load(f)
             self.sites = config.get("sites", [])
             self.api_endpoints = config.get("api_endpoints", {})
+            self.collection_interval = config.get("collection_interval", COLLECTION_INTERVAL)
+            self.config_mtime = mtime
             logger.info(f"加载了 {len(self.sites)} 个站点配置")
         except Exception as e:
             logger.error(f"加载站点配置失败：{e}")
     
+    def shortest_interval(self) -> float:
+        """当前配置中最短的站点采集间隔（站点未单独配置时取默认间隔）"""
+        return min((float(site.get("interval") or self.collection_interval) for site in self.sites),
+                   default=float(self.collection_interval))
+    
+    def reload_if_changed(self) -> bool:
+        """配置文件修改时间变化时重新加载，返回是否发生了重新加载"""
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return False
+        if mtime == self.config_mtime:
+            return False
+        self.load_config()
+        return self.config_mtime == mtime
+    
     async def fetch_site_data(self, session: aiohttp.ClientSession, site: Dict[str, Any]) -> Dict[str, Any]:
         """采集单个站点数据"""
         ip = site["ip"]
         result = {
             "ip": ip,
             "location": site.get("location", ""),
-            "timestamp": datetime.utcnow(),
+            "timestamp": datetime.now(timezone.utc),
             "data": {},
             "errors": []
         }
         
+        # 站点可选配置 port（默认 80）
+        port = site.get("port", 80)
+        base_url = f"http://{ip}:{port}" if "port" in site else f"http://{ip}"
+        
+        # 连续失败的站点先做 TCP 探测，不可达则不再逐个端点等待超时
+        if self.health.is_failing(ip) and not await tcp_probe(ip, port):
+            self.health.record_failure(ip)
+            result["errors"].append("TCP 探测失败，站点不可达")
+            return result
+        
+        # 配置了 miner_ips 的站点通过 CGMiner API 逐台获取矿机数据，替代 minerInfo 端点
+        miner_ips = site.get("miner_ips")
+        endpoints = {name: path for name, path in self.api_endpoints.items()
+                     if not (miner_ips and name == "minerInfo")}
+        
         # 并发获取所有 API 端点
         tasks = []
-        for endpoint_name, endpoint_path in self.api_endpoints.items():
-            url = f"http://{ip}{endpoint_path}"
+        for endpoint_name, endpoint_path in endpoints.items():
+            url = f"{base_url}{endpoint_path}"
             tasks.append(self.fetch_endpoint(session, url, endpoint_name, ip))
+        names = list(endpoints.keys())
+        if miner_ips:
+            tasks.append(self.fetch_miners(miner_ips))
+            names.append("minerInfo")
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
-        for endpoint_name, res in zip(self.api_endpoints.keys(), results):
+        for endpoint_name, res in zip(names, results):
             if isinstance(res, Exception):
                 result["errors"].append(f"{endpoint_name}: {str(res)}")
             else:
                 result["data"][endpoint_name] = res
         
+        if result["data"]:
+            self.health.record_success(ip)
+        else:
+            self.health.record_failure(ip)
+        
         return result
     
+    async def fetch_miners(self, miner_ips: List[str]) -> Dict[str, Any]:
+        """通过 CGMiner API 获取逐台矿机数据，组装为 minerInfo 格式"""
+        results = await cgminer_client.fetch_many(miner_ips)
+        if not any(results):
+            raise ConnectionError(f"{len(miner_ips)} 台矿机 CGMiner API 均无响应")
+        return {"status": "success", "data": miner_info_response(miner_ips, results)}
+    
     async def fetch_endpoint(self, session: aiohttp.ClientSession, url: str, 
                             endpoint_name: str, ip: str) -> Dict[str, Any]:
         """获取单个 API 端点数据"""
@@ -223,167 +333,487 @@ class DataCollector:
         except aiohttp.ClientError as e:
             raise ConnectionError(f"连接 {ip} 失败：{str(e)}")
     
+    async def collect_site(self, site: Dict[str, Any]) -> Dict[str, Any]:
+        """采集单个站点，异常时返回失败记录"""
+        await self.start()
+        try:
+            return await self.fetch_site_data(self.session, site)
+        except Exception as e:
+            self.health.record_failure(site["ip"])
+            return {
+                "ip": site["ip"],
+                "errors": [str(e)],
+                "status": "failed"
+            }
+    
     async def collect_all_sites(self) -> List[Dict[str, Any]]:
-        """采集所有站点数据"""
-        connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT_REQUESTS)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            tasks = [self.fetch_site_data(session, site) for site in self.sites]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-        
-        collected = []
-        for site, result in zip(self.sites, results):
-            if isinstance(result, Exception):
-                collected.append({
-                    "ip": site["ip"],
-                    "errors": [str(result)],
-                    "status": "failed"
-                })
-            else:
-                collected.append(result)
-        
-        return collected
+        """一次性采集所有站点数据"""
+        return await asyncio.gather(*(self.collect_site(site) for site in self.sites))
 
 # ============= 后台数据采集任务 =============
+def track_site_result(site: Dict[str, Any], site_data: Dict[str, Any]):
+    """单个站点采集完成后立即更新内存最新状态，并向监控墙推送变化的字段"""
+    site_id = site_registry.get(site["ip"])
+    if site_id is None:
+        # 新站点在下一次落库注册后才有 site_id
+        return
+    record = build_snapshot_record(site_id, site_data)
+    changed = latest_state.update(
+        site_id, site["ip"], site.get("location"),
+        len(site_data.get("errors", [])) == 0,
+        dict(zip(LATEST_STATUS_COLUMNS, record[2:])) if record else None
+    )
+    wall_hub.site_changed(site_id, changed)
+
+async def collect_and_track(site: Dict[str, Any]) -> Dict[str, Any]:
+    site_data = await data_collector.collect_site(site)
+    try:
+        track_site_result(site, site_data)
+    except Exception as e:
+        # 内存状态更新失败不能丢弃已采集的结果，落库照常进行
+        logger.error(f"站点 {site.get('ip')} 更新内存状态失败：{e}")
+    return site_data
+
+async def process_collected(collected_data: List[Dict[str, Any]]):
+    """处理一批采集结果：每次 flush 都落库；报警检查和仪表盘缓存失效按最短的站点采集间隔
+    最多进行一次，且只在上次检查后有数据写入时进行"""
+    stats = await save_to_database(collected_data)
+    # 已从 sites 表删除的站点移出内存状态
+    removed = latest_state.retain(lambda state: site_registry.get(state.ip_address) == state.site_id)
+    wall_hub.sites_removed(removed)
+    for site_id in removed:
+        miner_history.forget(site_id)
+    if stats or removed:
+        cycle_state["dirty"] = True
+
+    now = time.monotonic()
+    if not cycle_state["dirty"] or now - cycle_state["last_check"] < data_collector.shortest_interval():
+        return
+    cycle_state["dirty"] = False
+    cycle_state["last_check"] = now
+    await check_alerts()
+    response_cache.invalidate()
+
+async def prune_rollups():
+    """删除超出保留期的分钟级和小时级汇总桶
+
+    使用 TimescaleDB 连续聚合时由 retention policy 清理（见 database_schema.sql），此处跳过。
+    """
+    if not db_pool or not SNAPSHOT_ROLLUP_UPSERT:
+        return
+    now = datetime.now(timezone.utc)
+    async with db_pool.acquire() as conn:
+        for resolution, keep in ROLLUP_RETENTION.items():
+            table = ROLLUP_RESOLUTIONS[resolution][0]
+            result = await conn.execute(PRUNE_ROLLUP_SQL.format(table=table), now - keep)
+            logger.info(f"清理 {table} 中 {keep.days} 天前的汇总桶：{result}")
+
 async def background_data_collection():
-    """后台数据采集循环任务"""
+    """后台数据采集任务
+
+    各站点按自身采集间隔和相位偏移错开采集，结果每 FLUSH_INTERVAL 秒批量落库；
+    本循环负责检测站点配置变更并定期输出连接统计。
+    """
     logger.info("后台数据采集任务已启动")
     
-    while True:
+    scheduler = CollectionScheduler(
+        fetch=collect_and_track,
+        flush=process_collected,
+        next_interval=lambda site, interval: data_collector.health.next_interval(site["ip"], interval),
+        default_interval=data_collector.collection_interval,
+        flush_interval=FLUSH_INTERVAL,
+        max_in_flight=MAX_CONCURRENT_REQUESTS
+    )
+    scheduler.set_sites(data_collector.sites)
+    scheduler_task = asyncio.create_task(scheduler.run())
+    last_prune = 0.0
+    
+    try:
+        while True:
+            await asyncio.sleep(CONFIG_CHECK_INTERVAL)
+            try:
+                # 站点配置变更时批量注册新站点并重新编排调度
+                if data_collector.reload_if_changed():
+                    await site_registry.register(data_collector.sites)
+                    scheduler.default_interval = data_collector.collection_interval
+                    scheduler.set_sites(data_collector.sites)
+                
+                if time.monotonic() - last_prune >= ROLLUP_PRUNE_INTERVAL:
+                    last_prune = time.monotonic()
+                    await prune_rollups()
+                
+                connection_stats = data_collector.connection_stats.reset()
+                logger.info(f"连接新建 {connection_stats['created']}，复用 {connection_stats['reused']}，"
+                            f"复用率 {connection_stats['reuse_rate']}，"
+                            f"退避中站点 {data_collector.health.failing_count()} 个")
+            except Exception as e:
+                logger.error(f"数据采集任务出错：{e}")
+    except asyncio.CancelledError:
+        logger.info("数据采集任务被取消")
+    finally:
+        scheduler_task.cancel()
         try:
-            start_time = datetime.utcnow()
-            logger.info(f"开始数据采集周期 (预计采集 {len(data_collector.sites)} 个站点)")
-            
-            # 采集数据
-            collected_data = await data_collector.collect_all_sites()
-            
-            # 保存到数据库
-            await save_to_database(collected_data)
-            
-            # 检查报警
-            await check_alerts()
-            
-            duration = (datetime.utcnow() - start_time).total_seconds()
-            logger.info(f"数据采集完成，耗时 {duration:.2f} 秒")
-            
-            # 等待下一个采集周期
-            sleep_time = max(0, COLLECTION_INTERVAL - duration)
-            await asyncio.sleep(sleep_time)
-            
+            await scheduler_task
         except asyncio.CancelledError:
-            logger.info("数据采集任务被取消")
-            break
-        except Exception as e:
-            logger.error(f"数据采集周期出错：{e}")
-            await asyncio.sleep(10)  # 出错后等待 10 秒
+            pass
+        await scheduler.flush_now()
+
+# 站点最新状态列（site_latest_status 中除 site_id/last_update 外的列）
+LATEST_STATUS_COLUMNS = list(STATUS_FIELDS)
+
+# 状态快照 COPY 写入列（顺序与 build_snapshot_record 返回的元组一致）
+# timestamp 取采集时间而非落库时间，最新状态和趋势汇总桶都以此为准
+SNAPSHOT_COLUMNS = ["site_id", "timestamp"] + LATEST_STATUS_COLUMNS
+
+# 快照列类型（与 status_snapshots 一致），写库前按此校验，不合法的值置空，
+# 避免单个站点的异常数据使整批 COPY 失败
+SNAPSHOT_COLUMN_TYPES = {
+    "supply_temp": ("numeric", 5, 2),
+    "return_temp": ("numeric", 5, 2),
+    "target_temp": ("numeric", 5, 2),
+    "flow_rate": ("numeric", 8, 2),
+    "pressure": ("numeric", 8, 2),
+    "compressor_speed": ("numeric", 6, 2),
+    "fan_speed": ("numeric", 6, 2),
+    "total_power": ("numeric", 10, 2),
+    "power_factor": ("numeric", 4, 3),
+    "voltage": ("numeric", 8, 2),
+    "current": ("numeric", 8, 2),
+    "energy_consumption": ("numeric", 12, 2),
+    "miner_count": ("int",),
+    "total_hashrate": ("numeric", 12, 2),
+    "efficiency": ("numeric", 8, 2),
+    "avg_miner_temp": ("numeric", 5, 2),
+    "ambient_temp": ("numeric", 5, 2),
+    "ambient_humidity": ("numeric", 5, 2),
+    "cabinet_temp": ("numeric", 5, 2),
+    "fault_flags": ("int",),
+    "warning_flags": ("int",),
+    "operation_mode": ("text", 32),
+}
+
+INT4_MAX = 2 ** 31 - 1
+
+# 快照先 COPY 到会话级临时表，再分别写入历史表和最新状态表
+SNAPSHOT_STAGE_SQL = """CREATE TEMP TABLE IF NOT EXISTS snapshot_stage
+    (LIKE status_snapshots INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"""
+
+INSERT_SNAPSHOTS_SQL = "INSERT INTO status_snapshots SELECT * FROM snapshot_stage"
+
+UPSERT_LATEST_STATUS_SQL = """INSERT INTO site_latest_status (site_id, last_update, {columns})
+SELECT DISTINCT ON (site_id) site_id, timestamp, {columns}
+FROM snapshot_stage
+ORDER BY site_id, timestamp DESC
+ON CONFLICT (site_id) DO UPDATE SET last_update = EXCLUDED.last_update, {updates}
+WHERE site_latest_status.last_update <= EXCLUDED.last_update""".format(
+    columns=", ".join(LATEST_STATUS_COLUMNS),
+    updates=", ".join(f"{c} = EXCLUDED.{c}" for c in LATEST_STATUS_COLUMNS)
+)
+
+# 趋势汇总：分辨率名称 -> (汇总表, DATE_TRUNC 单位, 桶宽秒数)，按从细到粗排列
+ROLLUP_RESOLUTIONS = {
+    "1m": ("snapshot_rollup_1m", "minute", 60),
+    "1h": ("snapshot_rollup_1h", "hour", 3600),
+    "1d": ("snapshot_rollup_1d", "day", 86400),
+}
+
+ROLLUP_METRICS = ["supply_temp", "return_temp", "total_power", "total_hashrate", "efficiency"]
+
+# 使用 TimescaleDB 连续聚合维护汇总表时设为 False，写库时不再 upsert
+SNAPSHOT_ROLLUP_UPSERT = True
+
+UPSERT_ROLLUP_SQL = """INSERT INTO {table} AS r (site_id, bucket, samples, {columns})
+SELECT site_id, DATE_TRUNC('{unit}', timestamp), COUNT(*), {aggregates}
+FROM snapshot_stage
+GROUP BY 1, 2
+ON CONFLICT (site_id, bucket) DO UPDATE SET samples = r.samples + EXCLUDED.samples, {updates}"""
+
+UPSERT_ROLLUP_SQLS = [
+    UPSERT_ROLLUP_SQL.format(
+        table=table,
+        unit=unit,
+        columns=", ".join(f"{m}_sum, {m}_count" for m in ROLLUP_METRICS),
+        aggregates=", ".join(f"COALESCE(SUM({m}), 0), COUNT({m})" for m in ROLLUP_METRICS),
+        updates=", ".join(f"{m}_{k} = r.{m}_{k} + EXCLUDED.{m}_{k}"
+                          for m in ROLLUP_METRICS for k in ("sum", "count"))
+    )
+    for table, unit, _ in ROLLUP_RESOLUTIONS.values()
+]
+
+# 汇总表保留期：分钟级需覆盖趋势接口的最大窗口（168 小时），天级长期保留
+ROLLUP_RETENTION = {
+    "1m": timedelta(days=8),
+    "1h": timedelta(days=90),
+}
+ROLLUP_PRUNE_INTERVAL = 3600  # 秒，清理过期汇总桶的间隔
+
+PRUNE_ROLLUP_SQL = "DELETE FROM {table} WHERE bucket < $1"
+
+# 矿机详情：每个站点一条多行 upsert（unnest 展开数组参数）
+UPSERT_MINERS_SQL = """
+INSERT INTO miner_details AS m
+    (site_id, miner_index, mac_address, ip_address, hashrate, temperature, fan_speed,
+     is_online, has_error, last_update)
+SELECT $1, t.miner_index, t.mac_address, t.ip_address, t.hashrate, t.temperature, t.fan_speed,
+       t.is_online, t.has_error, NOW()
+FROM unnest($2::int[], $3::macaddr[], $4::inet[], $5::numeric[], $6::numeric[], $7::int[],
+            $8::bool[], $9::bool[])
+    AS t(miner_index, mac_address, ip_address, hashrate, temperature, fan_speed, is_online, has_error)
+ON CONFLICT (site_id, miner_index) DO UPDATE SET
+    mac_address = COALESCE(EXCLUDED.mac_address, m.mac_address),
+    ip_address = COALESCE(EXCLUDED.ip_address, m.ip_address),
+    hashrate = EXCLUDED.hashrate,
+    temperature = EXCLUDED.temperature,
+    fan_speed = COALESCE(EXCLUDED.fan_speed, m.fan_speed),
+    is_online = EXCLUDED.is_online,
+    has_error = EXCLUDED.has_error,
+    last_update = EXCLUDED.last_update
+"""
 
-async def save_to_database(collected_data: List[Dict[str, Any]]):
-    """将采集数据保存到数据库"""
+_MAC_PATTERN = re.compile(r"^[0-9A-Fa-f]{2}([:-]?)[0-9A-Fa-f]{2}(\1[0-9A-Fa-f]{2}){4}$")
+
+def parsed_site_data(site_data: Dict[str, Any]) -> Dict[str, Any]:
+    """合并站点各端点的成功响应（字段同 LATEST_STATUS_COLUMNS，另含 miner_details）
+
+    结果缓存在 site_data["parsed"] 中，采集后更新内存状态和落库共用同一次解析。
+    """
+    parsed = site_data.get("parsed")
+    if parsed is None:
+        payloads = {name: result["data"] for name, result in site_data.get("data", {}).items()
+                    if isinstance(result, dict) and result.get("status") == "success"}
+        parsed = site_data["parsed"] = parse_payloads(payloads)
+    return parsed
+
+def build_snapshot_record(site_id: int, site_data: Dict[str, Any]) -> Optional[tuple]:
+    """从采集结果中提取一条完整状态快照记录（合并全部端点），coolerState 不可用时返回 None
+
+    各字段按 SNAPSHOT_COLUMN_TYPES 校验，类型不符或超出列范围的值置空。
+    """
+    cooler = site_data.get("data", {}).get("coolerState")
+    if not cooler or cooler.get("status") != "success":
+        return None
+
+    parsed = parsed_site_data(site_data)
+    return (site_id, collected_at(site_data),
+            *(_fit_column(column, parsed.get(column)) for column in LATEST_STATUS_COLUMNS))
+
+def collected_at(site_data: Dict[str, Any]) -> datetime:
+    """采集时间（UTC），缺失时退回为当前时间"""
+    timestamp = site_data.get("timestamp")
+    if not isinstance(timestamp, datetime):
+        return datetime.now(timezone.utc)
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def _fit_numeric(value: Any, precision: int, scale: int) -> Optional[float]:
+    """NUMERIC(precision, scale) 能容纳的数值，否则返回 None"""
+    value = _number(value)
+    if value is None or abs(round(value, scale)) >= 10 ** (precision - scale):
+        return None
+    return value
+
+def _fit_int(value: Any) -> Optional[int]:
+    """INTEGER 能容纳的整数值（允许 3.0 这样的整值浮点数），否则返回 None"""
+    value = _number(value)
+    if value is None or value != int(value) or abs(value) > INT4_MAX:
+        return None
+    return int(value)
+
+def _fit_column(column: str, value: Any) -> Any:
+    kind, *size = SNAPSHOT_COLUMN_TYPES[column]
+    if kind == "numeric":
+        return _fit_numeric(value, *size)
+    if kind == "int":
+        return _fit_int(value)
+    return value if isinstance(value, str) and len(value) <= size[0] else None
+
+def build_miner_rows(site_id: int, site_data: Dict[str, Any]) -> Optional[tuple]:
+    """将站点的矿机列表转换为 UPSERT_MINERS_SQL 的参数（每列一个数组），没有矿机数据时返回 None
+
+    同一站点内重复的矿机序号只保留最后一条，非法的 MAC / IP 和超出列范围的数值置空，避免单台矿机拖垮整批写入。
+    """
+    miners = parsed_site_data(site_data).get("miner_details")
+    if not miners:
+        return None
+
+    by_index: Dict[int, Dict[str, Any]] = {}
+    for miner in miners:
+        index = miner.get("index")
+        if isinstance(index, int) and not isinstance(index, bool) and 0 <= index <= INT4_MAX:
+            by_index[index] = miner
+
+    columns = ([], [], [], [], [], [], [], [])
+    for index, miner in by_index.items():
+        mac = miner.get("mac_address")
+        ip = miner.get("ip_address")
+        try:
+            ip = str(ipaddress.ip_address(ip)) if ip else None
+        except ValueError:
+            ip = None
+        fan_speed = _number(miner.get("fan_speed"))
+        row = (
+            index,
+            mac if isinstance(mac, str) and _MAC_PATTERN.match(mac) else None,
+            ip,
+            _fit_numeric(miner.get("hashrate"), 10, 2),
+            _fit_numeric(miner.get("temperature"), 5, 2),
+            _fit_int(round(fan_speed)) if fan_speed is not None else None,
+            bool(miner.get("is_online")),
+            bool(miner.get("has_error"))
+        )
+        for column, value in zip(columns, row):
+            column.append(value)
+    return (site_id, *columns)
+
+async def save_to_database(collected_data: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """将采集数据批量保存到数据库
+
+    站点 ID 从内存解析，在线状态一条语句批量更新，状态快照（合并 coolerState /
+    sensorData / minerInfo）通过 COPY 写入并同步 upsert 到 site_latest_status 和各级趋势汇总表，
+    矿机详情按站点批量 upsert 到 miner_details，超出死区或到达心跳的矿机另写入 miner_history，
+    全部在同一个事务内完成。
+    返回本周期写入统计。
+    """
     if not db_pool:
-        return
-    
+        return None
+
+    start = time.perf_counter()
+    online_ids: List[int] = []
+    online_flags: List[bool] = []
+    snapshots: List[tuple] = []
+    miner_rows: List[tuple] = []
+    history = []
+    registered: Dict[str, int] = {}
+
     async with db_pool.acquire() as conn:
-        for site_data in collected_data:
-            try:
-                ip = site_data.get("ip")
-                if not ip:
-                    continue
-                
-                # 获取或创建站点记录
-                site = await conn.fetchrow(
-                    "SELECT site_id FROM sites WHERE ip_address = $1", ip
+        try:
+            async with conn.transaction():
+                # 仅未知站点需要写库注册，其余从内存注册表解析；新映射在事务提交后才写入注册表
+                registered = await site_registry.register(collected_data, conn=conn)
+
+                for site_data in collected_data:
+                    site_id = site_registry.get(site_data.get("ip")) or registered.get(site_data.get("ip"))
+                    if site_id is None:
+                        continue
+                    online_ids.append(site_id)
+                    online_flags.append(len(site_data.get("errors", [])) == 0)
+
+                    try:
+                        record = build_snapshot_record(site_id, site_data)
+                        miners = build_miner_rows(site_id, site_data)
+                    except Exception as e:
+                        # 单个站点数据无法转换时跳过该站点，不影响整批写入
+                        logger.error(f"站点 {site_data.get('ip')} 采集数据无法写库，已跳过：{e}")
+                        continue
+                    if record:
+                        snapshots.append(record)
+                    if miners:
+                        miner_rows.append(miners)
+                        _, index, _, _, hashrate, temperature, _, is_online, has_error = miners
+                        batch = miner_history.plan(site_id, index, hashrate, temperature, is_online, has_error)
+                        if batch:
+                            history.append(batch)
+
+                # 批量更新在线状态
+                await conn.execute(
+                    """UPDATE sites AS s
+                       SET is_online = t.is_online, last_seen = NOW()
+                       FROM unnest($1::int[], $2::bool[]) AS t(site_id, is_online)
+                       WHERE s.site_id = t.site_id""",
+                    online_ids, online_flags
                 )
-                
-                if not site:
-                    site_id = await conn.fetchval(
-                        "INSERT INTO sites (ip_address, location, is_online) VALUES ($1, $2, $3) RETURNING site_id",
-                        ip, site_data.get("location", ""), True
-                    )
-                else:
-                    site_id = site["site_id"]
-                    # 更新在线状态
-                    await conn.execute(
-                        "UPDATE sites SET is_online = $1, last_seen = NOW() WHERE site_id = $2",
-                        len(site_data.get("errors", [])) == 0, site_id
-                    )
-                
-                # 保存状态快照
-                data = site_data.get("data", {})
-                if "coolerState" in data and data["coolerState"].get("status") == "success":
-                    params = data["coolerState"]["data"].get("params", {})
-                    await conn.execute(
-                        """INSERT INTO status_snapshots 
-                           (site_id, supply_temp, return_temp, flow_rate, pressure, 
-                            compressor_speed, fan_speed, operation_mode)
-                           VALUES ($1, $2, $3, $4, $5, $6, $7, $8)""",
-                        site_id,
-                        params.get("supply_temp"),
-                        params.get("return_temp"),
-                        params.get("flow_rate"),
-                        params.get("pressure"),
-                        params.get("compressor_speed"),
-                        params.get("fan_speed"),
-                        params.get("operation_mode")
+
+                # 批量写入状态快照，并在同一事务内更新最新状态表
+                if snapshots:
+                    await conn.execute(SNAPSHOT_STAGE_SQL)
+                    await conn.copy_records_to_table(
+                        "snapshot_stage", records=snapshots, columns=SNAPSHOT_COLUMNS
                     )
-                
-                logger.debug(f"站点 {ip} 数据已保存")
-                
-            except Exception as e:
-                logger.error(f"保存站点 {ip} 数据失败：{e}")
+                    await conn.execute(INSERT_SNAPSHOTS_SQL)
+                    await conn.execute(UPSERT_LATEST_STATUS_SQL)
+                    if SNAPSHOT_ROLLUP_UPSERT:
+                        for sql in UPSERT_ROLLUP_SQLS:
+                            await conn.execute(sql)
+
+                # 矿机详情：每个站点一条多行 upsert，executemany 在一次往返中批量发送
+                if miner_rows:
+                    await conn.executemany(UPSERT_MINERS_SQL, miner_rows)
+                if history:
+                    await conn.executemany(INSERT_HISTORY_SQL, [batch.args() for batch in history])
+        except asyncpg.ForeignKeyViolationError as e:
+            # 站点被删除而注册表尚未收到通知，触发重新加载
+            site_registry.invalidate()
+            logger.error(f"保存采集数据失败，站点注册表已失效：{e}")
+            return None
+        except Exception as e:
+            logger.error(f"保存采集数据失败：{e}")
+            return None
+
+    # 事务已提交：写入新站点映射，并把本次写入的值作为后续死区比较的基准
+    site_registry.apply(registered)
+    miner_history.commit(history)
+    stats = {
+        "sites": len(online_ids),
+        "snapshots": len(snapshots),
+        "miners": sum(len(rows[1]) for rows in miner_rows),
+        "miner_history": sum(len(batch) for batch in history),
+        "write_ms": round((time.perf_counter() - start) * 1000, 2),
+        "finished_at": datetime.utcnow().isoformat()
+    }
+    write_stats.update(stats)
+    logger.info(f"写库完成：{stats['sites']} 个站点，{stats['snapshots']} 条快照，"
+                f"{stats['miners']} 台矿机（历史 {stats['miner_history']} 行），耗时 {stats['write_ms']:.1f} ms")
+    return stats
 
 async def check_alerts():
-    """检查报警规则"""
+    """检查报警规则：集合评估后由状态机去抖，仅在状态迁移时写库和推送"""
     if not db_pool:
         return
     
-    async with db_pool.acquire() as conn:
-        # 获取启用的报警规则
-        rules = await conn.fetch("SELECT * FROM alert_rules WHERE is_enabled = TRUE")
-        
-        for rule in rules:
-            try:
-                # 获取最新数据检查是否触发报警
-                latest = await conn.fetchrow(
-                    f"""SELECT site_id, {rule['metric_name']} as value 
-                        FROM latest_site_status 
-                        WHERE {rule['metric_name']} IS NOT NULL"""
-                )
-                
-                if latest and should_trigger_alarm(latest["value"], rule):
-                    # 创建报警记录
-                    await conn.execute(
-                        """INSERT INTO alert_records 
-                           (rule_id, site_id, metric_name, metric_value, threshold_value, status)
-                           VALUES ($1, $2, $3, $4, $5, 'active')""",
-                        rule["rule_id"], latest["site_id"], 
-                        rule["metric_name"], latest["value"], rule["threshold_value"]
-                    )
-                    logger.info(f"触发报警：{rule['name']} - 站点 {latest['site_id']}")
-                    import asyncio
-                    asyncio.create_task(notify_all(
-                        latest['site_id'], 
-                        rule['name'], 
-                        f"检测到异常值 {latest['value']} (阈值 {rule['threshold_value']})", 
-                        float(latest['value'])
-                    ))
-                    
-            except Exception as e:
-                logger.error(f"检查报警规则 {rule['name']} 失败：{e}")
-
-def should_trigger_alarm(value: float, rule: dict) -> bool:
-    """判断是否应该触发报警"""
-    condition = rule["condition_type"]
-    threshold = rule["threshold_value"]
+    try:
+        async with db_pool.acquire() as conn:
+            fired, resolved = await alert_state.evaluate(conn)
+    except Exception as e:
+        logger.error(f"检查报警规则失败：{e}")
+        return
     
-    if condition == "gt":  # 大于
-        return value > threshold
-    elif condition == "lt":  # 小于
-        return value < threshold
-    elif condition == "eq":  # 等于
-        return value == threshold
-    elif condition == "change":  # 变化
-        return abs(value - threshold) > threshold * 0.1  # 10% 变化
+    for row in fired:
+        logger.info(f"触发报警：{row['name']} - 站点 {row['site_id']}")
+        state = alert_state.states.get((row['rule_id'], row['site_id']))
+        wall_hub.alert_fired({
+            "record_id": state.record_id if state else None,
+            "site_id": row['site_id'],
+            "rule_name": row['name'],
+            "metric_name": row['metric_name'],
+            "metric_value": row['value'],
+            "threshold_value": row['threshold_value'],
+            "message": describe_condition(row),
+            "triggered_at": datetime.utcnow()
+        })
+        alert_dispatcher.submit(
+            row['site_id'], 
+            row['name'], 
+            f"检测到异常值 {row['value']} (阈值 {row['threshold_value']})", 
+            float(row['value'])
+        )
     
-    return False
+    for (rule_id, site_id), state in resolved:
+        logger.info(f"报警恢复：{state.rule_name} - 站点 {site_id}")
+        wall_hub.alert_cleared(state.record_id, "resolved")
+        alert_dispatcher.submit(
+            site_id, 
+            state.rule_name, 
+            f"报警已恢复，{state.metric_name} 当前值恢复正常", 
+            float(state.value) if state.value is not None else None
+        )
 
 # ============= API 端点 =============
 @app.get("/api")
@@ -405,124 +835,134 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
-        "database": db_status
+        "database": db_status,
+        "last_write": write_stats or None,
+        "response_cache": response_cache.stats,
+        "miner_history": miner_history.stats
     }
 
 @app.get("/api/dashboard/overview", response_model=DashboardOverview)
-async def get_dashboard_overview():
-    """获取仪表盘总览数据"""
-    if not db_pool:
-        raise HTTPException(status_code=503, detail="数据库未连接")
-    
-    async with db_pool.acquire() as conn:
-        # 获取站点统计
-        stats = await conn.fetchrow("""
-            SELECT 
-                COUNT(*) as total,
-                COUNT(*) FILTER (WHERE is_online) as online,
-                COUNT(*) FILTER (WHERE NOT is_online) as offline
-            FROM sites
-        """)
-        
-        # 获取最新状态统计
-        latest_stats = await conn.fetchrow("""
-            SELECT 
-                SUM(total_power) as total_power,
-                SUM(total_hashrate) as total_hashrate,
-                AVG(supply_temp) as avg_supply_temp
-            FROM latest_site_status
-        """)
-        
-        # 获取活动报警数
-        alert_count = await conn.fetchval(
-            "SELECT COUNT(*) FROM alert_records WHERE status = 'active'"
-        )
-        
-        return DashboardOverview(
-            total_sites=stats["total"] or 0,
-            online_sites=stats["online"] or 0,
-            offline_sites=stats["offline"] or 0,
-            active_alerts=alert_count or 0,
-            total_power=float(latest_stats["total_power"]) if latest_stats["total_power"] else None,
-            total_hashrate=float(latest_stats["total_hashrate"]) if latest_stats["total_hashrate"] else None,
-            avg_supply_temp=float(latest_stats["avg_supply_temp"]) if latest_stats["avg_supply_temp"] else None
-        )
+async def get_dashboard_overview(request: Request):
+    """获取仪表盘总览数据（来自内存最新状态，缓存至下一批采集数据落库）"""
+    if not latest_state.loaded:
+        raise HTTPException(status_code=503, detail="站点状态尚未加载")
+    return await response_cache.respond(request, build_dashboard_overview)
+
+async def build_dashboard_overview() -> DashboardOverview:
+    totals = latest_state.overview()
+    return DashboardOverview(
+        total_sites=totals["total_sites"],
+        online_sites=totals["online_sites"],
+        offline_sites=totals["offline_sites"],
+        active_alerts=len(wall_hub.alerts),
+        total_power=totals["total_power"],
+        total_hashrate=totals["total_hashrate"],
+        avg_supply_temp=totals["avg_supply_temp"]
+    )
 
 @app.get("/api/sites", response_model=List[SiteStatus])
 async def get_all_sites(
+    request: Request,
     status: Optional[str] = Query(None, description="过滤状态：online/offline"),
     limit: int = Query(100, ge=1, le=1000)
 ):
-    """获取所有站点列表"""
-    if not db_pool:
-        raise HTTPException(status_code=503, detail="数据库未连接")
-
-    async with db_pool.acquire() as conn:
-        if status == "online":
-            rows = await conn.fetch(
-                "SELECT * FROM latest_site_status WHERE is_online = TRUE LIMIT $1", limit
-            )
-        elif status == "offline":
-            rows = await conn.fetch(
-                "SELECT * FROM latest_site_status WHERE is_online = FALSE LIMIT $1", limit
-            )
-        else:
-            rows = await conn.fetch(
-                "SELECT * FROM latest_site_status LIMIT $1", limit
-            )
+    """获取所有站点列表（来自内存最新状态，缓存至下一批采集数据落库）"""
+    if not latest_state.loaded:
+        raise HTTPException(status_code=503, detail="站点状态尚未加载")
+    return await response_cache.respond(request, lambda: build_site_list(status, limit))
 
-        # 转换 IP 地址为字符串 (PostgreSQL INET 类型返回 IPv4Address 对象)
-        result = []
-        for row in rows:
-            site_dict = dict(row)
-            if site_dict.get('ip_address'):
-                site_dict['ip_address'] = str(site_dict['ip_address'])
-            result.append(site_dict)
-        return result
+async def build_site_list(status: Optional[str], limit: int) -> List[SiteStatus]:
+    return [SiteStatus(**state.as_dict()) for state in latest_state.list(status, limit)]
 
 @app.get("/api/sites/{site_id}")
-async def get_site_detail(site_id: int):
-    """获取站点详细信息"""
+async def get_site_detail(
+    site_id: int,
+    max_points: Optional[int] = Query(None, ge=20, le=10000, description="趋势数据最多返回的点数，超出时按 LTTB 降采样")
+):
+    """获取站点详细信息（最新状态来自内存，趋势数据查询历史表）"""
     if not db_pool:
         raise HTTPException(status_code=503, detail="数据库未连接")
+    if not latest_state.loaded:
+        raise HTTPException(status_code=503, detail="站点状态尚未加载")
+    
+    site = latest_state.get(site_id)
+    if not site:
+        raise HTTPException(status_code=404, detail="站点不存在")
     
     async with db_pool.acquire() as conn:
-        site = await conn.fetchrow(
-            "SELECT * FROM latest_site_status WHERE site_id = $1", site_id
-        )
-        
-        if not site:
-            raise HTTPException(status_code=404, detail="站点不存在")
-        
         # 获取最近 24 小时趋势数据
         trends = await conn.fetch(
             """SELECT timestamp, supply_temp, return_temp, total_power, total_hashrate
                FROM status_snapshots
                WHERE site_id = $1 AND timestamp > NOW() - INTERVAL '24 hours'
-               ORDER BY timestamp DESC""",
+               ORDER BY timestamp ASC""",
             site_id
         )
         
+        trends = [dict(row) for row in trends]
+        if max_points:
+            trends = downsample_rows(trends, max_points)
+        
         return {
-            "site": dict(site),
-            "trends": [dict(row) for row in trends]
+            "site": site.as_dict(),
+            "trends": trends
         }
 
+@app.get("/api/sites/{site_id}/miners/{miner_index}/history")
+async def get_miner_history(
+    site_id: int,
+    miner_index: int,
+    hours: float = Query(24, gt=0, le=24 * 90, description="时间窗口（小时），未指定 start 时生效"),
+    start: Optional[datetime] = Query(None, description="窗口起点（不带时区按 UTC）"),
+    end: Optional[datetime] = Query(None, description="窗口终点（不带时区按 UTC），默认当前时间"),
+    step: Optional[int] = Query(None, ge=10, le=86400, description="按固定间隔（秒）采样，不传则返回变化点")
+):
+    """单台矿机历史：由 miner_history 的变化点重建阶梯函数序列（列式）"""
+    if not db_pool:
+        raise HTTPException(status_code=503, detail="数据库未连接")
+
+    end = end.replace(tzinfo=end.tzinfo or timezone.utc) if end else None
+    if start:
+        start = start.replace(tzinfo=start.tzinfo or timezone.utc)
+        end = end or datetime.now(timezone.utc)
+    else:
+        start, end = history_window(hours, end)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start 必须早于 end")
+    if step and (end - start).total_seconds() / step > 10000:
+        raise HTTPException(status_code=400, detail="采样点数超过 10000，请增大 step")
+
+    async with db_pool.acquire() as conn:
+        rows = await fetch_history(conn, site_id, miner_index, start, end)
+
+    return {
+        "site_id": site_id,
+        "miner_index": miner_index,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "step": step,
+        "changes": len(rows),
+        **step_series(rows, start, end, step)
+    }
+
 @app.get("/api/alerts", response_model=List[AlertRecord])
 async def get_alerts(
+    request: Request,
     status: str = Query("active", description="报警状态：active/acknowledged/resolved"),
     limit: int = Query(50, ge=1, le=500)
 ):
-    """获取报警列表"""
+    """获取报警列表（缓存至下一批采集数据落库或报警确认）"""
     if not db_pool:
         raise HTTPException(status_code=503, detail="数据库未连接")
-    
+    return await response_cache.respond(request, lambda: build_alert_list(status, limit))
+
+async def build_alert_list(status: str, limit: int) -> List[AlertRecord]:
     async with db_pool.acquire() as conn:
         rows = await conn.fetch(
             "SELECT * FROM alert_records WHERE status = $1 ORDER BY triggered_at DESC LIMIT $2",
             status, limit
         )
-        return [dict(row) for row in rows]
+        return [AlertRecord(**dict(row)) for row in rows]
 
 @app.post("/api/alerts/{alert_id}/acknowledge")
 async def acknowledge_alert(alert_id: int):
@@ -541,47 +981,104 @@ async def acknowledge_alert(alert_id: int):
         if result == "UPDATE 0":
             raise HTTPException(status_code=404, detail="报警不存在或已处理")
         
+        response_cache.invalidate()
+        wall_hub.alert_cleared(alert_id, "acknowledged")
         return {"message": "报警已确认", "alert_id": alert_id}
 
+def choose_rollup_resolution(hours: int, points: int) -> str:
+    """选择仍能在时间窗口内提供至少 points 个数据点的最粗分辨率，都不满足时用分钟级"""
+    window = hours * 3600
+    for name, (_, _, seconds) in reversed(ROLLUP_RESOLUTIONS.items()):
+        if window // seconds >= points:
+            return name
+    return "1m"
+
 @app.get("/api/trend/{metric}")
 async def get_trend(
     metric: str,
     hours: int = Query(24, ge=1, le=168),
-    site_id: Optional[int] = Query(None, description="站点 ID，不传则为所有站点平均值")
+    site_id: Optional[int] = Query(None, description="站点 ID，不传则为所有站点平均值"),
+    points: Optional[int] = Query(None, ge=1, le=10080, description="期望的最少数据点数，不传则单站点按分钟、所有站点按小时"),
+    max_points: Optional[int] = Query(None, ge=20, le=10000, description="最多返回的点数，超出时按 LTTB 降采样")
 ):
-    """获取趋势数据"""
+    """获取趋势数据（从趋势汇总表读取，按窗口和点数选择分辨率）"""
     if not db_pool:
         raise HTTPException(status_code=503, detail="数据库未连接")
     
-    valid_metrics = ["supply_temp", "return_temp", "total_power", "total_hashrate", "efficiency"]
-    if metric not in valid_metrics:
-        raise HTTPException(status_code=400, detail=f"无效的指标，可选：{valid_metrics}")
+    if metric not in ROLLUP_METRICS:
+        raise HTTPException(status_code=400, detail=f"无效的指标，可选：{ROLLUP_METRICS}")
+    
+    if points is None:
+        resolution = "1m" if site_id else "1h"
+    else:
+        resolution = choose_rollup_resolution(hours, points)
+    table, unit, _ = ROLLUP_RESOLUTIONS[resolution]
     
     async with db_pool.acquire() as conn:
         if site_id:
             rows = await conn.fetch(
-                f"""SELECT timestamp, {metric} as value
-                    FROM status_snapshots
-                    WHERE site_id = $1 AND timestamp > NOW() - INTERVAL '{hours} hours'
-                    ORDER BY timestamp""",
-                site_id
+                f"""SELECT bucket AS timestamp, {metric}_sum / NULLIF({metric}_count, 0) AS value
+                    FROM {table}
+                    WHERE site_id = $1 AND bucket >= DATE_TRUNC('{unit}', NOW() - make_interval(hours => $2))
+                    ORDER BY bucket""",
+                site_id, hours
             )
         else:
             rows = await conn.fetch(
-                f"""SELECT DATE_TRUNC('hour', timestamp) as timestamp, AVG({metric}) as value
-                    FROM status_snapshots
-                    WHERE timestamp > NOW() - INTERVAL '{hours} hours'
-                    GROUP BY DATE_TRUNC('hour', timestamp)
-                    ORDER BY timestamp"""
+                f"""SELECT bucket AS timestamp, SUM({metric}_sum) / NULLIF(SUM({metric}_count), 0) AS value
+                    FROM {table}
+                    WHERE bucket >= DATE_TRUNC('{unit}', NOW() - make_interval(hours => $1))
+                    GROUP BY bucket
+                    ORDER BY bucket""",
+                hours
             )
         
+        rows = [dict(row) for row in rows]
+        if max_points:
+            rows = downsample_rows(rows, max_points, value_keys=["value"])
+        
         return {
             "metric": metric,
             "hours": hours,
             "site_id": site_id,
+            "resolution": resolution,
             "data": [{"timestamp": row["timestamp"].isoformat(), "value": round(float(row["value"]), 2) if row["value"] is not None else 0} for row in rows]
         }
 
+# ============= 监控墙推送 =============
+@app.get("/api/wall/snapshot")
+async def get_wall_snapshot(request: Request):
+    """监控墙快照：总览计数、全部站点紧凑状态和活动报警
+
+    从内存中的监控墙状态生成列式 JSON（每个字段一个数组），不访问数据库；
+    支持 gzip / Brotli（安装 brotli 时），ETag 随状态序号变化。
+    """
+    if not wall_hub.loaded:
+        raise HTTPException(status_code=503, detail="监控墙状态尚未加载")
+    
+    headers = {"ETag": wall_hub.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request, wall_hub.etag):
+        return Response(status_code=304, headers=headers)
+    
+    body, encoding = wall_hub.encoded_columnar(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.websocket("/ws/wall")
+async def wall_socket(websocket: WebSocket):
+    """监控墙推送：连接后先发送完整快照，之后只推送站点差异和报警事件"""
+    await websocket.accept()
+    queue = wall_hub.subscribe()
+    try:
+        await websocket.send_text(wall_hub.snapshot())
+        while True:
+            await websocket.send_text(await wall_hub.next_message(queue))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        wall_hub.unsubscribe(queue)
+
 # ============= 主程序 =============
 
 # Ping检测API
@@ -605,20 +1102,123 @@ class ScanRequest(BaseModel):
     scan_type: str = 'all'
     port: int = 80
     concurrent_limit: int = 50
+    mode: str = Field('full', pattern='^(full|incremental)$')  # incremental: 仅复扫已知设备 + 轮换的未知地址片段
+
+class ScanJobRequest(BaseModel):
+    targets: List[str] = Field(..., min_length=1)  # CIDR、起止范围（a-b）或单个 IP
+    scan_type: str = 'all'
+    port: int = 80
+    concurrent_limit: int = Field(50, ge=1, le=999)
+    mode: str = Field('full', pattern='^(full|incremental)$')
+
+from scanner_module import scanner, scan_history
+from scan_jobs import scan_jobs
 
-from scanner_module import scanner
+# 单次扫描接口与扫描任务共享全局并发预算
+scanner.slot = lambda: scan_jobs.limiter.slot("default")
 
 @app.post("/api/scan/start")
 async def start_scan(req: ScanRequest):
-    return scanner.start_scan(req.start_ip, req.end_ip, req.scan_type, req.port, req.concurrent_limit)
+    return scanner.start_scan(req.start_ip, req.end_ip, req.scan_type, req.port, req.concurrent_limit, req.mode)
 
 @app.post("/api/scan/stop")
 async def stop_scan():
     return scanner.stop_scan()
 
+@app.get("/api/scan/history")
+async def get_scan_history(device_type: Optional[str] = None, limit: int = Query(1000, ge=1, le=10000)):
+    """历次扫描累积的设备记录，按最后响应时间倒序"""
+    if not db_pool:
+        raise HTTPException(status_code=503, detail="数据库未连接")
+    
+    query = """SELECT host(ip_address) AS ip, device_type, status, open_ports, fingerprint,
+                      latency_ms, first_seen, last_seen, last_scanned, miss_count
+               FROM scan_devices
+               WHERE $1::text IS NULL OR device_type = $1
+               ORDER BY last_seen DESC
+               LIMIT $2"""
+    async with db_pool.acquire() as conn:
+        rows = await conn.fetch(query, device_type, limit)
+    devices = []
+    for row in rows:
+        device = dict(row)
+        device["fingerprint"] = json.loads(device["fingerprint"]) if device["fingerprint"] else {}
+        devices.append(device)
+    return {"devices": devices, "count": len(devices)}
+
 @app.get("/api/scan/status")
-async def get_scan_status():
-    return scanner.get_status()
+async def get_scan_status(since: Optional[int] = Query(None, ge=0), scan_id: Optional[int] = None):
+    # 传入 since 时只返回该游标之后新发现的设备
+    return scanner.get_status(since, scan_id)
+
+def parse_scan_event_id(event_id: Optional[str]):
+    """解析 Last-Event-ID（格式为 scan_id:cursor）"""
+    try:
+        scan_id, cursor = event_id.split(":")
+        return int(scan_id), int(cursor)
+    except (AttributeError, ValueError):
+        return None, 0
+
+def scan_event_response(request: Request, source, since: int, scan_id: Optional[int]) -> StreamingResponse:
+    """扫描进度 SSE：推送计数器和新发现的设备，断线重连时按 Last-Event-ID 续传"""
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        scan_id, since = parse_scan_event_id(last_event_id)
+
+    async def events():
+        async for delta in source.stream(since, scan_id):
+            if await request.is_disconnected():
+                return
+            if delta is None:
+                yield ": keepalive\n\n"
+                continue
+            event = "progress" if delta["status"] == "scanning" else "done"
+            data = json.dumps(delta, ensure_ascii=False, default=str)
+            yield f"id: {delta['scan_id']}:{delta['cursor']}\nevent: {event}\ndata: {data}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.get("/api/scan/events")
+async def scan_events(request: Request, since: int = Query(0, ge=0), scan_id: Optional[int] = None):
+    return scan_event_response(request, scanner, since, scan_id)
+
+# ============= 扫描任务 =============
+def get_scan_job(job_id: str):
+    job = scan_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="扫描任务不存在")
+    return job
+
+@app.post("/api/scan/jobs")
+async def create_scan_job(req: ScanJobRequest):
+    """创建扫描任务；范围已被运行中的任务覆盖时直接返回该任务"""
+    try:
+        return scan_jobs.submit(req.targets, req.scan_type, req.port, req.concurrent_limit, req.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/scan/jobs")
+async def list_scan_jobs():
+    return {"jobs": scan_jobs.list(), "budget": scan_jobs.limiter.total, "in_use": scan_jobs.limiter.in_use}
+
+@app.get("/api/scan/jobs/{job_id}")
+async def get_scan_job_status(job_id: str, since: Optional[int] = Query(None, ge=0), scan_id: Optional[int] = None):
+    job = get_scan_job(job_id)
+    status = dict(job.scanner.get_status(since, scan_id))
+    status["job"] = job.describe()
+    return status
+
+@app.post("/api/scan/jobs/{job_id}/stop")
+async def stop_scan_job(job_id: str):
+    get_scan_job(job_id)
+    return scan_jobs.stop(job_id)
+
+@app.get("/api/scan/jobs/{job_id}/events")
+async def scan_job_events(request: Request, job_id: str, since: int = Query(0, ge=0), scan_id: Optional[int] = None):
+    return scan_event_response(request, get_scan_job(job_id).scanner, since, scan_id)
 
 
 if __name__ == "__main__":
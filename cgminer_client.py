@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+CGMiner / BMMiner API 客户端
+通过 4028 端口的 JSON API 一次连接获取 summary+stats+pools+devs，
+读取到 NUL 或 EOF 为止，整个请求受单一超时预算约束。
+供网络扫描（设备指纹）和采集器（逐台矿机数据）共用
+"""
+
+import asyncio
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+logger = logging.getLogger("cgminer_client")
+
+CGMINER_PORT = 4028
+
+# 单台矿机一次查询（连接 + 发送 + 读取）的总超时（秒）
+CGMINER_TIMEOUT = 3.0
+
+# 响应体上限，防止异常设备持续发送数据
+MAX_RESPONSE_BYTES = 1024 * 1024
+
+READ_CHUNK = 16 * 1024
+
+DEFAULT_COMMANDS = ("summary", "stats", "pools", "devs")
+
+# 部分 BMMiner 固件在 stats 中输出 "}{" 而不是 "},{"
+_MISSING_COMMA = re.compile(r"\}\s*\{")
+
+
+class CGMinerError(Exception):
+    """CGMiner API 请求失败（连接、超时、响应格式或命令错误）"""
+
+
+def parse_response(raw: bytes) -> Dict[str, Any]:
+    """解析 API 响应，兼容结尾 NUL 和常见固件的非法 JSON"""
+    text = raw.rstrip(b"\0").decode("utf-8", errors="ignore").strip()
+    if not text:
+        raise CGMinerError("空响应")
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(_MISSING_COMMA.sub("},{", text).replace(":nan", ":null").replace(":inf", ":null"))
+    except ValueError as e:
+        raise CGMinerError(f"响应不是合法 JSON: {e}")
+
+
+def command_failed(response: Dict[str, Any]) -> bool:
+    """STATUS 为 E/F 表示命令失败（如固件不支持多命令）"""
+    status = response.get("STATUS")
+    if isinstance(status, list) and status:
+        return status[0].get("STATUS") in ("E", "F")
+    return False
+
+
+class CGMinerClient:
+    """CGMiner API 客户端
+
+    cgminer 每个连接只处理一个请求，因此多个命令通过 "a+b+c" 多命令语法合并到同一连接；
+    不支持多命令的旧固件自动退回为逐个命令请求，共享剩余的超时预算。
+    """
+
+    def __init__(self, port: int = CGMINER_PORT, timeout: float = CGMINER_TIMEOUT):
+        self.port = port
+        self.timeout = timeout
+
+    async def request(self, host: str, command: str, parameter: Optional[str] = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """发送单个（或 "+" 连接的多个）命令，返回解析后的响应"""
+        payload = {"command": command}
+        if parameter is not None:
+            payload["parameter"] = parameter
+        try:
+            raw = await asyncio.wait_for(self._exchange(host, json.dumps(payload).encode()),
+                                         timeout=timeout or self.timeout)
+        except asyncio.TimeoutError:
+            raise CGMinerError(f"{host}:{self.port} 请求超时")
+        except OSError as e:
+            raise CGMinerError(f"{host}:{self.port} 连接失败: {e}")
+        return parse_response(raw)
+
+    async def _exchange(self, host: str, payload: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection(host, self.port)
+        try:
+            writer.write(payload)
+            await writer.drain()
+            chunks = []
+            size = 0
+            while True:
+                chunk = await reader.read(READ_CHUNK)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+                if chunk.endswith(b"\0"):
+                    break
+                if size > MAX_RESPONSE_BYTES:
+                    raise CGMinerError(f"{host}:{self.port} 响应超过 {MAX_RESPONSE_BYTES} 字节")
+            return b"".join(chunks)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def fetch(self, host: str, commands: Sequence[str] = DEFAULT_COMMANDS) -> Dict[str, Dict[str, Any]]:
+        """一次获取多个命令的结果，返回 {命令: 该命令的响应}"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+
+        response = await self.request(host, "+".join(commands))
+        if len(commands) == 1:
+            if command_failed(response):
+                raise CGMinerError(f"{host} 命令 {commands[0]} 失败: {response['STATUS'][0].get('Msg')}")
+            return {commands[0]: response}
+
+        # 多命令响应形如 {"summary": [{...}], "stats": [{...}]}
+        if not command_failed(response) and all(c in response for c in commands):
+            return {c: response[c][0] if isinstance(response[c], list) and response[c] else {}
+                    for c in commands}
+
+        logger.debug(f"{host} 不支持多命令，逐个请求")
+        results = {}
+        for command in commands:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise CGMinerError(f"{host}:{self.port} 请求超时")
+            single = await self.request(host, command, timeout=remaining)
+            if not command_failed(single):
+                results[command] = single
+        if not results:
+            raise CGMinerError(f"{host} 所有命令均失败")
+        return results
+
+    async def fetch_many(self, hosts: Sequence[str], commands: Sequence[str] = DEFAULT_COMMANDS,
+                         concurrency: int = 32) -> List[Optional[Dict[str, Dict[str, Any]]]]:
+        """并发查询多台矿机，失败的位置为 None"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(host: str):
+            async with semaphore:
+                try:
+                    return await self.fetch(host, commands)
+                except CGMinerError as e:
+                    logger.debug(str(e))
+                    return None
+
+        return await asyncio.gather(*(one(host) for host in hosts))
+
+
+# ============= 响应解析 =============
+def _section(result: Dict[str, Any], command: str, key: str) -> List[Dict[str, Any]]:
+    section = (result.get(command) or {}).get(key)
+    return section if isinstance(section, list) else []
+
+
+def _numbers(entries: List[Dict[str, Any]], pattern: "re.Pattern") -> List[float]:
+    values = []
+    for entry in entries:
+        for key, value in entry.items():
+            if pattern.match(key) and isinstance(value, (int, float)) and value > 0:
+                values.append(float(value))
+    return values
+
+
+_TEMP_KEY = re.compile(r"^temp(_chip|2_\d+|_pcb|\d*)$", re.IGNORECASE)
+_FAN_KEY = re.compile(r"^fan\d+$", re.IGNORECASE)
+_DEV_TEMP_KEY = re.compile(r"^Temperature$")
+_SUMMARY_TEMP_KEY = re.compile(r"^(Temperature|Temp)$")
+
+
+def hashrate_ghs(summary: Dict[str, Any]) -> Optional[float]:
+    """SUMMARY 中的算力统一换算为 GH/s"""
+    for key, scale in (("GHS 5s", 1), ("GHS av", 1), ("MHS 5s", 1e-3), ("MHS av", 1e-3)):
+        value = summary.get(key)
+        if value not in (None, ""):
+            try:
+                return round(float(value) * scale, 2)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def summarize(result: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """将 fetch() 结果整理为单台矿机的状态记录（字段与 AntBox minerInfo 中的矿机一致）"""
+    summary = next(iter(_section(result, "summary", "SUMMARY")), {})
+    stats = _section(result, "stats", "STATS")
+    devs = _section(result, "devs", "DEVS")
+    pools = _section(result, "pools", "POOLS")
+
+    temps = (_numbers(stats, _TEMP_KEY) or _numbers(devs, _DEV_TEMP_KEY)
+             or _numbers([summary], _SUMMARY_TEMP_KEY))
+    fans = _numbers(stats, _FAN_KEY)
+    hardware_errors = summary.get("Hardware Errors") or 0
+    dead_devs = [d for d in devs if d.get("Status") not in (None, "Alive") or d.get("Enabled") == "N"]
+    model = next((s.get("Type") for s in stats if s.get("Type")), None)
+    active_pool = next((p for p in pools if p.get("Stratum Active")), pools[0] if pools else {})
+
+    return {
+        "hashrate": hashrate_ghs(summary),
+        "temperature": max(temps) if temps else None,
+        "fan_speed": int(max(fans)) if fans else None,
+        "is_online": True,
+        "has_error": bool(dead_devs) or (hardware_errors > 0 and (summary.get("Device Hardware%") or 0) > 1),
+        "model": model,
+        "pool": active_pool.get("URL"),
+        "elapsed": summary.get("Elapsed"),
+        "hardware_errors": hardware_errors
+    }
+
+
+def miner_info_response(hosts: Sequence[str], results: Sequence[Optional[Dict[str, Dict[str, Any]]]]) -> Dict[str, Any]:
+    """将逐台 CGMiner 查询结果组装为与 AntBox minerInfo 接口相同格式的响应"""
+    miners = []
+    for index, (host, result) in enumerate(zip(hosts, results)):
+        if result is None:
+            miner = {"hashrate": 0, "temperature": None, "is_online": False, "has_error": True}
+        else:
+            miner = summarize(result)
+            miner["hashrate"] = miner["hashrate"] or 0
+        miner.update({"index": index, "ip_address": host, "mac_address": None})
+        miners.append(miner)
+
+    temps = [m["temperature"] for m in miners if m.get("temperature") is not None]
+    return {
+        "ok": True,
+        "source": "cgminer",
+        "params": {
+            "hashrate_unit": "GH/s",
+            "miners": miners,
+            "avg_miner_temp": round(sum(temps) / len(temps), 2) if temps else None
+        }
+    }
+
+
+cgminer_client = CGMinerClient()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+采集调度器
+每个站点按各自的采集间隔运行，并在间隔内分配固定的相位偏移，
+使请求和写库负载均匀分布，而不是每个周期集中爆发一次
+"""
+
+import asyncio
+import heapq
+import logging
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("collection_scheduler")
+
+
+class SiteSchedule:
+    """单个站点的调度状态"""
+    __slots__ = ("site", "interval", "next_due", "generation")
+
+    def __init__(self, site: Dict[str, Any], interval: float, next_due: float, generation: int):
+        self.site = site
+        self.interval = interval
+        self.next_due = next_due
+        self.generation = generation
+
+
+class CollectionScheduler:
+    """按站点相位错开的采集调度器
+
+    fetch(site) 采集单个站点并返回结果；结果先进入缓冲区，
+    每 flush_interval 秒调用一次 flush(results) 批量落库。
+    next_interval(site, interval) 可根据采集结果返回更长的下次间隔（失败退避）。
+    上一次采集超过采集间隔仍未结束的站点跳过本次，不会并发采集同一站点。
+    """
+
+    def __init__(self,
+                 fetch: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 flush: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                 next_interval: Optional[Callable[[Dict[str, Any], float], float]] = None,
+                 default_interval: float = 60,
+                 flush_interval: float = 5,
+                 max_in_flight: int = 50,
+                 jitter: float = 0.2):
+        self.fetch = fetch
+        self.flush = flush
+        self.next_interval = next_interval
+        self.default_interval = default_interval
+        self.flush_interval = flush_interval
+        self.jitter = jitter
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.schedules: Dict[str, SiteSchedule] = {}
+        self.heap: List[tuple] = []
+        self.buffer: List[Dict[str, Any]] = []
+        self.generation = 0
+        self.in_flight: set = set()
+        self.fetching: set = set()  # 正在采集的站点 IP
+        self.stats = {"fetched": 0, "failed": 0, "skipped": 0, "flushes": 0}
+
+    def site_interval(self, site: Dict[str, Any]) -> float:
+        return float(site.get("interval") or self.default_interval)
+
+    def set_sites(self, sites: List[Dict[str, Any]]):
+        """设置（或更新）站点列表，同一间隔的站点在间隔内均匀错开
+
+        相位偏移 = interval * 序号 / 同间隔站点数，再叠加不超过相邻间距
+        jitter 比例的随机抖动，避免多个 API 进程之间完全对齐。
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        self.generation += 1
+
+        groups: Dict[float, List[Dict[str, Any]]] = {}
+        for site in sites:
+            groups.setdefault(self.site_interval(site), []).append(site)
+
+        schedules: Dict[str, SiteSchedule] = {}
+        for interval, group in groups.items():
+            spacing = interval / len(group)
+            for index, site in enumerate(group):
+                previous = self.schedules.get(site["ip"])
+                if previous and previous.interval == interval:
+                    next_due = previous.next_due
+                else:
+                    next_due = now + index * spacing + random.uniform(0, spacing * self.jitter)
+                schedules[site["ip"]] = SiteSchedule(site, interval, next_due, self.generation)
+
+        self.schedules = schedules
+        self.heap = [(s.next_due, ip, s.generation) for ip, s in schedules.items()]
+        heapq.heapify(self.heap)
+        logger.info(f"调度 {len(schedules)} 个站点，采集间隔分组：" +
+                    ", ".join(f"{interval:g}s x {len(group)}" for interval, group in sorted(groups.items())))
+
+    async def run(self):
+        """调度主循环，直到被取消"""
+        flush_task = asyncio.create_task(self._flush_loop())
+        try:
+            await self._dispatch_loop()
+        finally:
+            flush_task.cancel()
+            for task in list(self.in_flight):
+                task.cancel()
+
+    async def _dispatch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.heap:
+                await asyncio.sleep(1)
+                continue
+
+            due, ip, generation = self.heap[0]
+            now = loop.time()
+            if due > now:
+                # 最多睡 1 秒，以便及时响应 set_sites 的更新
+                await asyncio.sleep(min(due - now, 1.0))
+                continue
+
+            heapq.heappop(self.heap)
+            schedule = self.schedules.get(ip)
+            if schedule is None or schedule.generation != generation or schedule.next_due != due:
+                continue
+
+            if ip in self.fetching:
+                # 上一次采集尚未结束，跳过本次，按原相位等待下一个间隔
+                self.stats["skipped"] += 1
+            else:
+                await self.semaphore.acquire()
+                self.fetching.add(ip)
+                task = asyncio.create_task(self._collect(schedule, now))
+                self.in_flight.add(task)
+                task.add_done_callback(self.in_flight.discard)
+
+            # 按固定间隔推进，落后超过一个间隔时从当前时间重新开始，避免补发堆积
+            schedule.next_due += schedule.interval
+            if schedule.next_due < now:
+                schedule.next_due = now + schedule.interval
+            heapq.heappush(self.heap, (schedule.next_due, ip, generation))
+
+    async def _collect(self, schedule: SiteSchedule, started: float):
+        site = schedule.site
+        try:
+            result = await self.fetch(site)
+            self.buffer.append(result)
+            self.stats["fetched"] += 1
+            if result.get("errors"):
+                self.stats["failed"] += 1
+        except Exception as e:
+            logger.error(f"站点 {site.get('ip')} 采集异常：{e}")
+            self.stats["failed"] += 1
+        finally:
+            self.fetching.discard(site["ip"])
+            self.semaphore.release()
+
+        if self.next_interval is None:
+            return
+        # 失败退避：推迟下次采集；恢复后 next_interval 返回正常间隔，按原相位继续
+        interval = self.next_interval(site, schedule.interval)
+        if interval > schedule.interval and started + interval > schedule.next_due:
+            schedule.next_due = started + interval
+            heapq.heappush(self.heap, (schedule.next_due, site["ip"], schedule.generation))
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        last_summary = loop.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush_now()
+
+            if loop.time() - last_summary >= self.default_interval:
+                last_summary = loop.time()
+                logger.info(f"过去 {self.default_interval:g} 秒采集 {self.stats['fetched']} 个站点，"
+                            f"失败 {self.stats['failed']}，采集未完成跳过 {self.stats['skipped']}，"
+                            f"写库 {self.stats['flushes']} 次")
+                self.stats = {"fetched": 0, "failed": 0, "skipped": 0, "flushes": 0}
+
+    async def flush_now(self) -> Optional[Any]:
+        """立即将缓冲区中的采集结果交给 flush 处理"""
+        if not self.buffer:
+            return None
+        batch, self.buffer = self.buffer, []
+        self.stats["flushes"] += 1
+        try:
+            return await self.flush(batch)
+        except Exception as e:
+            logger.error(f"采集结果落库失败：{e}")
+            return None
@@ -12,6 +12,9 @@ from datetime import datetime
 from typing import Dict, List, Any, Optional
 import sys
 import os
+import time
+
+from cgminer_client import cgminer_client, miner_info_response
 
 # 配置日志
 logging.basicConfig(
@@ -20,17 +23,255 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# HTTP 连接池参数：会话跨采集周期常驻，复用长连接和 DNS 缓存
+CONNECTOR_LIMIT = 50            # 全局并发连接上限
+CONNECTOR_LIMIT_PER_HOST = 3    # 每个 AntBox 的并发连接数（对应 3 个 API 端点）
+KEEPALIVE_TIMEOUT = 90          # 空闲长连接保留时间（秒），需大于采集间隔才能跨周期复用
+DNS_CACHE_TTL = 300             # DNS 缓存时间（秒）
+
+class ConnectionStats:
+    """基于 aiohttp TraceConfig 统计连接新建与复用次数"""
+    
+    def __init__(self):
+        self.created = 0
+        self.reused = 0
+    
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_create)
+        trace.on_connection_reuseconn.append(self._on_reuse)
+        return trace
+    
+    async def _on_create(self, session, ctx, params):
+        self.created += 1
+    
+    async def _on_reuse(self, session, ctx, params):
+        self.reused += 1
+    
+    def reset(self) -> Dict[str, Any]:
+        """返回自上次重置以来的统计并清零"""
+        total = self.created + self.reused
+        stats = {
+            "created": self.created,
+            "reused": self.reused,
+            "reuse_rate": round(self.reused / total, 3) if total else None
+        }
+        self.created = 0
+        self.reused = 0
+        return stats
+
+def create_collector_session(stats: Optional[ConnectionStats] = None,
+                             limit: int = CONNECTOR_LIMIT,
+                             limit_per_host: int = CONNECTOR_LIMIT_PER_HOST) -> aiohttp.ClientSession:
+    """创建采集器使用的常驻 HTTP 会话"""
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        enable_cleanup_closed=True
+    )
+    trace_configs = [stats.trace_config()] if stats else None
+    return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+
+# 站点健康跟踪参数：连续失败的站点按指数退避降低采集频率
+MAX_BACKOFF = 300               # 退避后的最长采集间隔（秒）
+PROBE_TIMEOUT = 1.0             # 失败站点 HTTP 采集前的 TCP 探测超时（秒）
+
+class SiteHealth:
+    """单个站点的健康状态"""
+    __slots__ = ("failures", "last_attempt")
+    
+    def __init__(self):
+        self.failures = 0
+        self.last_attempt = 0.0
+
+class SiteHealthTracker:
+    """站点健康跟踪
+
+    连续失败的站点采集间隔按 2 的幂退避（上限 MAX_BACKOFF），
+    且每次采集前先做一次廉价的 TCP 探测；一旦成功立即恢复正常间隔。
+    """
+    
+    def __init__(self, max_backoff: float = MAX_BACKOFF):
+        self.max_backoff = max_backoff
+        self.sites: Dict[str, SiteHealth] = {}
+    
+    def _get(self, ip: str) -> SiteHealth:
+        health = self.sites.get(ip)
+        if health is None:
+            health = self.sites[ip] = SiteHealth()
+        return health
+    
+    def is_failing(self, ip: str) -> bool:
+        health = self.sites.get(ip)
+        return health is not None and health.failures > 0
+    
+    def record_success(self, ip: str):
+        health = self._get(ip)
+        if health.failures:
+            logger.info(f"站点 {ip} 已恢复（此前连续失败 {health.failures} 次）")
+        health.failures = 0
+        health.last_attempt = time.monotonic()
+    
+    def record_failure(self, ip: str):
+        health = self._get(ip)
+        health.failures += 1
+        health.last_attempt = time.monotonic()
+    
+    def next_interval(self, ip: str, interval: float) -> float:
+        """根据连续失败次数计算下次采集间隔"""
+        health = self.sites.get(ip)
+        if health is None or health.failures == 0:
+            return interval
+        return min(interval * 2 ** min(health.failures, 16), max(self.max_backoff, interval))
+    
+    def should_poll(self, ip: str, interval: float) -> bool:
+        """非调度模式（整轮采集）下判断站点本轮是否需要采集"""
+        health = self.sites.get(ip)
+        if health is None or health.failures == 0:
+            return True
+        return time.monotonic() - health.last_attempt >= self.next_interval(ip, interval)
+    
+    def failing_count(self) -> int:
+        return sum(1 for health in self.sites.values() if health.failures)
+
+async def tcp_probe(host: str, port: int = 80, timeout: float = PROBE_TIMEOUT) -> bool:
+    """TCP 连接探测，连接建立即视为可达"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
+
 class SiteConfig:
     """站点配置"""
-    def __init__(self, ip: str, location: str = ""):
+    def __init__(self, ip: str, location: str = "", port: Optional[int] = None,
+                 miner_ips: Optional[List[str]] = None):
         self.ip = ip
         self.location = location
-        self.base_url = f"http://{ip}"
+        self.port = port or 80
+        self.miner_ips = miner_ips or []  # 配置后通过 CGMiner API 逐台获取矿机数据
+        self.base_url = f"http://{ip}:{port}" if port else f"http://{ip}"
         
     def get_api_url(self, endpoint: str) -> str:
         """构建完整的API URL"""
         return f"{self.base_url}{endpoint}"
 
+# ============= 响应解析（api_server 落库与本原型共用） =============
+# 单台矿机算力单位 -> GH/s 换算系数。miner_details.hashrate 为 GH/s，站点 total_hashrate 为 PH/s
+HASHRATE_UNIT_GHS = {"GH/s": 1.0, "TH/s": 1e3, "PH/s": 1e6}
+GHS_PER_PHS = 1_000_000
+# AntBox minerInfo 不标注单位，按 TH/s 上报（189 台 S19 XP Hyd. 合计约 48 PH/s，见 ui_design.md）；
+# 其他来源在 params.hashrate_unit 中标注（CGMiner 为 GH/s）
+ANTBOX_HASHRATE_UNIT = "TH/s"
+
+def parse_cooler_state(data: Dict[str, Any]) -> Dict[str, Any]:
+    """解析冷却系统状态数据"""
+    if not data.get("ok") or "params" not in data:
+        return {}
+    
+    params = data["params"]
+    return {
+        "supply_temp": params.get("supply_temp"),  # 供液温度
+        "return_temp": params.get("return_temp"),  # 回液温度
+        "target_temp": params.get("target_temp"),  # 设定温度
+        "flow_rate": params.get("flow_rate"),      # 流量
+        "pressure": params.get("pressure"),        # 压力
+        "compressor_speed": params.get("compressor_speed"),  # 压缩机转速
+        "fan_speed": params.get("fan_speed"),      # 风机转速
+        "fault_flags": params.get("fault_flags"),  # 故障标志
+        "warning_flags": params.get("warning_flags"),  # 警告标志
+        "operation_mode": params.get("operation_mode")  # 运行模式
+    }
+
+def parse_sensor_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """解析传感器数据"""
+    if not data.get("ok") or "params" not in data:
+        return {}
+    
+    params = data["params"]
+    return {
+        "ambient_temp": params.get("ambient_temp"),      # 环境温度
+        "ambient_humidity": params.get("ambient_humidity"),  # 环境湿度
+        "cabinet_temp": params.get("cabinet_temp"),      # 机柜温度
+        "total_power": params.get("total_power"),        # 总功耗
+        "power_factor": params.get("power_factor"),      # 功率因数
+        "voltage": params.get("voltage"),                # 电压
+        "current": params.get("current"),                # 电流
+        "energy_consumption": params.get("energy_consumption")  # 累计能耗
+    }
+
+def parse_miner_info(data: Dict[str, Any]) -> Dict[str, Any]:
+    """解析矿机信息"""
+    if not data.get("ok") or "params" not in data:
+        return {}
+    
+    params = data["params"]
+    miners = params.get("miners", [])
+    unit = params.get("hashrate_unit", ANTBOX_HASHRATE_UNIT)
+    to_ghs = HASHRATE_UNIT_GHS.get(unit)
+    if to_ghs is None:
+        logger.warning(f"未知的算力单位 {unit!r}，按 {ANTBOX_HASHRATE_UNIT} 处理")
+        to_ghs = HASHRATE_UNIT_GHS[ANTBOX_HASHRATE_UNIT]
+    
+    total_hashrate = 0.0  # GH/s
+    online_count = 0
+    miner_details = []
+    
+    for position, miner in enumerate(miners):
+        hashrate = miner.get("hashrate") or 0
+        if isinstance(hashrate, (int, float)) and not isinstance(hashrate, bool):
+            hashrate = hashrate * to_ghs
+            total_hashrate += hashrate
+        else:
+            hashrate = None
+        
+        if miner.get("is_online"):
+            online_count += 1
+        
+        index = miner.get("index")
+        miner_details.append({
+            "index": position if index is None else index,
+            "mac_address": miner.get("mac_address"),
+            "ip_address": miner.get("ip_address"),
+            "hashrate": hashrate,
+            "temperature": miner.get("temperature"),
+            "fan_speed": miner.get("fan_speed"),
+            "is_online": miner.get("is_online"),
+            "has_error": miner.get("has_error")
+        })
+    
+    return {
+        "miner_count": len(miners),
+        "online_miner_count": online_count,
+        "total_hashrate": round(total_hashrate / GHS_PER_PHS, 4),
+        "efficiency": params.get("efficiency"),  # 能效比
+        "avg_miner_temp": params.get("avg_miner_temp"),  # 平均温度
+        "miner_details": miner_details
+    }
+
+# 端点名 -> 解析函数
+PAYLOAD_PARSERS = {
+    "coolerState": parse_cooler_state,
+    "sensorData": parse_sensor_data,
+    "minerInfo": parse_miner_info
+}
+
+def parse_payloads(payloads: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """将一个站点各端点的原始响应（端点名 -> 响应 JSON）合并为一条扁平记录"""
+    merged: Dict[str, Any] = {}
+    for name, parser in PAYLOAD_PARSERS.items():
+        payload = payloads.get(name)
+        if isinstance(payload, dict):
+            merged.update(parser(payload))
+    return merged
+
 class DataCollector:
     """数据采集器"""
     
@@ -38,7 +279,21 @@ class DataCollector:
         self.config_path = config_path
         self.sites: List[SiteConfig] = []
         self.api_endpoints: Dict[str, str] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.connection_stats = ConnectionStats()
+        self.health = SiteHealthTracker()
         self.load_config()
+    
+    async def start(self):
+        """创建常驻 HTTP 会话"""
+        if self.session is None or self.session.closed:
+            self.session = create_collector_session(self.connection_stats)
+    
+    async def close(self):
+        """关闭 HTTP 会话"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
         
     def load_config(self):
         """加载配置文件"""
@@ -50,7 +305,9 @@ class DataCollector:
             for site_info in config.get("sites", []):
                 site = SiteConfig(
                     ip=site_info["ip"],
-                    location=site_info.get("location", "")
+                    location=site_info.get("location", ""),
+                    port=site_info.get("port"),
+                    miner_ips=site_info.get("miner_ips")
                 )
                 self.sites.append(site)
                 
@@ -79,16 +336,30 @@ class DataCollector:
             "errors": []
         }
         
+        # 连续失败的站点先做 TCP 探测，不可达则跳过 HTTP 采集
+        if self.health.is_failing(site.ip) and not await tcp_probe(site.ip, site.port):
+            self.health.record_failure(site.ip)
+            site_data["errors"].append("TCP 探测失败，站点不可达")
+            return site_data
+        
+        # 配置了 miner_ips 的站点通过 CGMiner API 逐台获取矿机数据，替代 minerInfo 端点
+        endpoints = {name: path for name, path in self.api_endpoints.items()
+                     if not (site.miner_ips and name == "minerInfo")}
+        
         # 并发获取所有API端点数据
         tasks = []
-        for endpoint_name, endpoint_path in self.api_endpoints.items():
+        for endpoint_name, endpoint_path in endpoints.items():
             task = self.fetch_api_endpoint(session, site, endpoint_name, endpoint_path)
             tasks.append(task)
+        names = list(endpoints.keys())
+        if site.miner_ips:
+            tasks.append(self.fetch_miners(site))
+            names.append("minerInfo")
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # 处理结果
-        for endpoint_name, result in zip(self.api_endpoints.keys(), results):
+        for endpoint_name, result in zip(names, results):
             if isinstance(result, Exception):
                 error_msg = f"{endpoint_name} 采集失败: {str(result)}"
                 logger.error(f"站点 {site.ip} - {error_msg}")
@@ -96,8 +367,24 @@ class DataCollector:
             else:
                 site_data["data"][endpoint_name] = result
         
+        if site_data["data"]:
+            self.health.record_success(site.ip)
+        else:
+            self.health.record_failure(site.ip)
+        
         return site_data
     
+    async def fetch_miners(self, site: SiteConfig) -> Dict[str, Any]:
+        """通过 CGMiner API 获取逐台矿机数据，组装为 minerInfo 格式"""
+        results = await cgminer_client.fetch_many(site.miner_ips)
+        if not any(results):
+            raise ConnectionError(f"{len(site.miner_ips)} 台矿机 CGMiner API 均无响应")
+        return {
+            "status": "success",
+            "http_status": None,
+            "response": miner_info_response(site.miner_ips, results)
+        }
+    
     async def fetch_api_endpoint(self, session: aiohttp.ClientSession, 
                                  site: SiteConfig, endpoint_name: str, 
                                  endpoint_path: str) -> Dict[str, Any]:
@@ -130,11 +417,16 @@ class DataCollector:
                         }
                         
             except asyncio.TimeoutError:
-                if attempt == self.retry_count - 1:
-                    raise TimeoutError(f"请求超时 (尝试 {self.retry_count} 次)")
+                # 已知失败的站点不再重试，避免长时间占用连接
+                if attempt == self.retry_count - 1 or self.health.is_failing(site.ip):
+                    raise TimeoutError(f"请求超时 (尝试 {attempt + 1} 次)")
                 logger.warning(f"站点 {site.ip} - {endpoint_name} 第 {attempt+1} 次超时，重试...")
                 await asyncio.sleep(1)  # 等待后重试
                 
+            except aiohttp.ClientConnectorError as e:
+                # 无法建立连接（拒绝/不可达）时重试无意义，直接失败
+                raise ConnectionError(f"连接错误: {str(e)}")
+                
             except aiohttp.ClientError as e:
                 if attempt == self.retry_count - 1:
                     raise ConnectionError(f"连接错误: {str(e)}")
@@ -148,15 +440,18 @@ class DataCollector:
         """采集所有站点数据"""
         logger.info(f"开始采集 {len(self.sites)} 个站点数据")
         
-        connector = aiohttp.TCPConnector(limit=50)  # 限制并发连接数
-        async with aiohttp.ClientSession(connector=connector) as session:
-            tasks = []
-            for site in self.sites:
-                task = self.fetch_site_data(session, site)
-                tasks.append(task)
-            
-            # 并发执行所有站点采集
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        await self.start()
+        tasks = []
+        for site in self.sites:
+            # 退避中的站点本轮跳过
+            if self.health.should_poll(site.ip, self.collection_interval):
+                task = self.fetch_site_data(self.session, site)
+            else:
+                task = self.skip_site(site)
+            tasks.append(task)
+        
+        # 并发执行所有站点采集
+        results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # 处理采集结果
         collected_data = []
@@ -173,81 +468,20 @@ class DataCollector:
                 })
             else:
                 collected_data.append(result)
-                logger.info(f"站点 {site.ip} 采集成功")
+                if not result["errors"]:
+                    logger.info(f"站点 {site.ip} 采集成功")
         
         return collected_data
     
-    def parse_cooler_state(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """解析冷却系统状态数据"""
-        if not data.get("ok") or "params" not in data:
-            return {}
-        
-        params = data["params"]
+    async def skip_site(self, site: SiteConfig) -> Dict[str, Any]:
+        """退避中的站点返回跳过记录"""
         return {
-            "supply_temp": params.get("supply_temp"),  # 供液温度
-            "return_temp": params.get("return_temp"),  # 回液温度
-            "target_temp": params.get("target_temp"),  # 设定温度
-            "flow_rate": params.get("flow_rate"),      # 流量
-            "pressure": params.get("pressure"),        # 压力
-            "compressor_speed": params.get("compressor_speed"),  # 压缩机转速
-            "fan_speed": params.get("fan_speed"),      # 风机转速
-            "fault_flags": params.get("fault_flags"),  # 故障标志
-            "warning_flags": params.get("warning_flags"),  # 警告标志
-            "operation_mode": params.get("operation_mode")  # 运行模式
-        }
-    
-    def parse_sensor_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """解析传感器数据"""
-        if not data.get("ok") or "params" not in data:
-            return {}
-        
-        params = data["params"]
-        return {
-            "ambient_temp": params.get("ambient_temp"),      # 环境温度
-            "ambient_humidity": params.get("ambient_humidity"),  # 环境湿度
-            "cabinet_temp": params.get("cabinet_temp"),      # 机柜温度
-            "total_power": params.get("total_power"),        # 总功耗
-            "power_factor": params.get("power_factor"),      # 功率因数
-            "voltage": params.get("voltage"),                # 电压
-            "current": params.get("current"),                # 电流
-            "energy_consumption": params.get("energy_consumption")  # 累计能耗
-        }
-    
-    def parse_miner_info(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """解析矿机信息"""
-        if not data.get("ok") or "params" not in data:
-            return {}
-        
-        params = data["params"]
-        miners = params.get("miners", [])
-        
-        total_hashrate = 0
-        online_count = 0
-        miner_details = []
-        
-        for miner in miners:
-            hashrate = miner.get("hashrate", 0)
-            total_hashrate += hashrate
-            
-            if miner.get("is_online"):
-                online_count += 1
-            
-            miner_details.append({
-                "index": miner.get("index"),
-                "mac_address": miner.get("mac_address"),
-                "hashrate": hashrate,
-                "temperature": miner.get("temperature"),
-                "is_online": miner.get("is_online"),
-                "has_error": miner.get("has_error")
-            })
-        
-        return {
-            "miner_count": len(miners),
-            "online_miner_count": online_count,
-            "total_hashrate": total_hashrate,
-            "efficiency": params.get("efficiency"),  # 能效比
-            "avg_miner_temp": params.get("avg_miner_temp"),  # 平均温度
-            "miner_details": miner_details
+            "ip": site.ip,
+            "location": site.location,
+            "timestamp": datetime.utcnow().isoformat(),
+            "data": {},
+            "errors": ["站点连续失败，退避中跳过本轮采集"],
+            "status": "skipped"
         }
     
     def process_collected_data(self, collected_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -265,15 +499,7 @@ class DataCollector:
             
             # 解析各API数据
             data = site_data.get("data", {})
-            
-            if "coolerState" in data:
-                processed.update(self.parse_cooler_state(data["coolerState"]["response"]))
-            
-            if "sensorData" in data:
-                processed.update(self.parse_sensor_data(data["sensorData"]["response"]))
-            
-            if "minerInfo" in data:
-                processed.update(self.parse_miner_info(data["minerInfo"]["response"]))
+            processed.update(parse_payloads({name: result["response"] for name, result in data.items()}))
             
             processed_data.append(processed)
         
@@ -291,6 +517,7 @@ class DataCollector:
         processed_data = self.process_collected_data(collected_data)
         
         # 统计信息
+        connection_stats = self.connection_stats.reset()
         success_count = sum(1 for d in processed_data if d["status"] == "success")
         partial_count = sum(1 for d in processed_data if d["status"] == "partial")
         failed_count = len(processed_data) - success_count - partial_count
@@ -300,6 +527,8 @@ class DataCollector:
         # 输出结果
         logger.info(f"采集完成，耗时: {duration:.2f} 秒")
         logger.info(f"成功: {success_count}, 部分成功: {partial_count}, 失败: {failed_count}")
+        logger.info(f"连接统计: 新建 {connection_stats['created']}, 复用 {connection_stats['reused']}, "
+                    f"复用率 {connection_stats['reuse_rate']}")
         
         # 保存结果到文件
         output_file = f"data/collected_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
@@ -311,7 +540,8 @@ class DataCollector:
                     "collection_time": start_time.isoformat(),
                     "duration_seconds": duration,
                     "total_sites": len(self.sites),
-                    "successful_sites": success_count
+                    "successful_sites": success_count,
+                    "connections": connection_stats
                 },
                 "sites": processed_data
             }, f, ensure_ascii=False, indent=2)
@@ -375,6 +605,8 @@ async def main():
     except Exception as e:
         logger.error(f"采集过程中发生错误: {e}")
         sys.exit(1)
+    finally:
+        await collector.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
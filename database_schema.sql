@@ -72,6 +72,120 @@ CREATE TABLE status_snapshots (
 CREATE INDEX idx_snapshots_site_time ON status_snapshots(site_id, timestamp DESC);
 CREATE INDEX idx_snapshots_timestamp ON status_snapshots(timestamp DESC);
 
+-- 2.1 站点最新状态表（每个站点一行，与快照写入在同一事务内 upsert）
+-- 替代对 status_snapshots 全量历史做 DISTINCT ON，查询耗时不随历史数据量增长
+CREATE TABLE site_latest_status (
+    site_id INTEGER PRIMARY KEY REFERENCES sites(site_id) ON DELETE CASCADE,
+    last_update TIMESTAMPTZ NOT NULL,         -- 对应快照的采集时间
+    
+    -- 冷却系统参数
+    supply_temp NUMERIC(5,2),
+    return_temp NUMERIC(5,2),
+    target_temp NUMERIC(5,2),
+    flow_rate NUMERIC(8,2),
+    pressure NUMERIC(8,2),
+    compressor_speed NUMERIC(6,2),
+    fan_speed NUMERIC(6,2),
+    
+    -- 电力参数
+    total_power NUMERIC(10,2),
+    power_factor NUMERIC(4,3),
+    voltage NUMERIC(8,2),
+    current NUMERIC(8,2),
+    energy_consumption NUMERIC(12,2),
+    
+    -- 矿机集群参数
+    miner_count INTEGER,
+    total_hashrate NUMERIC(12,2),
+    efficiency NUMERIC(8,2),
+    avg_miner_temp NUMERIC(5,2),
+    
+    -- 环境参数
+    ambient_temp NUMERIC(5,2),
+    ambient_humidity NUMERIC(5,2),
+    cabinet_temp NUMERIC(5,2),
+    
+    -- 状态标志
+    fault_flags INTEGER,
+    warning_flags INTEGER,
+    operation_mode VARCHAR(32)
+);
+
+-- 已有历史数据的库升级时执行一次回填
+-- INSERT INTO site_latest_status
+-- SELECT DISTINCT ON (site_id)
+--     site_id, timestamp, supply_temp, return_temp, target_temp, flow_rate, pressure,
+--     compressor_speed, fan_speed, total_power, power_factor, voltage, current,
+--     energy_consumption, miner_count, total_hashrate, efficiency, avg_miner_temp,
+--     ambient_temp, ambient_humidity, cabinet_temp, fault_flags, warning_flags, operation_mode
+-- FROM status_snapshots
+-- ORDER BY site_id, timestamp DESC;
+
+-- 2.2 趋势汇总表（1 分钟 / 1 小时 / 1 天），与快照写入在同一事务内增量 upsert
+-- 保存各指标的求和与非空计数，平均值 = sum / count，可跨站点、跨桶再次合并
+CREATE TABLE snapshot_rollup_1m (
+    site_id INTEGER NOT NULL REFERENCES sites(site_id) ON DELETE CASCADE,
+    bucket TIMESTAMPTZ NOT NULL,              -- 桶起始时间（UTC 对齐）
+    samples INTEGER NOT NULL DEFAULT 0,       -- 桶内快照条数
+    
+    supply_temp_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    supply_temp_count INTEGER NOT NULL DEFAULT 0,
+    return_temp_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    return_temp_count INTEGER NOT NULL DEFAULT 0,
+    total_power_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_power_count INTEGER NOT NULL DEFAULT 0,
+    total_hashrate_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_hashrate_count INTEGER NOT NULL DEFAULT 0,
+    efficiency_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    efficiency_count INTEGER NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (site_id, bucket)
+);
+
+CREATE TABLE snapshot_rollup_1h (LIKE snapshot_rollup_1m INCLUDING ALL);
+CREATE TABLE snapshot_rollup_1d (LIKE snapshot_rollup_1m INCLUDING ALL);
+
+-- 全站聚合按时间范围扫描
+CREATE INDEX idx_rollup_1m_bucket ON snapshot_rollup_1m(bucket);
+CREATE INDEX idx_rollup_1h_bucket ON snapshot_rollup_1h(bucket);
+CREATE INDEX idx_rollup_1d_bucket ON snapshot_rollup_1d(bucket);
+
+-- 已有历史数据的库升级时执行一次回填（1h / 1d 将 'minute' 替换为 'hour' / 'day'）
+-- INSERT INTO snapshot_rollup_1m
+-- SELECT site_id, DATE_TRUNC('minute', timestamp), COUNT(*),
+--     COALESCE(SUM(supply_temp), 0), COUNT(supply_temp),
+--     COALESCE(SUM(return_temp), 0), COUNT(return_temp),
+--     COALESCE(SUM(total_power), 0), COUNT(total_power),
+--     COALESCE(SUM(total_hashrate), 0), COUNT(total_hashrate),
+--     COALESCE(SUM(efficiency), 0), COUNT(efficiency)
+-- FROM status_snapshots
+-- GROUP BY 1, 2;
+
+-- 使用 TimescaleDB 时可改用连续聚合（不创建上面三张表，并将 api_server.SNAPSHOT_ROLLUP_UPSERT 设为 False）
+-- CREATE MATERIALIZED VIEW snapshot_rollup_1m WITH (timescaledb.continuous) AS
+-- SELECT site_id, time_bucket(INTERVAL '1 minute', timestamp) AS bucket, COUNT(*) AS samples,
+--     COALESCE(SUM(supply_temp), 0) AS supply_temp_sum, COUNT(supply_temp) AS supply_temp_count,
+--     COALESCE(SUM(return_temp), 0) AS return_temp_sum, COUNT(return_temp) AS return_temp_count,
+--     COALESCE(SUM(total_power), 0) AS total_power_sum, COUNT(total_power) AS total_power_count,
+--     COALESCE(SUM(total_hashrate), 0) AS total_hashrate_sum, COUNT(total_hashrate) AS total_hashrate_count,
+--     COALESCE(SUM(efficiency), 0) AS efficiency_sum, COUNT(efficiency) AS efficiency_count
+-- FROM status_snapshots
+-- GROUP BY site_id, bucket;
+-- SELECT add_continuous_aggregate_policy('snapshot_rollup_1m',
+--     start_offset => INTERVAL '1 hour', end_offset => INTERVAL '1 minute', schedule_interval => INTERVAL '1 minute');
+-- 1h / 1d 在上一级连续聚合之上再聚合（需 TimescaleDB 2.9+）
+-- CREATE MATERIALIZED VIEW snapshot_rollup_1h WITH (timescaledb.continuous) AS
+-- SELECT site_id, time_bucket(INTERVAL '1 hour', bucket) AS bucket, SUM(samples) AS samples,
+--     SUM(supply_temp_sum) AS supply_temp_sum, SUM(supply_temp_count) AS supply_temp_count,
+--     SUM(return_temp_sum) AS return_temp_sum, SUM(return_temp_count) AS return_temp_count,
+--     SUM(total_power_sum) AS total_power_sum, SUM(total_power_count) AS total_power_count,
+--     SUM(total_hashrate_sum) AS total_hashrate_sum, SUM(total_hashrate_count) AS total_hashrate_count,
+--     SUM(efficiency_sum) AS efficiency_sum, SUM(efficiency_count) AS efficiency_count
+-- FROM snapshot_rollup_1m
+-- GROUP BY site_id, time_bucket(INTERVAL '1 hour', bucket);
+-- SELECT add_continuous_aggregate_policy('snapshot_rollup_1h',
+--     start_offset => INTERVAL '3 hours', end_offset => INTERVAL '1 hour', schedule_interval => INTERVAL '10 minutes');
+
 -- 3. 矿机详情表（每台矿机的详细信息）
 CREATE TABLE miner_details (
     miner_id BIGSERIAL PRIMARY KEY,
@@ -111,6 +225,29 @@ CREATE TABLE miner_details (
     INDEX idx_miners_error (has_error)
 );
 
+-- 3.1 矿机历史表（只在算力/温度超出死区、在线或故障状态变化、或到达心跳间隔时写入一行）
+-- 每行的值一直有效到同一矿机的下一行，查询时按阶梯函数还原；
+-- 150 个站点 × 189 台矿机每分钟全量写入约 4000 万行/天，按变化写入只有其中一小部分
+CREATE TABLE miner_history (
+    site_id INTEGER NOT NULL REFERENCES sites(site_id) ON DELETE CASCADE,
+    miner_index INTEGER NOT NULL,
+    recorded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    hashrate NUMERIC(10,2),                   -- 算力 (GH/s)
+    temperature NUMERIC(5,2),                 -- 温度 (°C)
+    is_online BOOLEAN,
+    has_error BOOLEAN,
+    PRIMARY KEY (site_id, miner_index, recorded_at)
+);
+
+-- 如果使用TimescaleDB：按天分块，按矿机分段压缩为列存
+-- SELECT create_hypertable('miner_history', 'recorded_at', chunk_time_interval => INTERVAL '1 day');
+-- ALTER TABLE miner_history SET (
+--     timescaledb.compress,
+--     timescaledb.compress_segmentby = 'site_id, miner_index',
+--     timescaledb.compress_orderby = 'recorded_at'
+-- );
+-- SELECT add_compression_policy('miner_history', INTERVAL '2 days');
+
 -- 4. 控制日志表（记录所有控制操作）
 CREATE TABLE control_logs (
     log_id BIGSERIAL PRIMARY KEY,
@@ -245,45 +382,89 @@ CREATE TABLE users (
     INDEX idx_users_role (role)
 );
 
--- 视图：最新状态视图
+-- 9. 网络扫描设备表（按 IP 累积扫描结果，供增量扫描复用）
+CREATE TABLE scan_devices (
+    ip_address INET PRIMARY KEY,
+    device_type VARCHAR(16) NOT NULL DEFAULT 'unknown', -- antbox/miner/unknown
+    status VARCHAR(16),                       -- online/ping_only/offline
+    open_ports INTEGER[] DEFAULT '{}',        -- 存活扫描时响应的端口
+    fingerprint JSONB DEFAULT '{}',           -- 指纹识别信息（标题、算力、CGMiner 版本等）
+    latency_ms NUMERIC(8,2),                  -- 最近一次 ICMP 延迟
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),    -- 最后一次有响应
+    last_scanned TIMESTAMPTZ NOT NULL DEFAULT NOW(), -- 最后一次被探测
+    miss_count INTEGER NOT NULL DEFAULT 0,    -- 连续未响应次数，达到上限后不再视为已知设备
+    
+    -- 索引
+    INDEX idx_scan_devices_type (device_type),
+    INDEX idx_scan_devices_last_seen (last_seen DESC)
+);
+
+-- 增量扫描轮换游标：每个扫描范围下次从未知地址的哪个偏移开始
+CREATE TABLE scan_rotation (
+    range_key VARCHAR(64) PRIMARY KEY,        -- 起始IP-结束IP
+    next_offset BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 视图：最新状态视图（基于 site_latest_status，每个站点一行）
 CREATE OR REPLACE VIEW latest_site_status AS
-SELECT DISTINCT ON (s.site_id)
+SELECT
     s.site_id,
     s.ip_address,
     s.location,
     s.is_online,
-    ss.timestamp as last_update,
-    ss.supply_temp,
-    ss.return_temp,
-    ss.total_power,
-    ss.miner_count,
-    ss.total_hashrate,
-    ss.efficiency,
-    ss.fault_flags,
-    ss.warning_flags
+    l.last_update,
+    l.supply_temp,
+    l.return_temp,
+    l.total_power,
+    l.miner_count,
+    l.total_hashrate,
+    l.efficiency,
+    l.fault_flags,
+    l.warning_flags
 FROM sites s
-LEFT JOIN status_snapshots ss ON s.site_id = ss.site_id
-ORDER BY s.site_id, ss.timestamp DESC;
+LEFT JOIN site_latest_status l ON s.site_id = l.site_id
+ORDER BY s.site_id;
 
 -- 函数：更新站点最后在线时间
+-- 语句级触发器：COPY 批量写入快照时每条语句只执行一次 UPDATE
+-- 注意：TimescaleDB 超表不支持转换表，启用超表后需改由应用层更新
 CREATE OR REPLACE FUNCTION update_site_last_seen()
 RETURNS TRIGGER AS $$
 BEGIN
-    UPDATE sites 
+    UPDATE sites s
     SET last_seen = NOW(), 
         is_online = TRUE,
         updated_at = NOW()
-    WHERE site_id = NEW.site_id;
-    RETURN NEW;
+    FROM (SELECT DISTINCT site_id FROM new_snapshots) n
+    WHERE s.site_id = n.site_id;
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
 -- 触发器：当插入状态快照时更新站点在线状态
 CREATE TRIGGER trigger_update_site_status
 AFTER INSERT ON status_snapshots
-FOR EACH ROW
+REFERENCING NEW TABLE AS new_snapshots
+FOR EACH STATEMENT
 EXECUTE FUNCTION update_site_last_seen();
 
+-- 函数：站点增删或 IP 变更时通知各 API 进程刷新站点注册表
+CREATE OR REPLACE FUNCTION notify_site_registry()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('site_registry', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 触发器：仅在影响 IP -> site_id 映射时触发（在线状态更新不触发）
+CREATE TRIGGER trigger_notify_site_registry
+AFTER INSERT OR DELETE OR UPDATE OF ip_address ON sites
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_site_registry();
+
 -- 初始化数据：插入示例站点（实际需要导入150个IP）
 -- INSERT INTO sites (ip_address, location) VALUES 
 -- ('10.1.101.1', 'Zone A, Rack 1'),
@@ -296,10 +477,22 @@ EXECUTE FUNCTION update_site_last_seen();
 -- 创建数据保留策略
 -- SELECT add_retention_policy('status_snapshots', INTERVAL '90 days');
 
+-- 趋势汇总表保留期：分钟级 8 天（覆盖趋势接口最大 168 小时窗口）、小时级 90 天，天级长期保留
+-- 普通表由 api_server.prune_rollups 每小时清理；使用连续聚合时改用 retention policy
+-- SELECT add_retention_policy('snapshot_rollup_1m', INTERVAL '8 days');
+-- SELECT add_retention_policy('snapshot_rollup_1h', INTERVAL '90 days');
+
 COMMENT ON TABLE sites IS 'AntBox容器站点信息';
 COMMENT ON TABLE status_snapshots IS '冷却系统状态时序数据';
+COMMENT ON TABLE site_latest_status IS '站点最新状态（每站点一行）';
+COMMENT ON TABLE snapshot_rollup_1m IS '状态快照分钟级汇总';
+COMMENT ON TABLE snapshot_rollup_1h IS '状态快照小时级汇总';
+COMMENT ON TABLE snapshot_rollup_1d IS '状态快照天级汇总';
 COMMENT ON TABLE miner_details IS '单个矿机详细信息';
+COMMENT ON TABLE miner_history IS '矿机状态变化历史（死区 + 心跳）';
 COMMENT ON TABLE control_logs IS '控制操作日志';
 COMMENT ON TABLE video_sessions IS '视频流会话管理';
 COMMENT ON TABLE alert_rules IS '报警规则配置';
-COMMENT ON TABLE alert_records IS '报警历史记录';
\ No newline at end of file
+COMMENT ON TABLE alert_records IS '报警历史记录';
+COMMENT ON TABLE scan_devices IS '网络扫描发现的设备历史';
+COMMENT ON TABLE scan_rotation IS '增量扫描未知地址轮换游标';
\ No newline at end of file
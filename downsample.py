@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+趋势数据降采样
+Largest-Triangle-Three-Buckets（LTTB）：每个桶保留与前一选中点、下一桶均值构成三角形面积最大的点，
+在大幅减少点数的同时保留可见的峰谷。桶均值用前缀和一次算出，桶内面积用 NumPy 向量计算
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """返回 LTTB 选中点的下标（含首尾点，保持输入顺序）"""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)])
+
+    # 去掉首尾点后均分为 n_out - 2 个桶，edges[b]..edges[b+1] 为第 b 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    counts = np.diff(edges)
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = (cum_x[edges[1:]] - cum_x[edges[:-1]]) / counts
+    mean_y = (cum_y[edges[1:]] - cum_y[edges[:-1]]) / counts
+    # 第 b 个桶的三角形第三点取下一个桶的均值，最后一个桶取末尾点
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - next_x[b]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (next_y[b] - ay))
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
+
+
+def downsample_rows(rows: List[Dict[str, Any]], max_points: int, time_key: str = "timestamp",
+                    value_keys: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """按时间列对多指标行数据做 LTTB 降采样，返回不超过 max_points 行（保持原有顺序）
+
+    每个指标分得 max_points / 指标数 的点预算，各自跳过空值后选点，最终取并集，
+    因此任一指标的峰谷都会被保留。
+    """
+    if max_points <= 0 or len(rows) <= max_points:
+        return rows
+
+    if value_keys is None:
+        value_keys = [k for k in rows[0] if k != time_key]
+    x = np.array([row[time_key].timestamp() for row in rows], dtype=float)
+    budget = max(3, max_points // max(len(value_keys), 1))
+
+    keep = set()
+    for key in value_keys:
+        y = np.array([row.get(key) for row in rows], dtype=float)
+        valid = np.flatnonzero(~np.isnan(y))
+        if len(valid) < 2:
+            continue
+        keep.update(valid[lttb_indices(x[valid], y[valid], budget)].tolist())
+
+    if not keep:
+        keep.update(np.linspace(0, len(rows) - 1, max_points).astype(np.int64).tolist())
+    return [rows[i] for i in sorted(keep)]
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+异步 ICMP Echo 引擎
+一个套接字复用全部在途请求，按 (identifier, sequence) 匹配应答，
+替代每次探测启动一个 ping 子进程。
+
+套接字优先级：
+1. SOCK_DGRAM + IPPROTO_ICMP（非特权 ping 套接字，需 net.ipv4.ping_group_range 包含当前组）
+2. SOCK_RAW + IPPROTO_ICMP（需要 root 或 CAP_NET_RAW）
+两者都不可用时 get_engine() 返回 None，由调用方回退到 ping 子进程。
+仅支持 IPv4。
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import struct
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("icmp_engine")
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACH = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_TIME_EXCEEDED = 11
+
+# 发送队列满时的重试间隔（秒）
+SEND_RETRY_DELAY = 0.001
+
+# 接收缓冲区，大批量探测时避免应答被内核丢弃
+RECV_BUFFER_SIZE = 4 * 1024 * 1024
+
+# 同一主机多次探测之间的发送间隔（秒）
+PROBE_INTERVAL = 0.05
+
+PAYLOAD = b"antbox-icmp-probe".ljust(32, b"\0")
+
+ICMP_ERRORS = {
+    ICMP_DEST_UNREACH: "目标不可达",
+    ICMP_TIME_EXCEEDED: "TTL 超时",
+}
+
+
+def checksum(data: bytes) -> int:
+    """ICMP 校验和（RFC 1071）"""
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def build_echo_request(ident: int, seq: int, payload: bytes = PAYLOAD) -> bytes:
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = checksum(header + payload)
+    return struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+
+class EchoReply:
+    """单次 Echo 结果"""
+    __slots__ = ("rtt", "ttl", "error")
+
+    def __init__(self, rtt: Optional[float] = None, ttl: Optional[int] = None, error: Optional[str] = None):
+        self.rtt = rtt
+        self.ttl = ttl
+        self.error = error
+
+
+class IcmpEngine:
+    """绑定在一个事件循环上的 ICMP Echo 引擎"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.sock: Optional[socket.socket] = None
+        self.mode: Optional[str] = None
+        self.ident = 0
+        self.seq = random.randrange(0x10000)
+        # seq -> (目标地址, 发送时间, Future)
+        self.pending: Dict[int, Tuple[str, float, asyncio.Future]] = {}
+        self.stats = {"sent": 0, "received": 0, "timeouts": 0}
+
+    def open(self):
+        """按优先级打开 ICMP 套接字，均不可用时抛出 OSError"""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.mode = "dgram"
+        except OSError:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.mode = "raw"
+
+        sock.setblocking(False)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_SIZE)
+        except OSError:
+            pass
+
+        if self.mode == "dgram":
+            # 非特权套接字由内核将 identifier 改写为本地“端口”，应答中不含 IP 头，TTL 通过辅助数据取得
+            sock.bind(("0.0.0.0", 0))
+            self.ident = sock.getsockname()[1]
+            if hasattr(socket, "IP_RECVTTL"):
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_RECVTTL, 1)
+        else:
+            # 原始套接字会收到本机所有 ICMP 报文，用 identifier 区分本进程的请求
+            self.ident = (os.getpid() ^ random.randrange(0x10000)) & 0xffff
+
+        self.sock = sock
+        self.loop.add_reader(sock.fileno(), self._on_readable)
+        logger.info(f"ICMP 引擎已启动（{self.mode} 套接字）")
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        for _, _, future in self.pending.values():
+            if not future.done():
+                future.cancel()
+        self.pending.clear()
+
+    def _next_seq(self) -> int:
+        # 跳过仍在途的序号，在途请求数不超过 65536
+        for _ in range(0x10000):
+            self.seq = (self.seq + 1) & 0xffff
+            if self.seq not in self.pending:
+                return self.seq
+        raise RuntimeError("ICMP 在途请求过多")
+
+    async def echo(self, ip: str, timeout: float) -> EchoReply:
+        """发送一个 Echo 请求并等待应答，超时返回 rtt 为 None 的结果"""
+        seq = self._next_seq()
+        future = self.loop.create_future()
+        packet = build_echo_request(self.ident, seq)
+        sent_at = time.perf_counter()
+        self.pending[seq] = (ip, sent_at, future)
+        try:
+            while True:
+                try:
+                    self.sock.sendto(packet, (ip, 0))
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(SEND_RETRY_DELAY)
+            self.stats["sent"] += 1
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            return EchoReply(error="请求超时")
+        except OSError as e:
+            return EchoReply(error=f"发送失败: {e}")
+        finally:
+            self.pending.pop(seq, None)
+
+    def _on_readable(self):
+        # 一次尽量读空接收队列
+        while self.sock is not None:
+            try:
+                if self.mode == "dgram":
+                    data, ancdata, _, addr = self.sock.recvmsg(2048, socket.CMSG_SPACE(4))
+                else:
+                    data, addr = self.sock.recvfrom(2048)
+                    ancdata = None
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.debug(f"ICMP 接收错误: {e}")
+                return
+            self._handle_packet(data, addr[0], ancdata)
+
+    def _handle_packet(self, data: bytes, source: str, ancdata):
+        ttl = None
+        if self.mode == "raw":
+            if len(data) < 20:
+                return
+            header_len = (data[0] & 0x0f) * 4
+            ttl = data[8]
+            data = data[header_len:]
+        elif ancdata:
+            for level, kind, value in ancdata:
+                if level == socket.IPPROTO_IP and kind == socket.IP_TTL and len(value) >= 4:
+                    ttl = int.from_bytes(value[:4], sys.byteorder)
+
+        if len(data) < 8:
+            return
+        icmp_type, _, _, ident, seq = struct.unpack("!BBHHH", data[:8])
+
+        if icmp_type == ICMP_ECHO_REPLY:
+            entry = self.pending.get(seq)
+            # dgram 套接字由内核按 identifier 分发，raw 套接字需自行比对
+            if entry is None or (self.mode == "raw" and ident != self.ident) or entry[0] != source:
+                return
+            target, sent_at, future = entry
+            if not future.done():
+                self.stats["received"] += 1
+                future.set_result(EchoReply(rtt=(time.perf_counter() - sent_at) * 1000, ttl=ttl))
+        elif icmp_type in ICMP_ERRORS and self.mode == "raw":
+            # 差错报文携带原始 IP 头和原始 ICMP 头前 8 字节，据此定位请求
+            inner = data[8:]
+            if len(inner) < 28:
+                return
+            inner_header_len = (inner[0] & 0x0f) * 4
+            original = inner[inner_header_len:inner_header_len + 8]
+            if len(original) < 8:
+                return
+            o_type, _, _, o_ident, o_seq = struct.unpack("!BBHHH", original)
+            entry = self.pending.get(o_seq)
+            if o_type != ICMP_ECHO_REQUEST or o_ident != self.ident or entry is None:
+                return
+            future = entry[2]
+            if not future.done():
+                future.set_result(EchoReply(error=f"{ICMP_ERRORS[icmp_type]}（来自 {source}）"))
+
+    async def ping(self, ip: str, count: int, timeout: float) -> List[EchoReply]:
+        """对同一主机发送 count 个请求（间隔 PROBE_INTERVAL），总耗时约为一个 timeout"""
+        async def probe(index: int) -> EchoReply:
+            if index:
+                await asyncio.sleep(index * PROBE_INTERVAL)
+            return await self.echo(ip, timeout)
+
+        return await asyncio.gather(*(probe(i) for i in range(count)))
+
+
+# 每个事件循环一个引擎；None 表示该进程无法打开 ICMP 套接字
+_engines: Dict[asyncio.AbstractEventLoop, IcmpEngine] = {}
+_unavailable = False
+
+
+def get_engine() -> Optional[IcmpEngine]:
+    """返回当前事件循环的 ICMP 引擎，无权限时返回 None"""
+    global _unavailable
+    if _unavailable:
+        return None
+    loop = asyncio.get_running_loop()
+    engine = _engines.get(loop)
+    if engine is None or engine.sock is None:
+        # 清理已关闭事件循环遗留的引擎
+        for stale in [l for l in _engines if l.is_closed()]:
+            stale_engine = _engines.pop(stale)
+            if stale_engine.sock is not None:
+                stale_engine.sock.close()
+        engine = IcmpEngine(loop)
+        try:
+            engine.open()
+        except OSError as e:
+            _unavailable = True
+            logger.warning(f"无法打开 ICMP 套接字（{e}），回退到 ping 子进程")
+            return None
+        _engines[loop] = engine
+    return engine
@@ -1,4 +1,8 @@
 // 设备详情页面功能
+
+// 趋势数据最多点数（服务端按 LTTB 降采样，保留峰谷）
+const TREND_MAX_POINTS = 500;
+
 class DeviceDetailManager {
     constructor() {
         this.deviceId = null;
@@ -122,7 +126,7 @@ class DeviceDetailManager {
         
         try {
             // 尝试从API获取设备数据
-            const response = await fetch(`http://192.168.0.57:8443/api/sites/${this.deviceId}`);
+            const response = await fetch(`http://192.168.0.57:8443/api/sites/${this.deviceId}?max_points=${TREND_MAX_POINTS}`);
             
             if (response.ok) {
                 this.deviceData = await response.json();
@@ -2,6 +2,9 @@
  * 大屏监控墙 JS 逻辑
  */
 
+// 算力偏低阈值：站点平均单台算力（TH/s）低于该值时标黄（S19 XP Hyd. 额定约 255 TH/s）
+const HASHRATE_LOW_TH_PER_MINER = 200;
+
 // 开启/退出全屏
 function toggleFullScreen() {
     const doc = window.document;
@@ -29,39 +32,143 @@ setInterval(updateClock, 1000);
 updateClock();
 
 // 数据抓取逻辑
+// 优先通过 /ws/wall 接收推送（首帧快照 + 站点差异 + 报警事件），不支持或断开期间退回轮询
 class MonitorWall {
     constructor() {
-        this.pollInterval = 10000; // 每 10 秒刷新一次
+        this.pollInterval = 10000; // 轮询模式下每 10 秒刷新一次
+        this.reconnectDelay = 1000;
+        this.pollTimer = null;
+        this.snapshotSeq = null;
+        this.socket = null;
+        this.sites = new Map();    // site_id -> 站点状态
+        this.cards = new Map();    // site_id -> 卡片元素
+        this.alerts = [];          // 活动报警（按触发时间倒序）
         this.init();
     }
 
     async init() {
-        await this.fetchData();
-        setInterval(() => this.fetchData(), this.pollInterval);
+        if (window.WebSocket) {
+            this.connect();
+        } else {
+            this.startPolling();
+        }
+    }
+
+    // ============= 推送模式 =============
+    connect() {
+        const protocol = location.protocol === 'https:' ? 'wss:' : 'ws:';
+        this.socket = new WebSocket(`${protocol}//${location.host}/ws/wall`);
+
+        this.socket.onopen = () => {
+            this.reconnectDelay = 1000;
+            this.snapshotSeq = null;
+            this.stopPolling();
+        };
+        this.socket.onmessage = (event) => this.handleMessage(JSON.parse(event.data));
+        this.socket.onclose = () => {
+            // 断开期间先轮询保持画面更新，再指数退避重连
+            this.startPolling();
+            setTimeout(() => this.connect(), this.reconnectDelay);
+            this.reconnectDelay = Math.min(this.reconnectDelay * 2, 30000);
+        };
+    }
+
+    handleMessage(message) {
+        switch (message.type) {
+            case 'snapshot':
+                this.sites = new Map(message.sites.map(site => [site.site_id, site]));
+                this.alerts = message.alerts;
+                this.renderGrid();
+                this.renderAlerts();
+                break;
+            case 'sites':
+                message.changes.forEach(change => {
+                    const site = Object.assign(this.sites.get(change.site_id) || {}, change);
+                    this.sites.set(change.site_id, site);
+                    this.renderCard(site);
+                });
+                break;
+            case 'sites_removed':
+                message.site_ids.forEach(siteId => {
+                    this.sites.delete(siteId);
+                    const card = this.cards.get(siteId);
+                    if (card) card.remove();
+                    this.cards.delete(siteId);
+                });
+                break;
+            case 'alert':
+                this.applyAlertEvent(message);
+                break;
+            default:
+                return; // ping
+        }
+        if (message.overview) this.renderStats(message.overview);
+    }
+
+    applyAlertEvent(message) {
+        const affected = new Set();
+        if (message.event === 'fired') {
+            this.alerts.unshift(message.alert);
+            affected.add(message.alert.site_id);
+        } else {
+            this.alerts = this.alerts.filter(alert => {
+                if (alert.record_id !== message.record_id) return true;
+                affected.add(alert.site_id);
+                return false;
+            });
+        }
+        this.renderAlerts();
+        affected.forEach(siteId => {
+            const site = this.sites.get(siteId);
+            if (site) this.renderCard(site);
+        });
+    }
+
+    // ============= 轮询模式 =============
+    startPolling() {
+        if (this.pollTimer) return;
+        this.fetchData();
+        this.pollTimer = setInterval(() => this.fetchData(), this.pollInterval);
+    }
+
+    stopPolling() {
+        clearInterval(this.pollTimer);
+        this.pollTimer = null;
     }
 
     async fetchData() {
         try {
-            // 获取全部站点
-            const sitesRes = await fetch('/api/sites');
-            const sites = await sitesRes.json();
-            
-            // 获取概览数据
-            const overviewRes = await fetch('/api/dashboard/overview');
-            const overview = await overviewRes.json();
-
-            // 获取实时报警
-            const alertsRes = await fetch('/api/alerts?status=active&limit=10');
-            const alerts = await alertsRes.json();
-
-            this.renderStats(overview);
-            this.renderGrid(sites);
-            this.renderAlerts(alerts);
+            // 一次请求获取总览、全部站点和活动报警（列式 JSON），未变化时服务端返回 304
+            const response = await fetch('/api/wall/snapshot', { cache: 'no-cache' });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const snapshot = await response.json();
+            if (snapshot.seq === this.snapshotSeq) return;
+            this.snapshotSeq = snapshot.seq;
+
+            this.sites = new Map(MonitorWall.rows(snapshot.sites).map(site => [site.site_id, site]));
+            this.alerts = MonitorWall.rows(snapshot.alerts);
+            this.renderStats(snapshot.overview);
+            this.renderGrid();
+            this.renderAlerts();
         } catch (error) {
             console.error("无法获取监控数据:", error);
         }
     }
 
+    // 列式数据 { field: [v0, v1, ...] } 转换为行对象数组
+    static rows(columns) {
+        const fields = Object.keys(columns);
+        const count = fields.length ? columns[fields[0]].length : 0;
+        const rows = [];
+        for (let i = 0; i < count; i++) {
+            const row = {};
+            fields.forEach(field => { row[field] = columns[field][i]; });
+            rows.push(row);
+        }
+        return rows;
+    }
+
+    // ============= 渲染 =============
     renderStats(overview) {
         document.getElementById('total-sites').innerText = overview.total_sites || 0;
         document.getElementById('online-sites').innerText = overview.online_sites || 0;
@@ -69,72 +176,87 @@ class MonitorWall {
         document.getElementById('alarm-sites').innerText = overview.active_alerts || 0;
     }
 
-    renderGrid(sites) {
+    renderGrid() {
         const grid = document.getElementById('wall-grid');
         grid.innerHTML = '';
+        this.cards.clear();
 
-        if (!sites || sites.length === 0) {
+        if (this.sites.size === 0) {
             grid.innerHTML = '<div style="color:var(--text-muted);">暂无站点数据</div>';
             return;
         }
 
-        sites.forEach(site => {
-            const isOnline = site.status === 'online';
-            const hasAlarm = site.status === 'alarm'; // 假设如果有报警，status会是 alarm
-            
-            let cardClass = isOnline ? 'status-online' : 'status-offline';
-            if (hasAlarm) cardClass = 'status-alarm';
-
-            const temp = site.env_temp || site.in_water_temp || 0;
-            const hashrate = site.hashrate || 0;
-            
-            // 阈值标红逻辑
-            const tempClass = temp > 40 ? 'temp-high' : '';
-            const hashClass = (isOnline && hashrate < 50) ? 'hashrate-low' : '';
-
-            const cardHtml = `
-                <div class="site-card ${cardClass}">
-                    <div class="card-header">
-                        ${site.ip_address 
-                            ? `<a href="http://${site.ip_address}/" target="_blank" class="card-ip-link" title="访问 ${site.ip_address} Web 界面">
-                                <i class="fas fa-external-link-alt"></i> ${site.name || site.ip_address}
-                               </a>`
-                            : `<span>${site.name || '未知设备'}</span>`
-                        }
-                        <i class="fas ${isOnline ? 'fa-check-circle' : 'fa-times-circle'}" 
-                           style="color: var(--${isOnline ? 'success' : 'error'}-color);"></i>
-                    </div>
-                    <div class="card-metrics">
-                        <div class="metric">
-                            <span class="metric-label">类型</span>
-                            <span class="metric-value" style="font-size: 14px;">${site.device_type || '未知'}</span>
-                        </div>
-                        <div class="metric">
-                            <span class="metric-label">状态</span>
-                            <span class="metric-value" style="font-size: 14px; color: var(--${isOnline ? 'success' : 'error'}-color);">
-                                ${isOnline ? '在线' : '离线'}
-                            </span>
-                        </div>
-                        <div class="metric">
-                            <span class="metric-label">温度</span>
-                            <span class="metric-value ${tempClass}">${temp > 0 ? temp.toFixed(1) + ' °C' : '--'}</span>
-                        </div>
-                        <div class="metric">
-                            <span class="metric-label">算力</span>
-                            <span class="metric-value ${hashClass}">${hashrate > 0 ? hashrate.toFixed(1) + ' T' : '--'}</span>
-                        </div>
-                    </div>
+        this.sites.forEach(site => this.renderCard(site));
+    }
+
+    // 只重建单个站点卡片，其余卡片保持不动
+    renderCard(site) {
+        const grid = document.getElementById('wall-grid');
+        let card = this.cards.get(site.site_id);
+        if (!card) {
+            if (this.cards.size === 0) grid.innerHTML = '';
+            card = document.createElement('div');
+            this.cards.set(site.site_id, card);
+            grid.appendChild(card);
+        }
+
+        const isOnline = !!site.is_online;
+        const hasAlarm = this.alerts.some(alert => alert.site_id === site.site_id);
+
+        let cardClass = isOnline ? 'status-online' : 'status-offline';
+        if (hasAlarm) cardClass = 'status-alarm';
+
+        const temp = site.supply_temp || site.return_temp || 0;
+        const hashrate = site.total_hashrate || 0;
+        const label = site.location || site.ip_address || '未知设备';
+
+        // 阈值标红逻辑
+        const tempClass = temp > 40 ? 'temp-high' : '';
+        // total_hashrate 单位为 PH/s
+        const hashClass = (isOnline && site.miner_count > 0 &&
+            hashrate * 1000 / site.miner_count < HASHRATE_LOW_TH_PER_MINER) ? 'hashrate-low' : '';
+
+        card.className = `site-card ${cardClass}`;
+        card.innerHTML = `
+            <div class="card-header">
+                ${site.ip_address 
+                    ? `<a href="http://${site.ip_address}/" target="_blank" class="card-ip-link" title="访问 ${site.ip_address} Web 界面">
+                        <i class="fas fa-external-link-alt"></i> ${label}
+                       </a>`
+                    : `<span>${label}</span>`
+                }
+                <i class="fas ${isOnline ? 'fa-check-circle' : 'fa-times-circle'}" 
+                   style="color: var(--${isOnline ? 'success' : 'error'}-color);"></i>
+            </div>
+            <div class="card-metrics">
+                <div class="metric">
+                    <span class="metric-label">矿机</span>
+                    <span class="metric-value" style="font-size: 14px;">${site.miner_count != null ? site.miner_count + ' 台' : '--'}</span>
                 </div>
-            `;
-            grid.innerHTML += cardHtml;
-        });
+                <div class="metric">
+                    <span class="metric-label">状态</span>
+                    <span class="metric-value" style="font-size: 14px; color: var(--${isOnline ? 'success' : 'error'}-color);">
+                        ${isOnline ? '在线' : '离线'}
+                    </span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">温度</span>
+                    <span class="metric-value ${tempClass}">${temp > 0 ? temp.toFixed(1) + ' °C' : '--'}</span>
+                </div>
+                <div class="metric">
+                    <span class="metric-label">算力</span>
+                    <span class="metric-value ${hashClass}">${hashrate > 0 ? hashrate.toFixed(2) + ' PH/s' : '--'}</span>
+                </div>
+            </div>
+        `;
     }
 
-    renderAlerts(alerts) {
+    renderAlerts() {
         const list = document.getElementById('alert-list');
         list.innerHTML = '';
+        const alerts = this.alerts.slice(0, 10);
 
-        if (!alerts || alerts.length === 0) {
+        if (alerts.length === 0) {
             list.innerHTML = `
                 <div style="color: var(--text-muted); text-align: center; margin-top: 50px;">
                     <i class="fas fa-shield-alt fa-3x" style="opacity: 0.5; margin-bottom: 10px;"></i>
@@ -144,22 +266,22 @@ class MonitorWall {
             return;
         }
 
-        alerts.forEach(alert => {
+        list.innerHTML = alerts.map(alert => {
             const time = new Date(alert.triggered_at).toLocaleString('zh-CN', {
                 month: '2-digit', day: '2-digit', hour: '2-digit', minute: '2-digit', second: '2-digit'
             });
-            const html = `
+            const site = this.sites.get(alert.site_id);
+            return `
                 <div class="alert-item">
                     <div class="alert-title">
                         <i class="fas fa-exclamation-triangle"></i> 
-                        ${alert.site_name || ('Site ' + alert.site_id)} - ${alert.rule_name}
+                        ${(site && site.location) || ('Site ' + alert.site_id)} - ${alert.rule_name || alert.metric_name}
                     </div>
-                    <div class="alert-desc">${alert.message}</div>
+                    <div class="alert-desc">${alert.message || alert.condition_description || ''}</div>
                     <div class="alert-time">${time}</div>
                 </div>
             `;
-            list.innerHTML += html;
-        });
+        }).join('');
     }
 }
 
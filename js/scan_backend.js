@@ -230,12 +230,12 @@ class SiteScanner {
         const endIP = document.getElementById('end-ip').value.trim();
         
         try {
-            const response = await fetch('/api/scan/start', {
+            // 每次扫描是一个独立任务，多个用户或多个范围可以同时扫描
+            const response = await fetch('/api/scan/jobs', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
-                    start_ip: startIP,
-                    end_ip: endIP,
+                    targets: [`${startIP}-${endIP}`],
                     scan_type: scanType,
                     port: port,
                     concurrent_limit: this.maxConcurrent
@@ -243,15 +243,22 @@ class SiteScanner {
             });
             
             const data = await response.json();
-            if (!data.success) {
-                this.addLog(`启动扫描失败: ${data.message}`, 'error');
+            if (!response.ok || !data.success) {
+                this.addLog(`启动扫描失败: ${data.detail || data.message}`, 'error');
                 this.scanComplete();
                 return;
             }
             
+            this.jobId = data.job_id;
+            if (data.attached) {
+                this.addLog(`该范围正在被其他任务扫描，已加入任务 ${data.job_id}`, 'info');
+            }
+            
             this.renderedIPs = new Set();
             this.scanResults = [];
-            this.pollInterval = setInterval(() => this.pollScanStatus(), 1500);
+            this.scanCursor = 0;
+            this.serverScanId = null;
+            this.openScanStream();
             
         } catch (error) {
             this.addLog(`无法连接到扫描服务器: ${error.message}`, 'error');
@@ -259,55 +266,96 @@ class SiteScanner {
         }
     }
     
+    // 通过 SSE 接收扫描进度增量，浏览器不支持时回退到轮询
+    openScanStream() {
+        if (!window.EventSource) {
+            this.pollInterval = setInterval(() => this.pollScanStatus(), 1500);
+            return;
+        }
+        
+        // 断线后 EventSource 会自动重连并带上 Last-Event-ID，服务端只补发遗漏的设备
+        this.eventSource = new EventSource(`/api/scan/jobs/${this.jobId}/events`);
+        const onEvent = (e) => {
+            try {
+                this.applyScanStatus(JSON.parse(e.data));
+            } catch (error) {
+                console.error('Scan event error:', error);
+            }
+        };
+        this.eventSource.addEventListener('progress', onEvent);
+        this.eventSource.addEventListener('done', onEvent);
+    }
+    
+    closeScanStream() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+        if (this.pollInterval) {
+            clearInterval(this.pollInterval);
+            this.pollInterval = null;
+        }
+    }
+    
     async pollScanStatus() {
         if (!this.scanning) return;
         
         try {
-            const response = await fetch('/api/scan/status');
-            const data = await response.json();
-            
-            // Update stats
-            this.scanStats.totalIps = data.total_ips;
-            this.scanStats.scannedIps = data.scanned_ips;
-            this.scanStats.foundDevices = data.found_devices;
-            this.scanStats.antboxDevices = data.antbox_devices;
-            this.scanStats.minerDevices = data.miner_devices;
-            this.scanStats.offlineDevices = data.offline_devices;
-            
-            // Render new results
-            if (data.results) {
-                for (const result of data.results) {
-                    if (!this.renderedIPs.has(result.ip)) {
-                        this.renderedIPs.add(result.ip);
-                        this.addResult(result);
-                        this.addLog(`发现设备: ${result.ip} (${result.deviceType})`, 'success');
-                    }
+            const params = new URLSearchParams({ since: this.scanCursor || 0 });
+            if (this.serverScanId !== null) params.set('scan_id', this.serverScanId);
+            const response = await fetch(`/api/scan/jobs/${this.jobId}?${params}`);
+            this.applyScanStatus(await response.json());
+        } catch (error) {
+            console.error('Polling error:', error);
+        }
+    }
+    
+    // 应用一次状态增量：计数器为全量值，results 只包含游标之后新发现的设备
+    applyScanStatus(data) {
+        if (!this.scanning) return;
+        
+        this.serverScanId = data.scan_id;
+        this.scanCursor = data.cursor;
+        
+        // Update stats
+        this.scanStats.totalIps = data.total_ips;
+        this.scanStats.scannedIps = data.scanned_ips;
+        this.scanStats.foundDevices = data.found_devices;
+        this.scanStats.antboxDevices = data.antbox_devices;
+        this.scanStats.minerDevices = data.miner_devices;
+        this.scanStats.offlineDevices = data.offline_devices;
+        
+        // Render new results
+        if (data.results) {
+            for (const result of data.results) {
+                if (!this.renderedIPs.has(result.ip)) {
+                    this.renderedIPs.add(result.ip);
+                    this.addResult(result);
+                    this.addLog(`发现设备: ${result.ip} (${result.deviceType})`, 'success');
                 }
             }
-            
-            // Update progress UI
-            const progressBar = document.getElementById('progress-fill');
-            const progressText = document.getElementById('progress-text');
-            const progress = data.progress || 0;
-            if (progressBar) progressBar.style.width = `${progress}%`;
-            if (progressText) progressText.textContent = `${progress}%`;
-            
-            const scannedCountElement = document.getElementById('scanned-count');
-            const foundCountElement = document.getElementById('found-count');
-            if (scannedCountElement) scannedCountElement.textContent = `已扫描: ${data.scanned_ips}`;
-            if (foundCountElement) foundCountElement.textContent = `发现: ${data.found_devices}`;
-            
-            this.updateStats();
-            
-            if (data.status === 'completed' || data.status === 'stopped' || data.status === 'error') {
-                clearInterval(this.pollInterval);
-                if (data.status === 'error') {
-                    this.addLog(`扫描出错: ${data.error}`, 'error');
-                }
-                this.scanComplete();
+        }
+        
+        // Update progress UI
+        const progressBar = document.getElementById('progress-fill');
+        const progressText = document.getElementById('progress-text');
+        const progress = data.progress || 0;
+        if (progressBar) progressBar.style.width = `${progress}%`;
+        if (progressText) progressText.textContent = `${progress}%`;
+        
+        const scannedCountElement = document.getElementById('scanned-count');
+        const foundCountElement = document.getElementById('found-count');
+        if (scannedCountElement) scannedCountElement.textContent = `已扫描: ${data.scanned_ips}`;
+        if (foundCountElement) foundCountElement.textContent = `发现: ${data.found_devices}`;
+        
+        this.updateStats();
+        
+        if (data.status === 'completed' || data.status === 'stopped' || data.status === 'error') {
+            this.closeScanStream();
+            if (data.status === 'error') {
+                this.addLog(`扫描出错: ${data.error}`, 'error');
             }
-        } catch (error) {
-            console.error('Polling error:', error);
+            this.scanComplete();
         }
     }
     
@@ -851,10 +899,12 @@ class SiteScanner {
     stopScan() {
         if (!this.scanning) return;
         
-        fetch('/api/scan/stop', { method: 'POST' }).catch(e => console.error(e));
+        if (this.jobId) {
+            fetch(`/api/scan/jobs/${this.jobId}/stop`, { method: 'POST' }).catch(e => console.error(e));
+        }
         
         this.scanning = false;
-        if (this.pollInterval) clearInterval(this.pollInterval);
+        this.closeScanStream();
         this.currentScanId = null;
         
         const startScanBtn = document.getElementById('start-scan');
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+站点最新状态内存存储
+每个站点一条 __slots__ 记录，启动时从数据库加载一次，之后由采集调度器在每个站点采集完成后原地更新；
+总功耗、总算力、平均供液温度和在线站点数随更新增量维护，
+站点列表、站点详情和总览接口直接读取，热路径上不再查询数据库
+"""
+
+import logging
+import math
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger("latest_state")
+
+# 站点状态字段（与 site_latest_status 中除 site_id/last_update 外的列一致）
+STATUS_FIELDS = (
+    "supply_temp", "return_temp", "target_temp", "flow_rate", "pressure",
+    "compressor_speed", "fan_speed", "total_power", "power_factor", "voltage",
+    "current", "energy_consumption", "miner_count", "total_hashrate", "efficiency",
+    "avg_miner_temp", "ambient_temp", "ambient_humidity", "cabinet_temp",
+    "fault_flags", "warning_flags", "operation_mode"
+)
+
+SITE_FIELDS = ("site_id", "ip_address", "location", "is_online", "last_seen", "last_update")
+
+LOAD_LATEST_SQL = """
+SELECT s.site_id, s.ip_address, s.location, s.is_online, s.last_seen, l.last_update, {columns}
+FROM sites s
+LEFT JOIN site_latest_status l ON l.site_id = s.site_id
+ORDER BY s.site_id
+""".format(columns=", ".join(f"l.{field}" for field in STATUS_FIELDS))
+
+
+def _value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _metric(value: Any) -> Optional[float]:
+    """参与汇总的数值，无法转换为有限浮点数时视为空值"""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+class SiteState:
+    """单个站点的最新状态"""
+    __slots__ = SITE_FIELDS + STATUS_FIELDS
+
+    def __init__(self, site_id: int, ip_address: str, location: Optional[str] = None):
+        self.site_id = site_id
+        self.ip_address = ip_address
+        self.location = location
+        self.is_online = False
+        self.last_seen = None
+        self.last_update = None
+        for field in STATUS_FIELDS:
+            setattr(self, field, None)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+class LatestStateStore:
+    """site_id -> SiteState，附带增量维护的总览统计"""
+
+    def __init__(self):
+        self.sites: Dict[int, SiteState] = {}
+        self.loaded = False
+        self.online = 0
+        self.total_power = 0.0
+        self.total_power_count = 0
+        self.total_hashrate = 0.0
+        self.total_hashrate_count = 0
+        self.supply_temp_sum = 0.0
+        self.supply_temp_count = 0
+
+    async def load(self, conn: asyncpg.Connection):
+        """从数据库加载全部站点的最新状态（启动时执行一次）"""
+        rows = await conn.fetch(LOAD_LATEST_SQL)
+        self.sites = {}
+        for row in rows:
+            state = SiteState(row["site_id"], str(row["ip_address"]), row["location"])
+            state.is_online = bool(row["is_online"])
+            state.last_seen = row["last_seen"]
+            state.last_update = row["last_update"]
+            for field in STATUS_FIELDS:
+                setattr(state, field, _value(row[field]))
+            self.sites[state.site_id] = state
+        self._recount()
+        self.loaded = True
+        logger.info(f"站点最新状态已加载：{len(self.sites)} 个站点")
+
+    def _recount(self):
+        self.online = self.supply_temp_count = self.total_power_count = self.total_hashrate_count = 0
+        self.total_power = self.total_hashrate = self.supply_temp_sum = 0.0
+        for state in self.sites.values():
+            self._account(state, 1)
+
+    def _account(self, state: SiteState, sign: int):
+        """将单个站点计入（sign=1）或移出（sign=-1）总览统计"""
+        if state.is_online:
+            self.online += sign
+        total_power = _metric(state.total_power)
+        if total_power is not None:
+            self.total_power += sign * total_power
+            self.total_power_count += sign
+        total_hashrate = _metric(state.total_hashrate)
+        if total_hashrate is not None:
+            self.total_hashrate += sign * total_hashrate
+            self.total_hashrate_count += sign
+        supply_temp = _metric(state.supply_temp)
+        if supply_temp is not None:
+            self.supply_temp_sum += sign * supply_temp
+            self.supply_temp_count += sign
+
+    # ============= 更新 =============
+    def update(self, site_id: int, ip_address: str, location: Optional[str], is_online: bool,
+               values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """合并一次采集结果，返回发生变化的字段
+
+        values 为本次采集到的状态字段（None 表示未取得冷却系统数据，只更新在线状态）。
+        """
+        state = self.sites.get(site_id)
+        if state is None:
+            state = SiteState(site_id, ip_address, location)
+            self.sites[site_id] = state
+            changed = {"ip_address": ip_address, "location": location}
+        else:
+            changed = {}
+            self._account(state, -1)
+
+        if state.is_online != is_online:
+            state.is_online = is_online
+            changed["is_online"] = is_online
+        now = datetime.now(timezone.utc)
+        state.last_seen = now
+        if values is not None:
+            state.last_update = now
+            for field, value in values.items():
+                if field not in STATUS_FIELDS:
+                    continue
+                value = _value(value)
+                if getattr(state, field) != value:
+                    setattr(state, field, value)
+                    changed[field] = value
+
+        self._account(state, 1)
+        return changed
+
+    def retain(self, keep: Callable[[SiteState], bool]) -> List[int]:
+        """移除不再满足条件（如已从 sites 表删除）的站点，返回被移除的 site_id"""
+        removed = [site_id for site_id, state in self.sites.items() if not keep(state)]
+        for site_id in removed:
+            self._account(self.sites.pop(site_id), -1)
+        return removed
+
+    # ============= 查询 =============
+    def get(self, site_id: int) -> Optional[SiteState]:
+        return self.sites.get(site_id)
+
+    def list(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[SiteState]:
+        """按 site_id 顺序列出站点，status 为 online/offline 时过滤"""
+        result = []
+        for site_id in sorted(self.sites):
+            state = self.sites[site_id]
+            if status == "online" and not state.is_online:
+                continue
+            if status == "offline" and state.is_online:
+                continue
+            result.append(state)
+            if limit is not None and len(result) >= limit:
+                break
+        return result
+
+    def values(self) -> Iterable[SiteState]:
+        return self.sites.values()
+
+    def overview(self) -> Dict[str, Any]:
+        """站点计数与汇总指标（与原 SQL 语义一致：SUM 忽略空值，AVG 只计非空值，全部为空时为 None）"""
+        return {
+            "total_sites": len(self.sites),
+            "online_sites": self.online,
+            "offline_sites": len(self.sites) - self.online,
+            "total_power": round(self.total_power, 2) if self.total_power_count else None,
+            "total_hashrate": round(self.total_hashrate, 2) if self.total_hashrate_count else None,
+            "avg_supply_temp": round(self.supply_temp_sum / self.supply_temp_count, 2)
+                               if self.supply_temp_count else None
+        }
+
+
+latest_state = LatestStateStore()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+矿机历史（只记录变化）
+每个站点的矿机按列保存最近一次写入的值（NumPy 数组），每批采集结果整列比较：
+算力变化超过相对死区、温度变化超过绝对死区、在线/故障状态翻转，或距上次写入超过心跳间隔时才写入一行。
+查询时取窗口内的变化点和窗口前最后一行，重建阶梯函数序列
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+import numpy as np
+
+logger = logging.getLogger("miner_history")
+
+# 算力相对死区：变化超过上次写入值的 5% 才记录
+HASHRATE_DEADBAND = 0.05
+# 算力绝对死区下限（GH/s），避免接近 0 时的抖动被反复记录
+HASHRATE_MIN_DEADBAND = 1.0
+# 温度绝对死区（°C）
+TEMPERATURE_DEADBAND = 2.0
+# 心跳间隔（秒）：值未变化时也至少每隔该时间写入一行，查询时据此判断数据是否中断
+HEARTBEAT_SECONDS = 900
+
+HISTORY_COLUMNS = ("hashrate", "temperature", "is_online", "has_error")
+
+INSERT_HISTORY_SQL = """
+INSERT INTO miner_history (site_id, miner_index, recorded_at, hashrate, temperature, is_online, has_error)
+SELECT $1, t.miner_index, NOW(), t.hashrate, t.temperature, t.is_online, t.has_error
+FROM unnest($2::int[], $3::numeric[], $4::numeric[], $5::bool[], $6::bool[])
+    AS t(miner_index, hashrate, temperature, is_online, has_error)
+ON CONFLICT DO NOTHING
+"""
+
+# 窗口前最后一行（阶梯函数在窗口起点的取值）+ 窗口内全部变化点
+QUERY_HISTORY_SQL = """
+(SELECT recorded_at, hashrate, temperature, is_online, has_error
+ FROM miner_history
+ WHERE site_id = $1 AND miner_index = $2 AND recorded_at < $3
+ ORDER BY recorded_at DESC
+ LIMIT 1)
+UNION ALL
+(SELECT recorded_at, hashrate, temperature, is_online, has_error
+ FROM miner_history
+ WHERE site_id = $1 AND miner_index = $2 AND recorded_at >= $3 AND recorded_at <= $4
+ ORDER BY recorded_at)
+ORDER BY recorded_at
+"""
+
+
+def _floats(values: Sequence[Any]) -> np.ndarray:
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+
+class SiteMinerState:
+    """一个站点所有矿机最近一次写入的值，按矿机序号排序的列数组"""
+    __slots__ = ("index", "hashrate", "temperature", "is_online", "has_error", "written_at")
+
+    def __init__(self, index: np.ndarray):
+        n = len(index)
+        self.index = index
+        self.hashrate = np.full(n, np.nan)
+        self.temperature = np.full(n, np.nan)
+        self.is_online = np.zeros(n, dtype=bool)
+        self.has_error = np.zeros(n, dtype=bool)
+        # 0 表示从未写入，必然触发心跳
+        self.written_at = np.zeros(n)
+
+    def realign(self, index: np.ndarray) -> "SiteMinerState":
+        """矿机增减时按新的序号集合重排，已知矿机保留上次写入的值"""
+        state = SiteMinerState(index)
+        if len(self.index):
+            pos = np.clip(np.searchsorted(self.index, index), 0, len(self.index) - 1)
+            known = self.index[pos] == index
+            for name in self.__slots__[1:]:
+                getattr(state, name)[known] = getattr(self, name)[pos[known]]
+        return state
+
+
+class HistoryBatch:
+    """一个站点本次需要写入的矿机行（事务提交后再并入状态）"""
+    __slots__ = ("site_id", "state", "mask", "index", "hashrate", "temperature", "is_online", "has_error")
+
+    def __init__(self, site_id: int, state: SiteMinerState, mask: np.ndarray, index: np.ndarray,
+                 hashrate: np.ndarray, temperature: np.ndarray, is_online: np.ndarray, has_error: np.ndarray):
+        self.site_id = site_id
+        self.state = state
+        self.mask = mask
+        self.index = index
+        self.hashrate = hashrate
+        self.temperature = temperature
+        self.is_online = is_online
+        self.has_error = has_error
+
+    def __len__(self) -> int:
+        return int(self.mask.sum())
+
+    def args(self) -> tuple:
+        """INSERT_HISTORY_SQL 的参数，NaN 还原为 NULL"""
+        m = self.mask
+        return (
+            self.site_id,
+            self.index[m].tolist(),
+            [None if np.isnan(v) else float(v) for v in self.hashrate[m]],
+            [None if np.isnan(v) else float(v) for v in self.temperature[m]],
+            self.is_online[m].tolist(),
+            self.has_error[m].tolist()
+        )
+
+
+class MinerHistoryRecorder:
+    """按站点维护矿机最近写入值，挑选超出死区或到达心跳的矿机
+
+    状态只在内存中，进程重启后每台矿机的第一次采样都会写入一行。
+    """
+
+    def __init__(self, hashrate_deadband: float = HASHRATE_DEADBAND,
+                 temperature_deadband: float = TEMPERATURE_DEADBAND,
+                 heartbeat: float = HEARTBEAT_SECONDS):
+        self.hashrate_deadband = hashrate_deadband
+        self.temperature_deadband = temperature_deadband
+        self.heartbeat = heartbeat
+        self.sites: Dict[int, SiteMinerState] = {}
+        self.stats = {"sampled": 0, "written": 0}
+
+    def plan(self, site_id: int, index: Sequence[int], hashrate: Sequence[Any], temperature: Sequence[Any],
+             is_online: Sequence[bool], has_error: Sequence[bool],
+             now: Optional[float] = None) -> Optional[HistoryBatch]:
+        """比较一个站点本次采样与上次写入值，返回需要写入的行（没有则返回 None）"""
+        now = time.time() if now is None else now
+        index = np.asarray(index, dtype=np.int64)
+        order = np.argsort(index, kind="stable")
+        index = index[order]
+        hashrate = _floats(hashrate)[order]
+        temperature = _floats(temperature)[order]
+        is_online = np.asarray(is_online, dtype=bool)[order]
+        has_error = np.asarray(has_error, dtype=bool)[order]
+
+        state = self.sites.get(site_id)
+        if state is None:
+            state = SiteMinerState(index)
+        elif not np.array_equal(state.index, index):
+            state = state.realign(index)
+        self.sites[site_id] = state
+
+        with np.errstate(invalid="ignore"):
+            band = np.maximum(np.abs(state.hashrate) * self.hashrate_deadband, HASHRATE_MIN_DEADBAND)
+            mask = (
+                (is_online != state.is_online)
+                | (has_error != state.has_error)
+                | (np.isnan(hashrate) != np.isnan(state.hashrate))
+                | (np.abs(hashrate - state.hashrate) > band)
+                | (np.isnan(temperature) != np.isnan(state.temperature))
+                | (np.abs(temperature - state.temperature) > self.temperature_deadband)
+                | (now - state.written_at >= self.heartbeat)
+            )
+
+        self.stats["sampled"] += len(index)
+        if not mask.any():
+            return None
+        return HistoryBatch(site_id, state, mask, index, hashrate, temperature, is_online, has_error)
+
+    def commit(self, batches: List[HistoryBatch], now: Optional[float] = None):
+        """写入成功后把已写入的值并入状态，作为后续比较的基准"""
+        now = time.time() if now is None else now
+        for batch in batches:
+            m = batch.mask
+            state = batch.state
+            state.hashrate[m] = batch.hashrate[m]
+            state.temperature[m] = batch.temperature[m]
+            state.is_online[m] = batch.is_online[m]
+            state.has_error[m] = batch.has_error[m]
+            state.written_at[m] = now
+            self.stats["written"] += len(batch)
+
+    def forget(self, site_id: int):
+        self.sites.pop(site_id, None)
+
+
+# ============= 查询 =============
+async def fetch_history(conn: asyncpg.Connection, site_id: int, miner_index: int,
+                        start: datetime, end: datetime) -> List[asyncpg.Record]:
+    """窗口内的变化点，外加窗口前最后一行"""
+    return await conn.fetch(QUERY_HISTORY_SQL, site_id, miner_index, start, end)
+
+
+def step_series(rows: Sequence[Any], start: datetime, end: datetime, step: Optional[float] = None,
+                heartbeat: float = HEARTBEAT_SECONDS) -> Dict[str, Any]:
+    """由变化点重建阶梯函数，返回列式序列
+
+    每个时刻的取值为该时刻之前最后一次写入的值；距最后一次写入超过两个心跳间隔
+    说明采集已中断，取值为 null。step 为空时在窗口起点和每个变化点各给出一个点，
+    否则按 step 秒等间隔采样。
+    """
+    times = np.array([row["recorded_at"].timestamp() for row in rows], dtype=np.float64)
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+
+    if step:
+        grid = np.arange(start_ts, end_ts + step / 2, step)
+    else:
+        inside = times[(times > start_ts) & (times <= end_ts)]
+        grid = np.concatenate(([start_ts], inside))
+
+    # 每个采样时刻对应的最后一行（-1 表示窗口前没有数据）
+    pos = np.searchsorted(times, grid, side="right") - 1
+    valid = pos >= 0
+    valid[valid] &= grid[valid] - times[pos[valid]] <= heartbeat * 2
+
+    series: Dict[str, Any] = {
+        "timestamps": [datetime.fromtimestamp(t, tz=timezone.utc).isoformat() for t in grid]
+    }
+    for column in HISTORY_COLUMNS:
+        values = [rows[p][column] for p in pos.tolist()] if len(rows) else [None] * len(grid)
+        series[column] = [
+            (float(v) if column in ("hashrate", "temperature") and v is not None else v) if ok else None
+            for v, ok in zip(values, valid.tolist())
+        ]
+    return series
+
+
+def history_window(hours: float, end: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    end = end or datetime.now(timezone.utc)
+    return end - timedelta(hours=hours), end
+
+
+miner_history = MinerHistoryRecorder()
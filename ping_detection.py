@@ -7,9 +7,18 @@ Ping检测模块
 import subprocess
 import re
 import asyncio
+import platform
 from typing import Dict, Optional, List, Tuple
 import ipaddress
 
+from icmp_engine import get_engine
+
+# 操作系统只需判断一次
+SYSTEM = platform.system().lower()
+
+# ICMP 引擎可用时 ping_batch 的在途主机上限（单个套接字复用）
+ENGINE_MAX_CONCURRENT = 4096
+
 class PingDetector:
     """Ping检测器"""
     
@@ -46,7 +55,7 @@ class PingDetector:
         """
         try:
             # 验证IP地址
-            ipaddress.ip_address(ip)
+            ip_obj = ipaddress.ip_address(ip)
         except ValueError:
             return {
                 "ip": ip,
@@ -59,11 +68,33 @@ class PingDetector:
                 "platform": None
             }
         
+        engine = get_engine() if ip_obj.version == 4 else None
+        if engine is not None:
+            return await self._ping_engine(engine, ip, port)
+        return await self._ping_subprocess(ip, port)
+
+    async def _ping_engine(self, engine, ip: str, port: int = None) -> Dict:
+        """通过共享的 ICMP 套接字探测，结果格式与 ping 命令一致"""
+        replies = await engine.ping(ip, self.count, self.timeout)
+        rtts = [r.rtt for r in replies if r.rtt is not None]
+        errors = [r.error for r in replies if r.error]
+        return {
+            "ip": ip,
+            "port": port,
+            "success": bool(rtts),
+            "latency": round(sum(rtts) / len(rtts), 3) if rtts else None,
+            "packet_loss": round((len(replies) - len(rtts)) * 100.0 / len(replies), 1),
+            "error": None if rtts else (errors[0] if errors else "Ping失败"),
+            "ttl": next((r.ttl for r in replies if r.ttl is not None), None),
+            "platform": SYSTEM
+        }
+
+    async def _ping_subprocess(self, ip: str, port: int = None) -> Dict:
+        """无 ICMP 套接字权限时回退到系统 ping 命令"""
+        system = SYSTEM
+
         # 构建ping命令
         # 根据操作系统选择不同的ping参数
-        import platform
-        system = platform.system().lower()
-        
         if system == "windows":
             cmd = ["ping", "-n", str(self.count), "-w", str(self.timeout * 1000), ip]
         else:  # Linux, macOS等
@@ -105,7 +136,7 @@ class PingDetector:
                 "packet_loss": 100.0,
                 "error": "Ping超时",
                 "ttl": None,
-                "platform": system if 'system' in locals() else "unknown"
+                "platform": system
             }
         except Exception as e:
             return {
@@ -116,7 +147,7 @@ class PingDetector:
                 "packet_loss": 100.0,
                 "error": f"Ping执行错误: {str(e)}",
                 "ttl": None,
-                "platform": system if 'system' in locals() else "unknown"
+                "platform": system
             }
     
     def _parse_ping_output(self, output: str, system: str) -> Dict:
@@ -190,11 +221,13 @@ class PingDetector:
         
         Args:
             ips: IP地址列表
-            max_concurrent: 最大并发数
+            max_concurrent: 最大并发数（仅限制 ping 子进程；ICMP 引擎在同一套接字上并发全部请求）
             
         Returns:
             Ping结果列表
         """
+        if get_engine() is not None:
+            max_concurrent = max(max_concurrent, ENGINE_MAX_CONCURRENT)
         semaphore = asyncio.Semaphore(max_concurrent)
         
         async def ping_with_semaphore(ip):
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+仪表盘响应缓存
+总览、站点列表、报警列表的数据每个采集周期才变化一次，监控大屏每个标签页却每 10 秒轮询一次。
+响应按 路径 + 查询参数 缓存为序列化好的 JSON 字节和 ETag，采集批次落库或报警确认后整体失效；
+同一键的并发未命中只查询一次数据库，客户端带 If-None-Match 命中时返回 304
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger("response_cache")
+
+# 兜底有效期（秒）：其他进程写库时本进程收不到失效通知
+CACHE_MAX_AGE = 60
+
+CacheKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class CachedResponse:
+    """序列化好的响应体及其 ETag"""
+    __slots__ = ("body", "etag", "created_at")
+
+    def __init__(self, body: bytes, etag: str, created_at: float):
+        self.body = body
+        self.etag = etag
+        self.created_at = created_at
+
+
+class ResponseCache:
+    """按请求路径和查询参数缓存 JSON 响应，invalidate() 后全部失效"""
+
+    def __init__(self, max_age: float = CACHE_MAX_AGE):
+        self.max_age = max_age
+        self.entries: Dict[CacheKey, CachedResponse] = {}
+        self.pending: Dict[CacheKey, asyncio.Future] = {}
+        self.generation = 0
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(request: Request) -> CacheKey:
+        return request.url.path, tuple(sorted(request.query_params.multi_items()))
+
+    def invalidate(self):
+        """数据已变化：丢弃所有缓存，正在构建中的结果不再写入缓存"""
+        self.generation += 1
+        self.entries.clear()
+        self.stats["invalidations"] += 1
+
+    async def get(self, key: CacheKey, build: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        """返回缓存的响应，未命中时调用 build() 构建；同一键同时只构建一次"""
+        entry = self.entries.get(key)
+        if entry is not None and time.monotonic() - entry.created_at < self.max_age:
+            self.stats["hits"] += 1
+            return entry
+
+        pending = self.pending.get(key)
+        if pending is not None:
+            self.stats["hits"] += 1
+            return await asyncio.shield(pending)
+
+        self.stats["misses"] += 1
+        generation = self.generation
+        future = asyncio.get_running_loop().create_future()
+        self.pending[key] = future
+        try:
+            body = json.dumps(jsonable_encoder(await build()), ensure_ascii=False,
+                              allow_nan=False, separators=(",", ":")).encode("utf-8")
+            entry = CachedResponse(body, '"' + hashlib.sha1(body).hexdigest()[:20] + '"', time.monotonic())
+            if generation == self.generation:
+                self.entries[key] = entry
+            future.set_result(entry)
+            return entry
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self.pending.pop(key, None)
+
+    async def respond(self, request: Request, build: Callable[[], Awaitable[Any]]) -> Response:
+        """构建（或复用）响应，If-None-Match 与当前 ETag 一致时返回 304"""
+        entry = await self.get(self.key(request), build)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, entry.etag):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """请求的 If-None-Match 是否包含该 ETag（忽略弱校验前缀）"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return etag in {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,229 @@
+import asyncio
+import contextlib
+import ipaddress
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from scanner_module import NetworkScanner
+
+logger = logging.getLogger("scan_jobs")
+
+# Probes in flight across all jobs
+GLOBAL_SCAN_CONCURRENCY = 256
+# Largest number of addresses one job may cover (a /14)
+MAX_JOB_IPS = 1 << 18
+# Finished jobs kept for status queries
+MAX_FINISHED_JOBS = 50
+
+Interval = Tuple[int, int]
+
+
+def parse_targets(specs: List[str]) -> List[Interval]:
+    """Parse CIDR blocks ("10.1.0.0/16"), ranges ("10.3.0.1-10.3.0.254") and single IPs
+    into sorted, merged inclusive integer intervals. Raises ValueError on bad input."""
+    intervals = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        if "/" in spec:
+            network = ipaddress.IPv4Network(spec, strict=False)
+            first, last = int(network.network_address), int(network.broadcast_address)
+            # Skip network and broadcast addresses on ordinary subnets
+            if network.prefixlen <= 30:
+                first, last = first + 1, last - 1
+        elif "-" in spec:
+            start, end = (part.strip() for part in spec.split("-", 1))
+            first, last = int(ipaddress.IPv4Address(start)), int(ipaddress.IPv4Address(end))
+            if first > last:
+                raise ValueError(f"Range start is after range end: {spec}")
+        else:
+            first = last = int(ipaddress.IPv4Address(spec))
+        intervals.append((first, last))
+
+    if not intervals:
+        raise ValueError("No scan targets given")
+
+    intervals.sort()
+    merged = [intervals[0]]
+    for first, last in intervals[1:]:
+        if first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+
+    total = sum(last - first + 1 for first, last in merged)
+    if total > MAX_JOB_IPS:
+        raise ValueError(f"Scan covers {total} addresses, limit is {MAX_JOB_IPS}")
+    return merged
+
+
+def covers(outer: List[Interval], inner: List[Interval]) -> bool:
+    """True if every interval of `inner` lies inside one interval of merged `outer`"""
+    return all(any(o_first <= first and last <= o_last for o_first, o_last in outer)
+               for first, last in inner)
+
+
+def format_interval(interval: Interval) -> Tuple[str, str]:
+    return str(ipaddress.IPv4Address(interval[0])), str(ipaddress.IPv4Address(interval[1]))
+
+
+class FairLimiter:
+    """Global probe budget handed out round-robin across jobs.
+
+    A job with 500 workers and a job with 20 get alternating slots while both are
+    waiting, so a large sweep cannot starve a small one.
+    """
+
+    def __init__(self, total: int = GLOBAL_SCAN_CONCURRENCY):
+        self.total = total
+        self.in_use = 0
+        self.waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    async def acquire(self, key: str):
+        if self.in_use < self.total and not self.waiters:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(key, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before the cancel arrived
+                self.release()
+            else:
+                queue = self.waiters.get(key)
+                if queue is not None:
+                    with contextlib.suppress(ValueError):
+                        queue.remove(future)
+                    if not queue:
+                        del self.waiters[key]
+            raise
+
+    def release(self):
+        self.in_use -= 1
+        while self.in_use < self.total and self.waiters:
+            key, queue = self.waiters.popitem(last=False)
+            future = queue.popleft()
+            # The job goes to the back of the rotation
+            if queue:
+                self.waiters[key] = queue
+            if future.done():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key: str):
+        await self.acquire(key)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class ScanJob:
+    """One scan over one or more ranges, run by its own NetworkScanner"""
+
+    def __init__(self, job_id: str, intervals: List[Interval], scan_type: str, port: int,
+                 concurrent_limit: int, mode: str, limiter: FairLimiter):
+        self.job_id = job_id
+        self.intervals = intervals
+        self.scan_type = scan_type
+        self.port = port
+        self.concurrent_limit = concurrent_limit
+        self.mode = mode
+        self.created_at = time.time()
+        self.attached = 0
+        self.scanner = NetworkScanner()
+        self.scanner.slot = lambda: limiter.slot(job_id)
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        self.task = asyncio.create_task(self.scanner.run_ranges(
+            [format_interval(i) for i in self.intervals],
+            self.scan_type, self.port, self.concurrent_limit, self.mode
+        ))
+        self.scanner.active_scan_task = self.task
+
+    def describe(self) -> Dict:
+        status = self.scanner.scan_status
+        return {
+            "job_id": self.job_id,
+            "ranges": ["-".join(format_interval(i)) for i in self.intervals],
+            "scan_type": self.scan_type,
+            "port": self.port,
+            "mode": self.mode,
+            "concurrent_limit": self.concurrent_limit,
+            "created_at": self.created_at,
+            "attached": self.attached,
+            "status": status["status"],
+            "progress": status["progress"],
+            "total_ips": status["total_ips"],
+            "scanned_ips": status["scanned_ips"],
+            "found_devices": status["found_devices"]
+        }
+
+
+class ScanJobManager:
+    """Runs scan jobs concurrently under one global probe budget"""
+
+    def __init__(self, total_concurrency: int = GLOBAL_SCAN_CONCURRENCY):
+        self.limiter = FairLimiter(total_concurrency)
+        self.jobs: "OrderedDict[str, ScanJob]" = OrderedDict()
+
+    def submit(self, targets: List[str], scan_type: str = 'all', port: int = 80,
+               concurrent_limit: int = 50, mode: str = 'full') -> Dict:
+        """Start a job, or attach to a running one that already covers the same targets"""
+        intervals = parse_targets(targets)
+
+        for job in self.jobs.values():
+            if (job.running and job.scan_type == scan_type and job.port == port
+                    and job.mode == mode and covers(job.intervals, intervals)):
+                job.attached += 1
+                logger.info(f"Scan request attached to running job {job.job_id}")
+                return {"success": True, "job_id": job.job_id, "attached": True}
+
+        job = ScanJob(uuid.uuid4().hex[:12], intervals, scan_type, port,
+                      concurrent_limit, mode, self.limiter)
+        self.jobs[job.job_id] = job
+        job.start()
+        self._evict_finished()
+        logger.info(f"Scan job {job.job_id} started: {', '.join(job.describe()['ranges'])}")
+        return {"success": True, "job_id": job.job_id, "attached": False}
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        return self.jobs.get(job_id)
+
+    def stop(self, job_id: str) -> Dict:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"success": False, "message": "Unknown job"}
+        return job.scanner.stop_scan()
+
+    def list(self) -> List[Dict]:
+        return [job.describe() for job in reversed(self.jobs.values())]
+
+    async def shutdown(self):
+        for job in self.jobs.values():
+            if job.running:
+                job.scanner.should_stop = True
+                job.task.cancel()
+        await asyncio.gather(*(job.task for job in self.jobs.values() if job.task),
+                             return_exceptions=True)
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if not job.running]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+
+scan_jobs = ScanJobManager()
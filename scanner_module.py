@@ -1,34 +1,178 @@
 import asyncio
+import contextlib
 import json
 import logging
 import ipaddress
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Set, Tuple
 from ping_detection import PingDetector
+from cgminer_client import CGMinerClient, CGMinerError, summarize
 import socket
 import aiohttp
+import asyncpg
 
 logger = logging.getLogger("scanner_module")
 
-class NetworkScanner:
+# Stage 1 (liveness sweep) timeout for TCP connects, in seconds
+LIVENESS_TIMEOUT = 1.0
+# Stage 1 workers per stage 2 worker: the sweep is cheap, fingerprinting is not
+SWEEP_FANOUT = 4
+# Ports that mark a host as live in stage 1 (the HTTP port is added per scan)
+CGMINER_PORT = 4028
+# CGMiner fingerprinting: whole-request budget and the commands sent in one connection
+CGMINER_SCAN_TIMEOUT = 2.0
+SCAN_COMMANDS = ("summary", "stats", "pools", "devs")
+# HTTP fingerprinting: request timeout, and how much of the body to sniff for device markers
+HTTP_TIMEOUT = 1.5
+HTTP_SNIFF_BYTES = 16 * 1024
+# Progress streaming: minimum gap between pushed deltas, and keepalive interval, in seconds
+STREAM_MIN_INTERVAL = 0.5
+STREAM_HEARTBEAT = 15
+# Incremental scans: fraction of never-seen addresses probed per run, and how many
+# consecutive misses before a known device stops being re-probed every time
+INCREMENTAL_SLICE = 1 / 16
+KNOWN_MAX_MISSES = 3
+
+LOAD_KNOWN_SQL = """
+SELECT host(ip_address) AS ip
+FROM scan_devices
+WHERE ip_address BETWEEN $1::inet AND $2::inet AND miss_count < $3
+"""
+
+UPSERT_DEVICES_SQL = """
+INSERT INTO scan_devices AS d
+    (ip_address, device_type, status, open_ports, fingerprint, latency_ms)
+SELECT ip, device_type, status,
+       COALESCE(string_to_array(NULLIF(ports, ''), ',')::int[], '{}'),
+       fingerprint::jsonb, latency
+FROM unnest($1::inet[], $2::text[], $3::text[], $4::text[], $5::text[], $6::numeric[])
+    AS t(ip, device_type, status, ports, fingerprint, latency)
+ON CONFLICT (ip_address) DO UPDATE SET
+    device_type = EXCLUDED.device_type,
+    status = EXCLUDED.status,
+    open_ports = EXCLUDED.open_ports,
+    fingerprint = EXCLUDED.fingerprint,
+    latency_ms = EXCLUDED.latency_ms,
+    last_seen = NOW(),
+    last_scanned = NOW(),
+    miss_count = 0
+"""
+
+RECORD_MISSES_SQL = """
+UPDATE scan_devices
+SET miss_count = miss_count + 1, status = 'offline', last_scanned = NOW()
+WHERE ip_address = ANY($1::inet[])
+"""
+
+NEXT_ROTATION_SQL = """
+INSERT INTO scan_rotation (range_key, next_offset) VALUES ($1, $2)
+ON CONFLICT (range_key) DO UPDATE
+    SET next_offset = (scan_rotation.next_offset + $2) % GREATEST($3, 1), updated_at = NOW()
+RETURNING (next_offset - $2 + GREATEST($3, 1)) % GREATEST($3, 1) AS start_offset
+"""
+
+def create_scan_session(limit: int) -> aiohttp.ClientSession:
+    """One session per scan. Targets are raw IPs probed once each, so no DNS cache and no keep-alive"""
+    connector = aiohttp.TCPConnector(
+        ssl=False,
+        use_dns_cache=False,
+        limit=limit,
+        limit_per_host=2,
+        force_close=True
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)
+    )
+
+class ScanHistory:
+    """Persists scan results per IP in scan_devices and picks targets for incremental scans"""
+
     def __init__(self):
+        self.pool: Optional[asyncpg.Pool] = None
+
+    def attach(self, pool: asyncpg.Pool):
+        self.pool = pool
+
+    @property
+    def enabled(self) -> bool:
+        return self.pool is not None
+
+    async def load_known(self, start_ip: str, end_ip: str) -> Set[str]:
+        """IPs in the range that answered within the last KNOWN_MAX_MISSES scans"""
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(LOAD_KNOWN_SQL, start_ip, end_ip, KNOWN_MAX_MISSES)
+        return {row["ip"] for row in rows}
+
+    async def rotation_slice(self, range_key: str, unknown: List[str], size: int) -> List[str]:
+        """Next `size` unknown addresses for this range, wrapping around; advances the stored cursor"""
+        if not unknown or size <= 0:
+            return []
+        async with self.pool.acquire() as conn:
+            offset = await conn.fetchval(NEXT_ROTATION_SQL, range_key, size, len(unknown))
+        offset %= len(unknown)
+        picked = unknown[offset:offset + size]
+        if len(picked) < size:
+            picked += unknown[:size - len(picked)]
+        return picked
+
+    async def save(self, devices: List[Dict], misses: List[str]):
+        """Upsert found devices and bump miss_count for known devices that did not answer"""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if devices:
+                    await conn.execute(
+                        UPSERT_DEVICES_SQL,
+                        [d["ip"] for d in devices],
+                        [d["deviceType"] for d in devices],
+                        [d["status"] for d in devices],
+                        [",".join(str(p) for p in d.get("openPorts", [])) for d in devices],
+                        [json.dumps(d["info"], ensure_ascii=False, default=str) for d in devices],
+                        [(d.get("ping") or {}).get("latency") for d in devices]
+                    )
+                if misses:
+                    await conn.execute(RECORD_MISSES_SQL, misses)
+
+scan_history = ScanHistory()
+
+def new_scan_status(status: str = "idle", total_ips: int = 0, scan_id: int = 0) -> Dict:
+    return {
+        "scan_id": scan_id,
+        "mode": "full",
+        "known_ips": 0,
+        "status": status, # idle, scanning, completed, stopped, error
+        "start_time": time.time() if status == "scanning" else None,
+        "end_time": None,
+        "progress": 0,
+        "total_ips": total_ips,
+        "scanned_ips": 0,
+        "swept_ips": 0,
+        "live_hosts": 0,
+        "found_devices": 0,
+        "antbox_devices": 0,
+        "miner_devices": 0,
+        "offline_devices": 0,
+        "results": [],
+        "error": None
+    }
+
+class NetworkScanner:
+    def __init__(self, history: ScanHistory = scan_history):
+        self.history = history
+        # Known devices in the current scan range, to record misses
+        self._known: Set[str] = set()
+        self._misses: List[str] = []
+        # Per-IP concurrency slot; the job manager swaps in a share of the global budget
+        self.slot: Callable[[], contextlib.AbstractAsyncContextManager] = contextlib.nullcontext
         self.active_scan_task: Optional[asyncio.Task] = None
-        self.scan_status = {
-            "status": "idle", # idle, scanning, completed, stopped, error
-            "start_time": None,
-            "end_time": None,
-            "progress": 0,
-            "total_ips": 0,
-            "scanned_ips": 0,
-            "found_devices": 0,
-            "antbox_devices": 0,
-            "miner_devices": 0,
-            "offline_devices": 0,
-            "results": [],
-            "error": None
-        }
+        self.scan_status = new_scan_status()
         self.should_stop = False
+        self.http_session: Optional[aiohttp.ClientSession] = None
+        self.scan_id = 0
+        # Replaced on every change; stream() waiters hold the old one
+        self._update = asyncio.Event()
         self.ping_detector = PingDetector(timeout=1, count=2)
+        self.cgminer = CGMinerClient(CGMINER_PORT, CGMINER_SCAN_TIMEOUT)
 
     def generate_ips(self, start_ip: str, end_ip: str) -> List[str]:
         try:
@@ -43,62 +187,95 @@ class NetworkScanner:
 
     async def scan_cgminer_api(self, ip: str, port: int = 4028) -> Optional[Dict]:
         """BTCTools-like ASIC miner detection using CGMiner API"""
+        client = self.cgminer if port == self.cgminer.port else CGMinerClient(port, CGMINER_SCAN_TIMEOUT)
         try:
-            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=1.5)
-            # Try getting summary first
-            req = json.dumps({"command": "summary"})
-            writer.write(req.encode('utf-8'))
-            await writer.drain()
-            
-            data = await asyncio.wait_for(reader.read(4096), timeout=1.5)
-            writer.close()
-            await writer.wait_closed()
-            
-            response = data.decode('utf-8').replace('\x00', '')
-            parsed = json.loads(response)
-            
-            # Extract basic miner info
-            miner_info = {"api": "CGMiner/BMMiner", "port": port}
-            if "SUMMARY" in parsed and len(parsed["SUMMARY"]) > 0:
-                summary = parsed["SUMMARY"][0]
-                if "GHS av" in summary:
-                    miner_info["hashrate"] = f"{summary['GHS av']:.2f} GH/s"
-                elif "MHS av" in summary:
-                    miner_info["hashrate"] = f"{summary['MHS av']:.2f} MH/s"
-                
-                if "Temperature" in summary:
-                    miner_info["temperature"] = f"{summary['Temperature']}°C"
-                elif "Temp" in summary:
-                    miner_info["temperature"] = f"{summary['Temp']}°C"
-                    
-            return miner_info
-        except Exception as e:
+            result = await client.fetch(ip, SCAN_COMMANDS)
+        except CGMinerError:
             return None
 
+        # Extract basic miner info
+        summary = summarize(result)
+        miner_info = {"api": "CGMiner/BMMiner", "port": port}
+        if summary["hashrate"] is not None:
+            miner_info["hashrate"] = f"{summary['hashrate']:.2f} GH/s"
+        if summary["temperature"] is not None:
+            miner_info["temperature"] = f"{summary['temperature']}°C"
+        if summary["model"]:
+            miner_info["model"] = summary["model"]
+        if summary["pool"]:
+            miner_info["pool"] = summary["pool"]
+        return miner_info
+
     async def scan_http_api(self, ip: str, port: int = 80) -> Optional[Dict]:
         """Detect AntBox or Web-based Miners"""
         url = f"http://{ip}:{port}/"
+        if self.http_session is None or self.http_session.closed:
+            # Single-IP callers outside run_scan
+            async with create_scan_session(limit=1) as session:
+                return await self._probe_http(session, url, port)
+        return await self._probe_http(self.http_session, url, port)
+
+    async def _probe_http(self, session: aiohttp.ClientSession, url: str, port: int) -> Optional[Dict]:
         try:
-            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as session:
-                async with session.get(url, timeout=1.5) as resp:
-                    html = await resp.text()
-                    html_lower = html.lower()
-                    
-                    # Simple AntBox detection
-                    if "antbox" in html_lower or "cooler" in html_lower or "矿机冷却" in html_lower:
-                        return {"type": "antbox", "port": port, "info": {"title": "AntBox Cooler System"}}
-                    # Simple Miner detection
-                    if "antminer" in html_lower or "whatsminer" in html_lower or "avalon" in html_lower:
-                        return {"type": "miner", "port": port, "info": {"title": "Web-based Miner"}}
-                    
-                    return {"type": "unknown", "port": port, "info": {"status": "HTTP available"}}
+            async with session.get(url) as resp:
+                # Only the head of the page is needed to spot the markers; read() returns
+                # one chunk at a time, so keep reading until the sniff window is full or EOF
+                body = b""
+                while len(body) < HTTP_SNIFF_BYTES:
+                    chunk = await resp.content.read(HTTP_SNIFF_BYTES - len(body))
+                    if not chunk:
+                        break
+                    body += chunk
         except Exception:
             return None
 
-    async def check_device(self, ip: str, scan_type: str, port: int) -> Optional[Dict]:
-        """Check a single IP for ping, ASIC API, and HTTP"""
-        ping_res = await self.ping_detector.ping(ip)
+        html_lower = body.decode('utf-8', errors='ignore').lower()
         
+        # Simple AntBox detection
+        if "antbox" in html_lower or "cooler" in html_lower or "矿机冷却" in html_lower:
+            return {"type": "antbox", "port": port, "info": {"title": "AntBox Cooler System"}}
+        # Simple Miner detection
+        if "antminer" in html_lower or "whatsminer" in html_lower or "avalon" in html_lower:
+            return {"type": "miner", "port": port, "info": {"title": "Web-based Miner"}}
+        
+        return {"type": "unknown", "port": port, "info": {"status": "HTTP available"}}
+
+    async def tcp_open(self, ip: str, port: int, timeout: float = LIVENESS_TIMEOUT) -> bool:
+        """TCP connect probe: True if the port accepts a connection"""
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=timeout)
+        except Exception:
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+        return True
+
+    async def probe_liveness(self, ip: str, port: int) -> Dict:
+        """Stage 1: ICMP echo and TCP connects to 4028 and the HTTP port, all concurrently"""
+        ports = [CGMINER_PORT] if port == CGMINER_PORT else [CGMINER_PORT, port]
+        ping_res, *open_flags = await asyncio.gather(
+            self.ping_detector.ping(ip),
+            *(self.tcp_open(ip, p) for p in ports)
+        )
+        return {
+            "ip": ip,
+            "ping": ping_res,
+            "open_ports": [p for p, is_open in zip(ports, open_flags) if is_open]
+        }
+
+    @staticmethod
+    def is_live(liveness: Dict) -> bool:
+        return bool(liveness["ping"].get("success") or liveness["open_ports"])
+
+    async def fingerprint(self, liveness: Dict, scan_type: str, port: int) -> Optional[Dict]:
+        """Stage 2: CGMiner and HTTP fingerprinting, only on ports that answered the sweep"""
+        ip = liveness["ip"]
+        ping_res = liveness["ping"]
+        open_ports = liveness["open_ports"]
+
         result = {
             "ip": ip,
             "port": port,
@@ -106,6 +283,7 @@ class NetworkScanner:
             "responseTime": int(time.time() * 1000),
             "status": "offline",
             "ping": ping_res,
+            "openPorts": open_ports,
             "info": {}
         }
         
@@ -115,7 +293,7 @@ class NetworkScanner:
             result["info"]["ping"] = f"延迟: {ping_res.get('latency', 0):.1f}ms"
         
         # 1. Check BTCTools-like ASIC API (Port 4028)
-        cgminer_res = await self.scan_cgminer_api(ip, 4028)
+        cgminer_res = await self.scan_cgminer_api(ip, CGMINER_PORT) if CGMINER_PORT in open_ports else None
         if cgminer_res:
             result["deviceType"] = "miner"
             result["status"] = "online"
@@ -127,7 +305,7 @@ class NetworkScanner:
             return result
             
         # 2. Check HTTP API (Port 80 by default)
-        http_res = await self.scan_http_api(ip, port)
+        http_res = await self.scan_http_api(ip, port) if port in open_ports else None
         if http_res:
             result["deviceType"] = http_res["type"]
             result["status"] = "online"
@@ -145,73 +323,175 @@ class NetworkScanner:
             
         return None
 
-    async def _scan_worker(self, queue: asyncio.Queue, scan_type: str, port: int):
+    async def check_device(self, ip: str, scan_type: str, port: int) -> Optional[Dict]:
+        """Check a single IP for ping, ASIC API, and HTTP"""
+        liveness = await self.probe_liveness(ip, port)
+        if not self.is_live(liveness):
+            return None
+        return await self.fingerprint(liveness, scan_type, port)
+
+    def _record(self, device: Optional[Dict]):
+        """Count one finished IP into scan_status"""
+        status = self.scan_status
+        status["scanned_ips"] += 1
+        if device:
+            status["found_devices"] += 1
+            if device["deviceType"] == "antbox":
+                status["antbox_devices"] += 1
+            elif device["deviceType"] == "miner":
+                status["miner_devices"] += 1
+            else:
+                status["offline_devices"] += 1
+            status["results"].append(device)
+        else:
+            status["offline_devices"] += 1
+
+        # Calculate progress
+        status["progress"] = int((status["scanned_ips"] / status["total_ips"]) * 100)
+        self._notify()
+
+    def _notify(self):
+        update, self._update = self._update, asyncio.Event()
+        update.set()
+
+    async def _sweep_worker(self, queue: asyncio.Queue, live_queue: asyncio.Queue, port: int):
+        """Stage 1 worker: dead hosts are finished here, live ones go to stage 2"""
         while not self.should_stop:
             try:
                 ip = queue.get_nowait()
             except asyncio.QueueEmpty:
                 break
-                
+
             try:
-                device = await self.check_device(ip, scan_type, port)
-                self.scan_status["scanned_ips"] += 1
-                
-                if device:
-                    self.scan_status["found_devices"] += 1
-                    if device["deviceType"] == "antbox":
-                        self.scan_status["antbox_devices"] += 1
-                    elif device["deviceType"] == "miner":
-                        self.scan_status["miner_devices"] += 1
-                    else:
-                        self.scan_status["offline_devices"] += 1
-                        
-                    self.scan_status["results"].append(device)
+                async with self.slot():
+                    liveness = await self.probe_liveness(ip, port)
+                self.scan_status["swept_ips"] += 1
+                if self.is_live(liveness):
+                    self.scan_status["live_hosts"] += 1
+                    live_queue.put_nowait(liveness)
                 else:
-                    self.scan_status["offline_devices"] += 1
-                    
-                # Calculate progress
-                self.scan_status["progress"] = int((self.scan_status["scanned_ips"] / self.scan_status["total_ips"]) * 100)
-                
+                    if ip in self._known:
+                        self._misses.append(ip)
+                    self._record(None)
+            except Exception as e:
+                logger.error(f"Error sweeping {ip}: {e}")
+                self.scan_status["swept_ips"] += 1
+                self._record(None)
+
+    async def _fingerprint_worker(self, live_queue: asyncio.Queue, scan_type: str, port: int):
+        """Stage 2 worker: runs until it receives the None sentinel"""
+        while True:
+            liveness = await live_queue.get()
+            if liveness is None:
+                break
+            if self.should_stop:
+                continue
+
+            try:
+                async with self.slot():
+                    device = await self.fingerprint(liveness, scan_type, port)
+                self._record(device)
             except Exception as e:
-                logger.error(f"Error scanning {ip}: {e}")
-                self.scan_status["scanned_ips"] += 1
-                self.scan_status["offline_devices"] += 1
-            finally:
-                queue.task_done()
-
-    async def run_scan(self, start_ip: str, end_ip: str, scan_type: str = 'all', port: int = 80, concurrent_limit: int = 50):
-        ips = self.generate_ips(start_ip, end_ip)
+                logger.error(f"Error scanning {liveness['ip']}: {e}")
+                self._record(None)
+
+    async def select_targets(self, ranges: List[Tuple[str, str]], mode: str) -> List[str]:
+        """Full mode scans every range. Incremental mode scans the known devices plus a
+        rotating INCREMENTAL_SLICE of the never-seen addresses of each range, so repeated
+        sweeps cover the whole range over 1 / INCREMENTAL_SLICE runs"""
+        self._known = set()
+        self._misses = []
+        targets = []
+        for start_ip, end_ip in ranges:
+            ips = self.generate_ips(start_ip, end_ip)
+            if not self.history.enabled:
+                targets += ips
+                continue
+            known_in_range = await self.history.load_known(start_ip, end_ip)
+            self._known |= known_in_range
+            if mode != "incremental":
+                targets += ips
+                continue
+
+            known = [ip for ip in ips if ip in known_in_range]
+            unknown = [ip for ip in ips if ip not in known_in_range]
+            size = max(1, int(len(unknown) * INCREMENTAL_SLICE))
+            rotation = await self.history.rotation_slice(f"{start_ip}-{end_ip}", unknown, size)
+            logger.info(f"Incremental scan {start_ip}-{end_ip}: {len(known)} known, {len(rotation)} of {len(unknown)} unknown")
+            targets += known + rotation
+        return targets
+
+    async def run_scan(self, start_ip: str, end_ip: str, scan_type: str = 'all', port: int = 80,
+                       concurrent_limit: int = 50, mode: str = 'full'):
+        await self.run_ranges([(start_ip, end_ip)], scan_type, port, concurrent_limit, mode)
+
+    async def run_ranges(self, ranges: List[Tuple[str, str]], scan_type: str = 'all', port: int = 80,
+                         concurrent_limit: int = 50, mode: str = 'full'):
+        """Scan one or more inclusive (start_ip, end_ip) ranges as a single scan"""
+        ips = [ip for start_ip, end_ip in ranges for ip in self.generate_ips(start_ip, end_ip)]
+        self.scan_id += 1
         if not ips:
-            self.scan_status["status"] = "error"
+            self.scan_status = new_scan_status("error", scan_id=self.scan_id)
             self.scan_status["error"] = "Invalid IP range"
+            self._notify()
             return
 
+        # Publish the new scan before the first await so clients never see the previous scan's status
         self.should_stop = False
-        self.scan_status = {
-            "status": "scanning",
-            "start_time": time.time(),
-            "end_time": None,
-            "progress": 0,
-            "total_ips": len(ips),
-            "scanned_ips": 0,
-            "found_devices": 0,
-            "antbox_devices": 0,
-            "miner_devices": 0,
-            "offline_devices": 0,
-            "results": [],
-            "error": None
-        }
+        self.scan_status = new_scan_status("scanning", len(ips), self.scan_id)
+        self.scan_status["mode"] = mode
+        self._notify()
+
+        try:
+            ips = await self.select_targets(ranges, mode)
+        except Exception as e:
+            # Scan history is an optimisation; fall back to a full scan without it
+            logger.error(f"Failed to load scan history: {e}")
+            self._known = set()
+
+        self.scan_status["total_ips"] = len(ips)
+        self.scan_status["known_ips"] = len(self._known)
+        if self.should_stop:
+            # Stopped while targets were being selected
+            self.scan_status["status"] = "stopped"
+            self.scan_status["end_time"] = time.time()
+            self.scan_status["progress"] = 100
+            self._notify()
+            return
+        self._notify()
 
+        # Stage 1 sweeps every IP; stage 2 fingerprints live hosts as soon as they are found
         queue = asyncio.Queue()
         for ip in ips:
             queue.put_nowait(ip)
+        live_queue = asyncio.Queue()
 
-        workers = []
-        for _ in range(min(concurrent_limit, len(ips))):
-            worker = asyncio.create_task(self._scan_worker(queue, scan_type, port))
-            workers.append(worker)
+        fingerprinters = [
+            asyncio.create_task(self._fingerprint_worker(live_queue, scan_type, port))
+            for _ in range(min(concurrent_limit, len(ips)))
+        ]
+        sweepers = [
+            asyncio.create_task(self._sweep_worker(queue, live_queue, port))
+            for _ in range(min(concurrent_limit * SWEEP_FANOUT, len(ips)))
+        ]
 
-        await queue.join()
+        self.http_session = create_scan_session(limit=concurrent_limit)
+        try:
+            await asyncio.gather(*sweepers)
+            for _ in fingerprinters:
+                live_queue.put_nowait(None)
+            await asyncio.gather(*fingerprinters)
+        finally:
+            for task in sweepers + fingerprinters:
+                task.cancel()
+            await self.http_session.close()
+            self.http_session = None
+
+        if self.history.enabled:
+            try:
+                await self.history.save(self.scan_status["results"], self._misses)
+            except Exception as e:
+                logger.error(f"Failed to save scan history: {e}")
 
         if self.should_stop:
             self.scan_status["status"] = "stopped"
@@ -220,12 +500,16 @@ class NetworkScanner:
             
         self.scan_status["end_time"] = time.time()
         self.scan_status["progress"] = 100
+        self._notify()
 
-    def start_scan(self, start_ip: str, end_ip: str, scan_type: str = 'all', port: int = 80, concurrent_limit: int = 50):
+    def start_scan(self, start_ip: str, end_ip: str, scan_type: str = 'all', port: int = 80,
+                   concurrent_limit: int = 50, mode: str = 'full'):
         if self.active_scan_task and not self.active_scan_task.done():
             return {"success": False, "message": "Scan already in progress"}
             
-        self.active_scan_task = asyncio.create_task(self.run_scan(start_ip, end_ip, scan_type, port, concurrent_limit))
+        self.active_scan_task = asyncio.create_task(
+            self.run_scan(start_ip, end_ip, scan_type, port, concurrent_limit, mode)
+        )
         return {"success": True, "message": "Scan started"}
 
     def stop_scan(self):
@@ -234,7 +518,39 @@ class NetworkScanner:
             return {"success": True, "message": "Stopping scan"}
         return {"success": False, "message": "No active scan"}
 
-    def get_status(self):
-        return self.scan_status
+    def get_status(self, since: Optional[int] = None, scan_id: Optional[int] = None) -> Dict:
+        """Full status, or with `since` only the results after that cursor.
+
+        The cursor is an offset into the append-only results list of one scan. If
+        `scan_id` names an older scan the cursor restarts at 0.
+        """
+        if since is None:
+            return self.scan_status
+        results = self.scan_status["results"]
+        if scan_id is not None and scan_id != self.scan_status["scan_id"]:
+            since = 0
+        since = max(0, min(since, len(results)))
+        delta = {k: v for k, v in self.scan_status.items() if k != "results"}
+        delta["results"] = results[since:]
+        delta["cursor"] = len(results)
+        return delta
+
+    async def stream(self, since: int = 0, scan_id: Optional[int] = None):
+        """Yield status deltas until the scan finishes; yields None as a keepalive"""
+        while True:
+            update = self._update
+            delta = self.get_status(since, scan_id)
+            since, scan_id = delta["cursor"], delta["scan_id"]
+            yield delta
+            if delta["status"] != "scanning":
+                return
+            while True:
+                try:
+                    await asyncio.wait_for(update.wait(), timeout=STREAM_HEARTBEAT)
+                    break
+                except asyncio.TimeoutError:
+                    yield None
+            # Coalesce bursts of found devices into one push
+            await asyncio.sleep(STREAM_MIN_INTERVAL)
 
 scanner = NetworkScanner()
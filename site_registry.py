@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+站点 ID 注册表
+进程内缓存 IP -> site_id 映射，启动时从 sites 表和站点配置加载，
+通过 PostgreSQL LISTEN/NOTIFY 在多个 API 进程间保持一致
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Any, Optional
+
+import asyncpg
+
+logger = logging.getLogger("site_registry")
+
+# sites 表变更通知频道（由 database_schema.sql 中的触发器发出）
+SITE_REGISTRY_CHANNEL = "site_registry"
+
+# 监听连接断开后的重连间隔（秒）
+RECONNECT_DELAY = 5
+
+
+class SiteRegistry:
+    """IP -> site_id 注册表"""
+
+    def __init__(self, channel: str = SITE_REGISTRY_CHANNEL):
+        self.channel = channel
+        self._ids: Dict[str, int] = {}
+        self._pool: Optional[asyncpg.Pool] = None
+        self._listener: Optional[asyncpg.Connection] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, ip: str) -> bool:
+        return ip in self._ids
+
+    def get(self, ip: str) -> Optional[int]:
+        return self._ids.get(ip)
+
+    async def start(self, pool: asyncpg.Pool, sites: List[Dict[str, Any]]):
+        """加载注册表、注册配置中的新站点并开始监听变更通知"""
+        self._pool = pool
+        self._closing = False
+        await self._listen()
+        await self.reload()
+        await self.register(sites)
+        logger.info(f"站点注册表已加载 {len(self._ids)} 个站点")
+
+    async def stop(self):
+        """停止监听并释放连接"""
+        self._closing = True
+        for task in (self._reload_task, self._reconnect_task):
+            if task and not task.done():
+                task.cancel()
+        if self._listener:
+            try:
+                await self._listener.remove_listener(self.channel, self._on_notify)
+            except Exception:
+                pass
+            await self._pool.release(self._listener)
+            self._listener = None
+
+    async def reload(self):
+        """从 sites 表全量重新加载映射"""
+        async with self._pool.acquire() as conn:
+            rows = await conn.fetch("SELECT site_id, ip_address FROM sites")
+        self._ids = {str(row["ip_address"]): row["site_id"] for row in rows}
+
+    def invalidate(self):
+        """标记映射失效，异步触发一次全量重新加载"""
+        if self._pool is None or self._closing:
+            return
+        if self._reload_task and not self._reload_task.done():
+            return
+        self._reload_task = asyncio.create_task(self._safe_reload())
+
+    async def register(self, sites: List[Dict[str, Any]],
+                       conn: Optional[asyncpg.Connection] = None) -> Dict[str, int]:
+        """将未知站点通过一条 upsert 语句批量写入 sites 表，返回新注册的 IP -> site_id
+
+        sites 中每项需包含 ip，可选 location。传入 conn 时在调用方事务内执行，
+        映射不会写入注册表，由调用方在事务提交后调用 apply()，避免回滚后留下不存在的 site_id。
+        """
+        missing: Dict[str, str] = {}
+        for site in sites:
+            ip = site.get("ip")
+            if ip and ip not in self._ids:
+                missing[ip] = site.get("location", "")
+        if not missing:
+            return {}
+
+        query = """INSERT INTO sites (ip_address, location, is_online)
+                   SELECT ip, location, TRUE
+                   FROM unnest($1::inet[], $2::text[]) AS t(ip, location)
+                   ON CONFLICT (ip_address) DO UPDATE SET updated_at = NOW()
+                   RETURNING site_id, ip_address"""
+        args = (list(missing.keys()), list(missing.values()))
+        if conn is not None:
+            rows = await conn.fetch(query, *args)
+        else:
+            async with self._pool.acquire() as pool_conn:
+                rows = await pool_conn.fetch(query, *args)
+
+        registered = {str(row["ip_address"]): row["site_id"] for row in rows}
+        if conn is None:
+            self.apply(registered)
+        logger.info(f"注册了 {len(rows)} 个新站点")
+        return registered
+
+    def apply(self, registered: Dict[str, int]):
+        """写入已提交的新站点映射"""
+        self._ids.update(registered)
+
+    async def _safe_reload(self):
+        try:
+            await self.reload()
+            logger.info(f"收到站点变更通知，注册表已重新加载 ({len(self._ids)} 个站点)")
+        except Exception as e:
+            logger.error(f"重新加载站点注册表失败：{e}")
+
+    async def _listen(self):
+        """占用一个连接池连接用于 LISTEN"""
+        conn = await self._pool.acquire()
+        try:
+            await conn.add_listener(self.channel, self._on_notify)
+        except Exception:
+            await self._pool.release(conn)
+            raise
+        conn.add_termination_listener(self._on_terminate)
+        self._listener = conn
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.invalidate()
+
+    def _on_terminate(self, connection):
+        if self._closing:
+            return
+        logger.warning("站点注册表监听连接已断开，准备重连")
+        self._listener = None
+        if not self._reconnect_task or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect(connection))
+
+    async def _reconnect(self, dead_conn: asyncpg.Connection):
+        try:
+            await self._pool.release(dead_conn)
+        except Exception:
+            pass
+        while not self._closing:
+            await asyncio.sleep(RECONNECT_DELAY)
+            try:
+                await self._listen()
+                # 断线期间可能错过通知，重连后全量加载
+                await self.reload()
+                logger.info("站点注册表监听连接已恢复")
+                return
+            except Exception as e:
+                logger.error(f"站点注册表重连失败：{e}")
+
+
+site_registry = SiteRegistry()
@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+
+from alert_engine import ALERT_FIRING, ALERT_PENDING, EVALUATE_RULES_SQL, INSERT_ALERTS_SQL, AlertStateMachine
+
+
+class FakeConnection:
+    """记录写库语句的连接替身，EVALUATE_RULES_SQL 返回预设的触发行"""
+
+    def __init__(self):
+        self.firing = []
+        self.inserted = []
+        self.resolved = []
+        self.next_record_id = 100
+
+    async def fetch(self, sql, *args):
+        if sql == EVALUATE_RULES_SQL:
+            return list(self.firing)
+        assert sql == INSERT_ALERTS_SQL
+        rows = []
+        for rule_id, site_id in zip(args[0], args[1]):
+            self.next_record_id += 1
+            rows.append({"record_id": self.next_record_id, "rule_id": rule_id, "site_id": site_id})
+        self.inserted.extend(rows)
+        return rows
+
+    async def execute(self, sql, *args):
+        self.resolved.extend(args[0])
+        return "UPDATE %d" % len(args[0])
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+def rule_row(rule_id=1, site_id=7, value=45.0, duration=60):
+    return {
+        "rule_id": rule_id, "name": "供液温度过高", "metric_name": "supply_temp",
+        "condition_type": "gt", "threshold_value": 40, "duration_seconds": duration,
+        "severity": "warning", "site_id": site_id, "value": value
+    }
+
+
+def evaluate(machine, conn, now):
+    return asyncio.run(machine.evaluate(conn, now=now))
+
+
+def test_condition_must_hold_for_duration_before_firing():
+    machine, conn = AlertStateMachine(), FakeConnection()
+    conn.firing = [rule_row(duration=60)]
+
+    fired, resolved = evaluate(machine, conn, 1000)
+    assert (fired, resolved) == ([], [])
+    assert machine.states[(1, 7)].status == ALERT_PENDING
+
+    fired, _ = evaluate(machine, conn, 1059)
+    assert fired == []
+
+    fired, _ = evaluate(machine, conn, 1060)
+    assert [row["rule_id"] for row in fired] == [1]
+    assert machine.states[(1, 7)].status == ALERT_FIRING
+    assert machine.states[(1, 7)].record_id == 101
+    assert machine.firing_count() == 1
+
+
+def test_ongoing_alert_is_written_once():
+    machine, conn = AlertStateMachine(), FakeConnection()
+    conn.firing = [rule_row(duration=0)]
+
+    for now in range(1000, 1600, 60):
+        evaluate(machine, conn, now)
+
+    assert len(conn.inserted) == 1
+    # 持续报警期间更新当前值但不重复写库
+    conn.firing = [rule_row(duration=0, value=48.5)]
+    evaluate(machine, conn, 1600)
+    assert len(conn.inserted) == 1
+    assert machine.states[(1, 7)].value == 48.5
+
+
+def test_pending_alert_is_dropped_without_writing():
+    machine, conn = AlertStateMachine(), FakeConnection()
+    conn.firing = [rule_row(duration=300)]
+    evaluate(machine, conn, 1000)
+
+    conn.firing = []
+    fired, resolved = evaluate(machine, conn, 1060)
+    assert (fired, resolved) == ([], [])
+    assert machine.states == {}
+    assert conn.inserted == [] and conn.resolved == []
+
+
+def test_firing_alert_resolves_its_record():
+    machine, conn = AlertStateMachine(), FakeConnection()
+    conn.firing = [rule_row(site_id=7, duration=0), rule_row(site_id=8, duration=0)]
+    evaluate(machine, conn, 1000)
+
+    conn.firing = [rule_row(site_id=8, duration=0)]
+    fired, resolved = evaluate(machine, conn, 1060)
+    assert fired == []
+    assert [key for key, _ in resolved] == [(1, 7)]
+    assert conn.resolved == [101]
+    assert list(machine.states) == [(1, 8)]
+
+
+def test_alert_fires_again_after_resolving():
+    machine, conn = AlertStateMachine(), FakeConnection()
+    conn.firing = [rule_row(duration=0)]
+    evaluate(machine, conn, 1000)
+    conn.firing = []
+    evaluate(machine, conn, 1060)
+    conn.firing = [rule_row(duration=0)]
+    evaluate(machine, conn, 1120)
+
+    assert [row["record_id"] for row in conn.inserted] == [101, 102]
+    assert machine.states[(1, 7)].record_id == 102
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from cgminer_client import DEFAULT_COMMANDS, CGMinerError, command_failed, hashrate_ghs, parse_response, summarize
+from conftest import FIXTURES
+
+
+def fixture_result():
+    with open(os.path.join(FIXTURES, "bmminer_summary_stats.json"), "rb") as f:
+        raw = parse_response(f.read() + b"\0")
+    return {command: raw[command][0] for command in DEFAULT_COMMANDS}
+
+
+def test_parse_response_strips_trailing_nul():
+    assert parse_response(b'{"STATUS": [{"STATUS": "S"}]}\0') == {"STATUS": [{"STATUS": "S"}]}
+
+
+def test_parse_response_repairs_firmware_json():
+    # 部分 BMMiner 固件的 stats 缺少对象间逗号，并输出 nan
+    raw = b'{"STATS":[{"Type":"S19"}{"temp1":52,"GHS av":nan}],"id":1}\0'
+    assert parse_response(raw) == {"STATS": [{"Type": "S19"}, {"temp1": 52, "GHS av": None}], "id": 1}
+
+
+@pytest.mark.parametrize("raw", [b"", b"\0", b"  \0", b"<html>"])
+def test_parse_response_rejects_garbage(raw):
+    with pytest.raises(CGMinerError):
+        parse_response(raw)
+
+
+def test_command_failed():
+    assert command_failed({"STATUS": [{"STATUS": "E", "Msg": "Invalid command"}]})
+    assert not command_failed({"STATUS": [{"STATUS": "S"}]})
+    assert not command_failed({"summary": [{}]})
+
+
+def test_hashrate_is_converted_to_ghs():
+    assert hashrate_ghs({"GHS 5s": "254871.35"}) == 254871.35
+    assert hashrate_ghs({"GHS 5s": "", "GHS av": 100.5}) == 100.5
+    assert hashrate_ghs({"MHS 5s": 14000000}) == 14000.0
+    assert hashrate_ghs({"GHS 5s": "n/a", "MHS av": 2500}) == 2.5
+    assert hashrate_ghs({}) is None
+
+
+def test_summarize_bmminer_fixture():
+    miner = summarize(fixture_result())
+    assert miner["hashrate"] == 254871.35
+    # temp2_N 为芯片温度，取所有温度传感器的最大值
+    assert miner["temperature"] == 68
+    assert miner["fan_speed"] is None
+    assert miner["model"] == "Antminer S19 XP Hyd."
+    assert miner["pool"] == "stratum+tcp://btc.example-pool.com:3333"
+    assert miner["elapsed"] == 86412
+    assert miner["hardware_errors"] == 41
+    assert miner["has_error"] is False
+
+
+def test_summarize_flags_dead_device():
+    result = fixture_result()
+    result["devs"] = {"DEVS": [{"ASC": 0, "Status": "Alive"}, {"ASC": 1, "Status": "Dead"}]}
+    assert summarize(result)["has_error"] is True
+
+
+def test_summarize_handles_missing_sections():
+    miner = summarize({"summary": {"SUMMARY": [{"MHS av": 1000}]}})
+    assert miner["hashrate"] == 1.0
+    assert miner["temperature"] is None
+    assert miner["model"] is None and miner["pool"] is None
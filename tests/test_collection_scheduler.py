@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from collection_scheduler import CollectionScheduler
+from data_collector import SiteHealthTracker
+
+
+def test_backoff_doubles_per_failure_up_to_cap():
+    health = SiteHealthTracker(max_backoff=600)
+    assert health.next_interval("10.1.101.1", 60) == 60
+
+    intervals = []
+    for _ in range(5):
+        health.record_failure("10.1.101.1")
+        intervals.append(health.next_interval("10.1.101.1", 60))
+    assert intervals == [120, 240, 480, 600, 600]
+
+    health.record_success("10.1.101.1")
+    assert health.next_interval("10.1.101.1", 60) == 60
+    assert health.failing_count() == 0
+
+
+def test_backoff_cap_never_shortens_long_interval():
+    health = SiteHealthTracker(max_backoff=600)
+    health.record_failure("10.1.101.1")
+    assert health.next_interval("10.1.101.1", 900) == 900
+
+
+def run_scheduler(scheduler, sites, seconds):
+    async def main():
+        scheduler.set_sites(sites)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(seconds)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await scheduler.flush_now()
+    asyncio.run(main())
+
+
+def test_site_still_in_flight_is_skipped():
+    calls = []
+    flushed = []
+
+    async def fetch(site):
+        calls.append(site["ip"])
+        await asyncio.sleep(0.35)
+        return {"ip": site["ip"], "errors": []}
+
+    async def flush(batch):
+        flushed.extend(batch)
+
+    scheduler = CollectionScheduler(fetch=fetch, flush=flush, flush_interval=0.05, jitter=0)
+    run_scheduler(scheduler, [{"ip": "10.1.101.1", "interval": 0.1}], 0.45)
+
+    # 第一次采集耗时 0.35 秒，期间到期的 3 次被跳过，而不是并发采集同一站点
+    assert calls == ["10.1.101.1", "10.1.101.1"]
+    assert scheduler.stats["skipped"] == 3
+    assert [result["ip"] for result in flushed] == ["10.1.101.1"]
+
+
+def test_failed_site_is_backed_off():
+    calls = []
+
+    async def fetch(site):
+        calls.append(site["ip"])
+        return {"ip": site["ip"], "errors": ["timeout"] if site["ip"] == "10.1.101.1" else []}
+
+    async def flush(batch):
+        pass
+
+    def next_interval(site, interval):
+        return interval * 10 if site["ip"] == "10.1.101.1" else interval
+
+    scheduler = CollectionScheduler(fetch=fetch, flush=flush, next_interval=next_interval,
+                                    flush_interval=0.05, jitter=0)
+    sites = [{"ip": "10.1.101.1", "interval": 0.1}, {"ip": "10.1.101.2", "interval": 0.1}]
+    run_scheduler(scheduler, sites, 0.45)
+
+    # 失败站点下次采集推迟到 1 秒后，正常站点按 0.1 秒间隔继续
+    assert calls.count("10.1.101.1") == 1
+    assert calls.count("10.1.101.2") >= 4
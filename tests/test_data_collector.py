@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+from cgminer_client import DEFAULT_COMMANDS, miner_info_response, parse_response
+from conftest import FIXTURES
+from data_collector import parse_miner_info
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def test_antbox_miner_hashrate_is_th_per_second():
+    data = json.loads(load_fixture("antbox_minerinfo.json"))
+    parsed = parse_miner_info(data)
+
+    # 单台矿机换算为 GH/s，站点合计为 PH/s
+    assert [m["hashrate"] for m in parsed["miner_details"]] == pytest.approx([254710, 256020, 170350, 0])
+    assert parsed["total_hashrate"] == pytest.approx((254.71 + 256.02 + 170.35) / 1000, abs=1e-4)
+    assert parsed["online_miner_count"] == 3
+
+
+def test_antbox_full_site_total_matches_documented_scale():
+    # ui_design.md：189 台 S19 XP Hyd. 的站点总算力约 48.08 PH/s
+    data = {"ok": True, "params": {"miners": [{"index": i, "hashrate": 254.4} for i in range(189)]}}
+    assert parse_miner_info(data)["total_hashrate"] == pytest.approx(48.08, abs=0.01)
+
+
+def test_cgminer_source_is_gh_per_second():
+    raw = parse_response(load_fixture("bmminer_summary_stats.json"))
+    # 与 CGMinerClient.fetch() 对多命令响应的拆分一致
+    result = {command: raw[command][0] for command in DEFAULT_COMMANDS}
+    response = miner_info_response(["10.1.101.10", "10.1.101.11"], [result, None])
+
+    parsed = parse_miner_info(response)
+    assert parsed["miner_details"][0]["hashrate"] == pytest.approx(254871.35)
+    assert parsed["miner_details"][1]["hashrate"] == 0
+    assert parsed["total_hashrate"] == pytest.approx(0.2549, abs=1e-4)
+
+
+def test_non_numeric_miner_hashrate_is_ignored():
+    data = {"ok": True, "params": {"miners": [{"index": 0, "hashrate": "n/a"}, {"index": 1, "hashrate": 250}]}}
+    parsed = parse_miner_info(data)
+    assert parsed["miner_details"][0]["hashrate"] is None
+    assert parsed["total_hashrate"] == pytest.approx(0.25)
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from downsample import downsample_rows, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_point_count():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    selected = lttb_indices(x, y, 100)
+
+    assert len(selected) == 100
+    assert selected[0] == 0 and selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_lttb_preserves_spikes():
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[123], y[777] = 50.0, -40.0
+    selected = lttb_indices(x, y, 20).tolist()
+
+    assert 123 in selected and 777 in selected
+
+
+def test_lttb_small_inputs():
+    x = np.arange(5, dtype=float)
+    assert lttb_indices(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+    assert lttb_indices(x, x, 2).tolist() == [0, 4]
+    assert lttb_indices(x, x, 0).tolist() == []
+
+
+def rows(n):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [{"timestamp": start + timedelta(minutes=i), "value": float(i % 60), "other": None}
+            for i in range(n)]
+
+
+def test_downsample_rows_returns_ordered_subset():
+    data = rows(1440)
+    data[500]["value"] = 1000.0
+    result = downsample_rows(data, 100, value_keys=["value"])
+
+    assert len(result) <= 100
+    assert result[0] is data[0] and result[-1] is data[-1]
+    assert data[500] in result
+    timestamps = [row["timestamp"] for row in result]
+    assert timestamps == sorted(timestamps)
+
+
+def test_downsample_rows_skips_null_values():
+    data = rows(1440)
+    for row in data[::2]:
+        row["value"] = None
+    result = downsample_rows(data, 100)
+
+    assert 0 < len(result) <= 100
+    assert all(row["value"] is not None for row in result)
+
+
+def test_downsample_rows_leaves_short_series_alone():
+    data = rows(50)
+    assert downsample_rows(data, 100) is data
+    assert downsample_rows(data, 0) is data
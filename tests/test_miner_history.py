@@ -0,0 +1,122 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from miner_history import HEARTBEAT_SECONDS, MinerHistoryRecorder, step_series
+
+INDEX = [0, 1, 2]
+ONLINE = [True, True, True]
+NO_ERROR = [False, False, False]
+
+
+def plan(recorder, hashrate, temperature, now, index=INDEX, online=ONLINE, error=NO_ERROR):
+    return recorder.plan(1, index, hashrate, temperature, online, error, now=now)
+
+
+def written(batch):
+    return [] if batch is None else batch.index[batch.mask].tolist()
+
+
+def test_first_sample_writes_every_miner():
+    recorder = MinerHistoryRecorder()
+    batch = plan(recorder, [250000, 251000, None], [60, 61, None], now=1000)
+    assert written(batch) == [0, 1, 2]
+    assert batch.args() == (1, [0, 1, 2], [250000.0, 251000.0, None], [60.0, 61.0, None],
+                            [True, True, True], [False, False, False])
+
+
+def test_changes_within_deadband_are_not_written():
+    recorder = MinerHistoryRecorder()
+    recorder.commit([plan(recorder, [250000, 251000, 0], [60, 61, 40], now=1000)], now=1000)
+
+    # 算力变化小于 5%、温度变化不超过 2 °C、0 附近的抖动小于 1 GH/s
+    assert plan(recorder, [260000, 241000, 0.5], [62, 59.5, 40], now=1060) is None
+
+
+def test_only_changed_miners_are_written():
+    recorder = MinerHistoryRecorder()
+    recorder.commit([plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1000)], now=1000)
+
+    batch = plan(recorder, [200000, 251000, 252000], [60, 64, 62], now=1060)
+    assert written(batch) == [0, 1]
+    assert written(plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1060,
+                        online=[True, False, True])) == [1]
+
+
+def test_status_flip_and_missing_value_are_written():
+    recorder = MinerHistoryRecorder()
+    recorder.commit([plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1000)], now=1000)
+
+    assert written(plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1060,
+                        error=[False, False, True])) == [2]
+    assert written(plan(recorder, [250000, None, 252000], [60, 61, 62], now=1060)) == [1]
+
+
+def test_comparison_base_is_last_committed_value():
+    recorder = MinerHistoryRecorder()
+    recorder.commit([plan(recorder, [250000], [60], now=1000, index=[0], online=[True], error=[False])],
+                    now=1000)
+
+    # 未提交的批次不改变基准：写库失败后下一次采样仍会写入
+    assert written(plan(recorder, [200000], [60], now=1060, index=[0], online=[True], error=[False])) == [0]
+    assert written(plan(recorder, [200000], [60], now=1120, index=[0], online=[True], error=[False])) == [0]
+
+
+def test_heartbeat_rewrites_unchanged_miner():
+    recorder = MinerHistoryRecorder()
+    recorder.commit([plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1000)], now=1000)
+
+    assert plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1000 + HEARTBEAT_SECONDS - 1) is None
+    assert written(plan(recorder, [250000, 251000, 252000], [60, 61, 62],
+                        now=1000 + HEARTBEAT_SECONDS)) == [0, 1, 2]
+
+
+def test_realign_keeps_known_miners():
+    recorder = MinerHistoryRecorder()
+    recorder.commit([plan(recorder, [250000, 251000, 252000], [60, 61, 62], now=1000)], now=1000)
+
+    # 矿机 1 下线移除、新增矿机 5，输入顺序不影响结果
+    batch = recorder.plan(1, [5, 2, 0], [240000, 252000, 250000], [59, 62, 60],
+                          [True] * 3, [False] * 3, now=1060)
+    assert batch.index.tolist() == [0, 2, 5]
+    assert written(batch) == [5]
+    assert np.isnan(recorder.sites[1].hashrate[2])
+
+
+def at(minutes):
+    return datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=minutes)
+
+
+def row(minutes, hashrate, temperature=60.0, is_online=True):
+    return {"recorded_at": at(minutes), "hashrate": hashrate, "temperature": temperature,
+            "is_online": is_online, "has_error": False}
+
+
+def test_step_series_carries_last_value_forward():
+    rows = [row(-30, 250000), row(10, 200000), row(20, 210000)]
+    series = step_series(rows, at(0), at(30))
+
+    # 窗口起点取窗口前最后一行，其后每个变化点一个点
+    assert series["timestamps"] == [at(0).isoformat(), at(10).isoformat(), at(20).isoformat()]
+    assert series["hashrate"] == [250000.0, 200000.0, 210000.0]
+
+
+def test_step_series_fixed_step_and_gap():
+    rows = [row(0, 250000), row(10, 200000, is_online=False)]
+    series = step_series(rows, at(0), at(60), step=600, heartbeat=600)
+
+    # 距最后一行超过两个心跳间隔视为采集中断
+    assert series["hashrate"] == [250000.0, 200000.0, 200000.0, 200000.0, None, None, None]
+    assert series["is_online"] == [True, False, False, False, None, None, None]
+
+
+def test_step_series_without_rows():
+    series = step_series([], at(0), at(30), step=900)
+    assert len(series["timestamps"]) == 3
+    assert series["temperature"] == [None, None, None]
+
+
+def test_step_series_before_first_row_is_empty():
+    series = step_series([row(15, 250000)], at(0), at(30), step=900)
+    assert series["hashrate"] == [None, 250000.0, 250000.0]
+    assert series["temperature"] == [None, 60.0, 60.0]
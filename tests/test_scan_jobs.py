@@ -0,0 +1,82 @@
+import asyncio
+import ipaddress
+
+import pytest
+
+from scan_jobs import MAX_JOB_IPS, FairLimiter, parse_targets
+
+
+def ip(text):
+    return int(ipaddress.IPv4Address(text))
+
+
+def test_cidr_skips_network_and_broadcast():
+    assert parse_targets(["10.1.101.0/24"]) == [(ip("10.1.101.1"), ip("10.1.101.254"))]
+    # /31、/32 没有网络号和广播地址
+    assert parse_targets(["10.1.101.8/31"]) == [(ip("10.1.101.8"), ip("10.1.101.9"))]
+    assert parse_targets(["10.1.101.8/32"]) == [(ip("10.1.101.8"), ip("10.1.101.8"))]
+
+
+def test_ranges_and_single_ips_are_sorted_and_merged():
+    targets = ["10.3.0.50-10.3.0.100", " 10.3.0.1 - 10.3.0.49 ", "10.3.0.200", "", "10.3.0.80-10.3.0.120"]
+    assert parse_targets(targets) == [
+        (ip("10.3.0.1"), ip("10.3.0.120")),
+        (ip("10.3.0.200"), ip("10.3.0.200")),
+    ]
+
+
+@pytest.mark.parametrize("targets", [
+    [],
+    [" "],
+    ["10.3.0.100-10.3.0.1"],
+    ["10.3.0.300"],
+    ["10.0.0.0/8"],
+])
+def test_invalid_targets_raise_value_error(targets):
+    with pytest.raises(ValueError):
+        parse_targets(targets)
+
+
+def test_target_limit_counts_merged_addresses():
+    # 重复的网段合并后只计一次
+    block = "10.4.0.0/14"
+    assert sum(last - first + 1 for first, last in parse_targets([block, block])) < MAX_JOB_IPS
+
+
+def test_limiter_alternates_between_jobs():
+    order = []
+
+    async def worker(limiter, key, name):
+        async with limiter.slot(key):
+            order.append(name)
+
+    async def main():
+        limiter = FairLimiter(total=1)
+        await limiter.acquire("holder")
+        tasks = []
+        for key, name in [("big", "big-1"), ("big", "big-2"), ("big", "big-3"), ("small", "small-1")]:
+            tasks.append(asyncio.create_task(worker(limiter, key, name)))
+            await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return limiter
+
+    limiter = asyncio.run(main())
+    assert order == ["big-1", "small-1", "big-2", "big-3"]
+    assert limiter.in_use == 0 and not limiter.waiters
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def main():
+        limiter = FairLimiter(total=1)
+        await limiter.acquire("a")
+        waiter = asyncio.create_task(limiter.acquire("b"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not limiter.waiters
+        limiter.release()
+        return limiter
+
+    assert asyncio.run(main()).in_use == 0
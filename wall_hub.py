@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+监控墙推送中心
+站点状态读取 latest_state 内存存储，活动报警由报警引擎直接喂入；
+每个 WebSocket 客户端连接后先收到一份完整快照，之后只收到站点字段级差异和报警事件。
+消息只序列化一次后分发给所有客户端，跟不上的客户端丢弃积压并重新发送快照
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+
+from latest_state import latest_state
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger("wall_hub")
+
+# 监控墙展示的站点字段（site_id 之外）
+WALL_SITE_FIELDS = (
+    "ip_address", "location", "is_online", "supply_temp", "return_temp",
+    "total_power", "total_hashrate", "miner_count"
+)
+
+# 列式快照中的报警字段
+WALL_ALERT_FIELDS = (
+    "record_id", "site_id", "rule_name", "metric_name", "metric_value",
+    "threshold_value", "message", "triggered_at"
+)
+
+# 快照中最多携带的活动报警条数（按触发时间倒序）
+WALL_ALERT_LIMIT = 50
+
+# 单个客户端待发送消息上限，超出后丢弃积压改发快照
+CLIENT_QUEUE_SIZE = 256
+
+# 空闲时的心跳间隔（秒），用于及时发现已断开的连接
+WALL_HEARTBEAT = 30
+
+LOAD_ALERTS_SQL = """
+SELECT a.record_id, a.site_id, r.name AS rule_name, a.metric_name, a.metric_value,
+       a.threshold_value, a.condition_description AS message, a.triggered_at
+FROM alert_records a
+LEFT JOIN alert_rules r ON r.rule_id = a.rule_id
+WHERE a.status = 'active'
+ORDER BY a.triggered_at
+"""
+
+
+class WallHub:
+    """监控墙活动报警与 WebSocket 客户端分发"""
+
+    def __init__(self):
+        self.alerts: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.clients: Set[asyncio.Queue] = set()
+        self.seq = 0
+        self.loaded = False
+        # 进程标识，与 seq 组成 ETag，重启后不会与旧 ETag 相同
+        self.instance = uuid.uuid4().hex[:8]
+        self._encoded: Dict[str, bytes] = {}
+        self._encoded_seq = -1
+
+    async def load(self, conn: asyncpg.Connection):
+        """从数据库加载活动报警（启动时执行一次，站点状态由 latest_state 加载）"""
+        alerts = await conn.fetch(LOAD_ALERTS_SQL)
+        self.alerts = OrderedDict((row["record_id"], jsonable_encoder(dict(row))) for row in alerts)
+        self.loaded = True
+        logger.info(f"监控墙状态已加载：{len(self.alerts)} 条活动报警")
+
+    def overview(self) -> Dict[str, int]:
+        totals = latest_state.overview()
+        return {
+            "total_sites": totals["total_sites"],
+            "online_sites": totals["online_sites"],
+            "offline_sites": totals["offline_sites"],
+            "active_alerts": len(self.alerts)
+        }
+
+    def snapshot(self) -> str:
+        """完整快照消息（已序列化）"""
+        return self._encode({
+            "type": "snapshot",
+            "seq": self.seq,
+            "overview": self.overview(),
+            "sites": [{field: getattr(state, field) for field in ("site_id",) + WALL_SITE_FIELDS}
+                      for state in latest_state.list()],
+            "alerts": list(self.alerts.values())[-WALL_ALERT_LIMIT:][::-1]
+        })
+
+    def columnar(self) -> Dict[str, Any]:
+        """列式快照：站点和报警按字段给出数组（同一下标为同一行），重复的键名只出现一次"""
+        sites = latest_state.list()
+        alerts = list(self.alerts.values())[-WALL_ALERT_LIMIT:][::-1]
+        return {
+            "seq": self.seq,
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "overview": self.overview(),
+            "sites": {field: [getattr(state, field) for state in sites] for field in ("site_id",) + WALL_SITE_FIELDS},
+            "alerts": {field: [alert.get(field) for alert in alerts] for field in WALL_ALERT_FIELDS}
+        }
+
+    @property
+    def etag(self) -> str:
+        return f'"wall-{self.instance}-{self.seq}"'
+
+    def encoded_columnar(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """按 Accept-Encoding 返回 (响应体, Content-Encoding)，同一 seq 的各编码结果只生成一次"""
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            encoding = None
+
+        if self._encoded_seq != self.seq:
+            self._encoded = {}
+            self._encoded_seq = self.seq
+        body = self._encoded.get(encoding or "identity")
+        if body is None:
+            raw = self._encoded.get("identity")
+            if raw is None:
+                raw = self._encode(self.columnar()).encode("utf-8")
+                self._encoded["identity"] = raw
+            if encoding == "br":
+                body = brotli.compress(raw, quality=5)
+            elif encoding == "gzip":
+                body = gzip.compress(raw, compresslevel=6)
+            else:
+                body = raw
+            self._encoded[encoding or "identity"] = body
+        return body, encoding
+
+    # ============= 状态输入 =============
+    def site_changed(self, site_id: int, changed: Dict[str, Any]):
+        """latest_state.update() 返回的变化字段中，只推送监控墙展示的部分"""
+        changes = {field: value for field, value in changed.items() if field in WALL_SITE_FIELDS}
+        if changes:
+            self._broadcast({"type": "sites", "changes": [{"site_id": site_id, **changes}],
+                             "overview": self.overview()})
+
+    def sites_removed(self, site_ids: Iterable[int]):
+        site_ids = list(site_ids)
+        if site_ids:
+            self._broadcast({"type": "sites_removed", "site_ids": site_ids, "overview": self.overview()})
+
+    def alert_fired(self, alert: Dict[str, Any]):
+        """新触发的报警（须含 record_id）"""
+        alert = jsonable_encoder(alert)
+        self.alerts[alert["record_id"]] = alert
+        self._broadcast({"type": "alert", "event": "fired", "alert": alert, "overview": self.overview()})
+
+    def alert_cleared(self, record_id: Optional[int], event: str):
+        """报警已恢复（resolved）或已确认（acknowledged），从活动报警中移除"""
+        if record_id is None or self.alerts.pop(record_id, None) is None:
+            return
+        self._broadcast({"type": "alert", "event": event, "record_id": record_id, "overview": self.overview()})
+
+    # ============= 客户端分发 =============
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.clients.discard(queue)
+
+    def _encode(self, message: Dict[str, Any]) -> str:
+        return json.dumps(message, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    def _broadcast(self, message: Dict[str, Any]):
+        self.seq += 1
+        message["seq"] = self.seq
+        if not self.clients:
+            return
+        text = self._encode(message)
+        for queue in self.clients:
+            try:
+                queue.put_nowait(text)
+            except asyncio.QueueFull:
+                # 丢弃积压，None 表示客户端需要重新获取快照
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def next_message(self, queue: asyncio.Queue) -> str:
+        """等待下一条发往该客户端的消息；积压溢出时返回新快照，空闲超时返回心跳"""
+        try:
+            message = await asyncio.wait_for(queue.get(), timeout=WALL_HEARTBEAT)
+        except asyncio.TimeoutError:
+            return self._encode({"type": "ping", "seq": self.seq})
+        return self.snapshot() if message is None else message
+
+
+wall_hub = WallHub()